@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for license_header_hook on synthetic repositories.
+
+Each scenario generates a corpus of source files, then runs ``main()`` over
+it in a fresh interpreter per phase so peak RSS is measured per phase. The
+file list is split into argv chunks the way pre-commit does, with one
+``main()`` call per chunk.
+
+    python benchmarks/bench.py --scenario small --output baseline.json
+    python benchmarks/bench.py --scenario small --compare baseline.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import UTC, datetime
+from unittest.mock import patch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from license_header_hook import (  # noqa: E402
+    CommentRegistry,
+    LicenseHeaderManager,
+    __version__,
+    main,
+)
+
+TEMPLATE = os.path.join(ROOT, "license-header.txt")
+HOLDER = "Benchmark Corp"
+
+KB = 1024
+MB = 1024 * KB
+
+# name: file count, (min size, max size), header state shares
+SCENARIOS = {
+    "small": {"files": 1_000, "sizes": (1 * KB, 64 * KB)},
+    "medium": {"files": 10_000, "sizes": (1 * KB, 64 * KB)},
+    "large": {"files": 100_000, "sizes": (1 * KB, 16 * KB)},
+    "big-files": {"files": 40, "sizes": (1 * MB, 50 * MB)},
+    "steady": {
+        "files": 10_000,
+        "sizes": (1 * KB, 64 * KB),
+        "states": {"correct": 0.97, "none": 0.01, "stale": 0.01, "shebang": 0.01},
+    },
+}
+DEFAULT_STATES = {"none": 0.4, "stale": 0.2, "correct": 0.3, "shebang": 0.1}
+
+# Phases run against the same corpus, in order
+PHASES = {
+    "check-initial": ["--check"],
+    "fix": [],
+    "check-steady": ["--check"],
+}
+
+# pre-commit splits argv so a command line stays below this many bytes
+PRE_COMMIT_MAX_LENGTH = 2**17
+
+
+def generate_corpus(
+    directory: str,
+    files: int,
+    sizes: tuple[int, int],
+    states: dict[str, float],
+    seed: int = 0,
+) -> list[str]:
+    """Write a synthetic source tree and return its files in argv order."""
+    rng = random.Random(seed)
+    registry = CommentRegistry()
+    manager = LicenseHeaderManager(TEMPLATE, HOLDER, registry)
+    stale = LicenseHeaderManager(TEMPLATE, "Old Corp", registry)
+    stale.current_year = 2019
+    extensions = sorted(registry.mappings)
+    state_names = sorted(states)
+    state_weights = [states[name] for name in state_names]
+    low, high = sizes
+
+    paths = []
+    for i in range(files):
+        ext = extensions[i % len(extensions)]
+        style = registry.mappings[ext]
+        state = rng.choices(state_names, state_weights)[0]
+        # Log-uniform sizes: many small files, a few large ones
+        size = int(low * (high / low) ** rng.random())
+
+        if state == "correct":
+            prefix = manager.get_header(style)[0] + "\n"
+        elif state == "stale":
+            prefix = stale.get_header(style)[0] + "\n\n"
+        elif state == "shebang" and style["start"] == "#":
+            prefix = "#!/usr/bin/env python3\n"
+        else:
+            prefix = ""
+
+        rel = os.path.join(f"pkg{i % 97:02d}", f"sub{i % 13:02d}", f"file{i}{ext}")
+        path = os.path.join(directory, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        line = f"value_{i} = {i}  # filler\n".encode()
+        body = line * max(1, (size - len(prefix)) // len(line))
+        with open(path, "wb") as f:
+            f.write(prefix.encode("utf-8"))
+            f.write(body)
+        paths.append(rel)
+    return paths
+
+
+def chunk_argv(
+    paths: list[str], max_length: int = PRE_COMMIT_MAX_LENGTH
+) -> list[list[str]]:
+    """Split paths into command lines the way pre-commit's xargs does."""
+    chunks: list[list[str]] = [[]]
+    length = 0
+    for path in paths:
+        size = len(path.encode()) + 1
+        if chunks[-1] and length + size > max_length:
+            chunks.append([])
+            length = 0
+        chunks[-1].append(path)
+        length += size
+    return chunks
+
+
+def run_phase(corpus: str, phase: str, jobs: int | None) -> dict:
+    """Run one phase in this process and return its measurements."""
+    with open(os.path.join(corpus, "files.json")) as f:
+        paths = json.load(f)
+    os.chdir(corpus)
+
+    base_argv = ["license-header-hook", "--template", TEMPLATE, "-c", HOLDER]
+    base_argv += PHASES[phase]
+    if jobs is not None:
+        base_argv += ["--jobs", str(jobs)]
+
+    chunks = chunk_argv(paths)
+    exit_codes = []
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        start = time.perf_counter()
+        for chunk in chunks:
+            with patch("sys.argv", base_argv + chunk):
+                exit_codes.append(main())
+        wall = time.perf_counter() - start
+
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        rss *= 1024
+    return {
+        "files": len(paths),
+        "invocations": len(chunks),
+        "wall_seconds": round(wall, 4),
+        "files_per_second": round(len(paths) / wall, 1) if wall else None,
+        "peak_rss_bytes": rss,
+        "exit_code": max(exit_codes, default=0),
+    }
+
+
+def run_scenario(name: str, jobs: int | None, workdir: str, seed: int) -> dict:
+    """Generate a scenario's corpus and measure every phase on it."""
+    spec = SCENARIOS[name]
+    corpus = tempfile.mkdtemp(prefix=f"bench-{name}-", dir=workdir)
+    try:
+        start = time.perf_counter()
+        paths = generate_corpus(
+            corpus,
+            spec["files"],
+            spec["sizes"],
+            spec.get("states", DEFAULT_STATES),
+            seed,
+        )
+        with open(os.path.join(corpus, "files.json"), "w") as f:
+            json.dump(paths, f)
+        result = {
+            "files": len(paths),
+            "bytes": sum(os.path.getsize(os.path.join(corpus, p)) for p in paths),
+            "generate_seconds": round(time.perf_counter() - start, 2),
+            "phases": {},
+        }
+
+        for phase in PHASES:
+            # A fresh interpreter per phase keeps peak RSS per phase
+            command = [
+                sys.executable,
+                __file__,
+                "--run-phase",
+                phase,
+                "--corpus",
+                corpus,
+            ]
+            if jobs is not None:
+                command += ["--jobs", str(jobs)]
+            output = subprocess.run(command, check=True, capture_output=True, text=True)
+            result["phases"][phase] = json.loads(output.stdout)
+            print(f"  {name}/{phase}: {result['phases'][phase]}", file=sys.stderr)
+        return result
+    finally:
+        shutil.rmtree(corpus, ignore_errors=True)
+
+
+def compare(results: dict, baseline: dict, max_regression: float) -> list[str]:
+    """Return descriptions of metrics that regressed beyond ``max_regression``."""
+    regressions = []
+    for name, scenario in results["scenarios"].items():
+        old_scenario = baseline.get("scenarios", {}).get(name)
+        if not old_scenario:
+            continue
+        for phase, metrics in scenario["phases"].items():
+            old = old_scenario["phases"].get(phase)
+            if not old:
+                continue
+            for metric in ("wall_seconds", "peak_rss_bytes"):
+                if not old.get(metric):
+                    continue
+                ratio = metrics[metric] / old[metric]
+                line = f"{name}/{phase} {metric}: {old[metric]} -> {metrics[metric]}"
+                print(f"{line} ({ratio:.2f}x)")
+                if ratio > 1 + max_regression:
+                    regressions.append(line)
+    return regressions
+
+
+def bench_main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=sorted(SCENARIOS),
+        help="Scenario to run (can be used multiple times, default: small)",
+    )
+    parser.add_argument("--jobs", type=int, help="Passed through as --jobs")
+    parser.add_argument("--seed", type=int, default=0, help="Corpus random seed")
+    parser.add_argument("--workdir", help="Directory for generated corpora")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON file to compare against")
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=0.2,
+        help="Allowed slowdown or RSS growth against --compare (default: 0.2)",
+    )
+    parser.add_argument("--run-phase", choices=sorted(PHASES), help=argparse.SUPPRESS)
+    parser.add_argument("--corpus", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_phase:
+        print(json.dumps(run_phase(args.corpus, args.run_phase, args.jobs)))
+        return 0
+
+    results = {
+        "version": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "timestamp": datetime.now(UTC).isoformat(),
+        "scenarios": {},
+    }
+    for name in args.scenario or ["small"]:
+        print(f"Running scenario {name}", file=sys.stderr)
+        results["scenarios"][name] = run_scenario(
+            name, args.jobs, args.workdir, args.seed
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.max_regression)
+        if regressions:
+            print("\nRegressions:\n  " + "\n  ".join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(bench_main())
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for license_header_hook.
+
+On small commits the hook's run time is mostly interpreter startup and
+imports. This measures, with ``-X importtime``, how long importing the
+module takes, and runs the hook on a command line with no supported file
+(the early exit) to check which modules it loads. Bytecode is compiled
+once into a temporary cache first, as it would be for an installed hook.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --budget-ms 30 --output startup.json
+
+Exits 1 when the median import time is over the budget or the early exit
+imports one of ``HEAVY_MODULES``.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULE = "license_header_hook"
+
+# Modules the early exit must not import
+HEAVY_MODULES = (
+    "argparse",
+    "concurrent.futures",
+    "datetime",
+    "hashlib",
+    "multiprocessing",
+    "pathlib",
+    "socket",
+    "tempfile",
+)
+
+NO_OP_RUN = f"""
+import sys
+import {MODULE}
+code = {MODULE}.main(
+    ["--template", "license-header.txt", "--copyright-holder", "Acme", "README.md"]
+)
+print(" ".join(sorted(sys.modules)), file=sys.stderr)
+sys.exit(code)
+"""
+
+
+def run_python(code: str, pycache: str) -> subprocess.CompletedProcess:
+    """Run ``code`` in a fresh interpreter with import timing enabled."""
+    env = dict(os.environ, PYTHONPATH=ROOT, PYTHONPYCACHEPREFIX=pycache)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+
+
+def import_micros(stderr: str, module: str = MODULE) -> int:
+    """Cumulative import time of ``module`` in ``-X importtime`` output."""
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and line.split("|")[-1].strip() == module:
+            return int(line.split("|")[1])
+    raise ValueError(f"{module} not found in -X importtime output")
+
+
+def measure(runs: int) -> dict:
+    """Time the import ``runs`` times and inspect one early exit run."""
+    with tempfile.TemporaryDirectory() as pycache:
+        run_python(f"import {MODULE}", pycache)  # Compile bytecode
+        samples = [
+            import_micros(run_python(f"import {MODULE}", pycache).stderr)
+            for _ in range(runs)
+        ]
+        no_op = run_python(NO_OP_RUN, pycache)
+
+    modules = set(no_op.stderr.splitlines()[-1].split())
+    return {
+        "python": sys.version.split()[0],
+        "runs": runs,
+        "import_ms_median": round(statistics.median(samples) / 1000, 2),
+        "import_ms_min": round(min(samples) / 1000, 2),
+        "early_exit_code": no_op.returncode,
+        "early_exit_modules": len(modules),
+        "heavy_modules_imported": [m for m in HEAVY_MODULES if m in modules],
+    }
+
+
+def startup_main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--runs", type=int, default=20, help="Timed imports")
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=40.0,
+        help="Maximum median import time in milliseconds (default: 40)",
+    )
+    parser.add_argument("--output", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    results = measure(args.runs)
+    results["budget_ms"] = args.budget_ms
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+    else:
+        print(json.dumps(results, indent=2))
+
+    failures = []
+    if results["import_ms_median"] > args.budget_ms:
+        failures.append(
+            f"import takes {results['import_ms_median']} ms, "
+            f"budget is {args.budget_ms} ms"
+        )
+    if results["early_exit_code"] != 0:
+        failures.append(f"early exit returned {results['early_exit_code']}")
+    if results["heavy_modules_imported"]:
+        failures.append(
+            "early exit imports " + ", ".join(results["heavy_modules_imported"])
+        )
+    if failures:
+        print("\nOver budget:\n  " + "\n  ".join(failures))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(startup_main())
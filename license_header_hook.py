@@ -5,15 +5,499 @@ Pre-commit hook for managing license headers in source files.
 
 __version__ = "0.1.0"
 
-import argparse
+import codecs
+import collections
+import contextlib
+import errno
+import functools
+import heapq
+import io
+import itertools
+import json
 import os
+import re
+import stat
+import struct
 import sys
-from datetime import datetime
-from pathlib import Path
+import time
+from collections.abc import Callable, Iterable, Iterator
+from typing import TYPE_CHECKING, Any, BinaryIO, TextIO
+
+# Modules that take a noticeable share of startup time are imported where
+# they are used, so a run with nothing to do returns quickly.
+if TYPE_CHECKING:
+    import argparse
+    import socket
+    import threading
+    from concurrent.futures import Future, ProcessPoolExecutor
+    from multiprocessing.synchronize import Event as EventType
+
+# Bytes read past the expected header when checking whether it is already
+# correct; covers a shebang line and the start of the first body line.
+HEADER_SLACK = 512
+
+# Upper bound on how much of a file is read while looking for the end of an
+# existing header, and the chunk size used when copying the rest of a file
+# without kernel support.
+MAX_HEADER_BYTES = 1 << 20
+COPY_CHUNK = 1 << 16
+
+# Bytes at the start of a file inspected for signs that it is binary,
+# generated or minified, and the markers of a generated file, which only
+# count in the comments in front of the first line of code.
+SNIFF_BYTES = 8192
+GENERATED_MARKERS = (b"@generated", b"DO NOT EDIT")
+
+# Bytes read from a file without an extension to tell its language from a
+# modeline, its shebang or an XML or HTML start. Emacs modelines are on the
+# first line (the second after a shebang), Vim modelines anywhere in the
+# bytes read.
+DETECT_BYTES = 1024
+_EMACS_MODELINE = re.compile(rb"-\*-[ \t]*(.*?)[ \t]*-\*-")
+_EMACS_MODE = re.compile(rb"(?:^|;)[ \t]*mode[ \t]*:[ \t]*([^; \t]+)", re.IGNORECASE)
+_VIM_MODELINE = re.compile(
+    rb"(?:^|[ \t])(?:vim?|ex):(?:.*?[ \t:])?(?:ft|filetype)=([\w+-]+)", re.MULTILINE
+)
+_MARKUP = re.compile(rb"[ \t\r\n]*<(\?xml|!doctype html|html)", re.IGNORECASE)
+_LANGUAGE_VERSION = re.compile(r"[\d.]+$")
+
+# Encoding declaration (PEP 263 / Emacs style) looked for in the first two
+# lines of files that are not UTF-8.
+CODING_COOKIE = re.compile(rb"coding[:=][ \t]*([-\w.]+)")
+
+# Words that make a leading comment block a license header. Other leading
+# comments are kept below the new header.
+LICENSE_MARKERS = re.compile(rb"copyright|licen[cs]|spdx|\xc2\xa9", re.IGNORECASE)
+
+# Stand-ins for the template placeholders while compiling it to a regex
+_YEAR_PLACEHOLDER = "\0year\0"
+_HOLDER_PLACEHOLDER = "\0holder\0"
+
+# Outcomes of processing a single file
+STATUS_UNCHANGED = "unchanged"
+STATUS_UPDATED = "updated"
+STATUS_SKIPPED = "skipped"
+STATUS_ERROR = "error"
+STATUS_NONCOMPLIANT = "noncompliant"
+# Statuses of files that did not have the correct header
+FAILING_STATUSES = frozenset({STATUS_UPDATED, STATUS_NONCOMPLIANT})
+
+# Values of --year-mode: what {year} becomes in a file's header
+YEAR_CURRENT = "current"
+YEAR_FIRST_COMMIT = "first-commit"
+YEAR_RANGE = "range"
+YEAR_MODES = (YEAR_CURRENT, YEAR_FIRST_COMMIT, YEAR_RANGE)
+
+DEFAULT_CACHE_DIR = os.path.join(".cache", "license-header")
+# Socket of license-header-daemon, relative to the repository root unless
+# overridden by the environment variable
+DEFAULT_SOCKET = os.path.join(DEFAULT_CACHE_DIR, "daemon.sock")
+SOCKET_ENV = "LICENSE_HEADER_SOCKET"
+DAEMON_BACKLOG = 64
+# Bounds on the result cache: entries per configuration and number of
+# configurations kept on disk.
+CACHE_MAX_ENTRIES = 200_000
+CACHE_MAX_FILES = 8
+# Files modified this recently may still change without their stat data
+# changing, so they are not cached (the same "racy" window git uses).
+CACHE_RACY_NS = 2_000_000_000
+
+
+# Number of slowest files listed by --stats
+STATS_TOP_FILES = 10
+
+
+class _PhaseTimer:
+    """Adds the time spent inside a ``with`` block to ``totals[name]``."""
+
+    __slots__ = ("totals", "name", "start")
+
+    def __init__(self, totals: dict[str, float], name: str):
+        self.totals = totals
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info: object) -> None:
+        elapsed = time.perf_counter() - self.start
+        self.totals[self.name] = self.totals.get(self.name, 0.0) + elapsed
+
+
+class _NullTimer:
+    """Timer used while statistics are disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc_info: object) -> None:
+        return None
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Stats:
+    """Timings and counters collected for --stats.
+
+    Per-file phases (``read``, ``scan``, ``render``, ``write``) are summed
+    per file so percentiles are over files; steps of the whole run
+    (``select``, ``process``, ...) are plain totals. While disabled,
+    ``phase`` and ``step`` return a shared no-op timer.
+    """
+
+    PHASES = ("read", "scan", "render", "write")
+
+    def __init__(self, enabled: bool = False, top: int = STATS_TOP_FILES):
+        self.enabled = enabled
+        self.top = top
+        self.phases: dict[str, list[float]] = {}
+        self.steps: dict[str, float] = {}
+        self.statuses: dict[str, int] = {}
+        self.skipped: dict[str, int] = {}
+        self.bytes_read = 0
+        self.bytes_written = 0
+        # Min-heap of (seconds, path) holding the slowest files
+        self.slowest: list[tuple[float, str]] = []
+        self._file: dict[str, float] = {}
+
+    def phase(self, name: str) -> _PhaseTimer | _NullTimer:
+        """Time part of processing the current file."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _PhaseTimer(self._file, name)
+
+    def step(self, name: str) -> _PhaseTimer | _NullTimer:
+        """Time a step of the whole run."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _PhaseTimer(self.steps, name)
+
+    def skip(self, reason: str, count: int = 1) -> None:
+        """Count files that were not processed."""
+        if count:
+            self.skipped[reason] = self.skipped.get(reason, 0) + count
+
+    def take_phases(self) -> dict[str, float]:
+        """Return and reset the phases timed since the previous file."""
+        phases = self._file
+        self._file = {}
+        return phases
+
+    def file_done(
+        self,
+        file_path: str,
+        status: str,
+        seconds: float,
+        phases: dict[str, float] | None = None,
+    ) -> None:
+        """Record a processed file with ``phases`` or the phases timed since
+        the previous file."""
+        if phases is None:
+            phases = self.take_phases()
+        for name, elapsed in phases.items():
+            self.phases.setdefault(name, []).append(elapsed)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self._push_slowest(seconds, file_path)
+
+    def _push_slowest(self, seconds: float, file_path: str) -> None:
+        if len(self.slowest) < self.top:
+            heapq.heappush(self.slowest, (seconds, file_path))
+        elif seconds > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (seconds, file_path))
+
+    def merge(self, other: "Stats") -> None:
+        """Add the statistics collected by a worker process."""
+        for name, values in other.phases.items():
+            self.phases.setdefault(name, []).extend(values)
+        for name, elapsed in other.steps.items():
+            self.steps[name] = self.steps.get(name, 0.0) + elapsed
+        for status, count in other.statuses.items():
+            self.statuses[status] = self.statuses.get(status, 0) + count
+        for reason, count in other.skipped.items():
+            self.skip(reason, count)
+        self.bytes_read += other.bytes_read
+        self.bytes_written += other.bytes_written
+        for seconds, file_path in other.slowest:
+            self._push_slowest(seconds, file_path)
+
+    @staticmethod
+    def _percentile(values: list[float], percent: int) -> float:
+        """Nearest-rank percentile of sorted ``values``."""
+        rank = -(-len(values) * percent // 100)
+        return values[max(rank, 1) - 1]
+
+    def to_dict(self) -> dict[str, Any]:
+        """Statistics as a JSON-serialisable dictionary (times in seconds)."""
+        phases = {}
+        for name in sorted(self.phases, key=self._phase_order):
+            values = sorted(self.phases[name])
+            phases[name] = {
+                "files": len(values),
+                "total": sum(values),
+                "p50": self._percentile(values, 50),
+                "p90": self._percentile(values, 90),
+                "p99": self._percentile(values, 99),
+                "max": values[-1],
+            }
+        return {
+            "files": sum(self.statuses.values()),
+            "statuses": dict(sorted(self.statuses.items())),
+            "skipped": dict(sorted(self.skipped.items())),
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "phases": phases,
+            "steps": self.steps,
+            "slowest": [
+                {"path": file_path, "seconds": seconds}
+                for seconds, file_path in sorted(self.slowest, reverse=True)
+            ],
+        }
+
+    def _phase_order(self, name: str) -> tuple[int, str]:
+        if name in self.PHASES:
+            return self.PHASES.index(name), name
+        return len(self.PHASES), name
+
+    def format_summary(self) -> str:
+        """Human-readable summary printed by --stats."""
+        data = self.to_dict()
+        statuses = ", ".join(f"{n} {s}" for s, n in data["statuses"].items())
+        lines = [
+            "License header statistics",
+            f"  files processed: {data['files']}"
+            + (f" ({statuses})" if statuses else ""),
+            f"  bytes read: {data['bytes_read']}, written: {data['bytes_written']}",
+        ]
+        if data["skipped"]:
+            skipped = ", ".join(f"{r} {n}" for r, n in data["skipped"].items())
+            lines.append(f"  skipped: {skipped}")
+        if data["steps"]:
+            steps = ", ".join(
+                f"{name} {seconds * 1000:.1f} ms"
+                for name, seconds in data["steps"].items()
+            )
+            lines.append(f"  steps: {steps}")
+        if data["phases"]:
+            lines.append(
+                f"  {'phase':<8} {'files':>7} {'total ms':>10} {'p50 ms':>9}"
+                f" {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}"
+            )
+            for name, phase in data["phases"].items():
+                lines.append(
+                    f"  {name:<8} {phase['files']:>7} {phase['total'] * 1000:>10.2f}"
+                    + "".join(
+                        f" {phase[key] * 1000:>9.3f}"
+                        for key in ("p50", "p90", "p99", "max")
+                    )
+                )
+        if data["slowest"]:
+            lines.append("  slowest files:")
+            for entry in data["slowest"]:
+                lines.append(f"    {entry['seconds'] * 1000:9.3f} ms  {entry['path']}")
+        return "\n".join(lines)
+
+
+def _normpath(path: str) -> str:
+    """``os.path.normpath(path)``, returning paths already normal as they are."""
+    # Substring tests are cheaper than normpath(), and leave only paths with
+    # a component starting with a dot (or none at all) to it
+    if (
+        os.sep == "/"
+        and path
+        and not path.startswith(".")
+        and "/." not in path
+        and "//" not in path
+        and not path.endswith("/")
+    ):
+        return path
+    return os.path.normpath(path)
+
+
+def _line_end(data: bytes, pos: int) -> int:
+    """Offset just past the line starting at ``pos``, including its newline."""
+    newline = data.find(b"\n", pos)
+    return len(data) if newline < 0 else newline + 1
+
+
+# Kernel copy functions still worth trying; one that fails as unsupported is
+# dropped for the rest of the run. Writer threads share it, so it is only
+# read through a slice and removals tolerate a method already gone.
+_KERNEL_COPY = [name for name in ("copy_file_range", "sendfile") if hasattr(os, name)]
+_COPY_UNSUPPORTED = frozenset(
+    {
+        errno.ENOSYS,
+        errno.EXDEV,
+        errno.EINVAL,
+        errno.EOPNOTSUPP,
+        errno.ENOTSUP,
+        errno.ENOTSOCK,
+    }
+)
+
+
+# Line comments of languages whose header style is a block comment, such as
+# // in C-like languages and -- in SQL
+_LINE_COMMENTS = (b"//", b"--", b"#")
+
+
+def _leading_comments(data: bytes, comment_style: "CommentStyle") -> bytes:
+    """The shebang, blank lines and comments in front of the first code line."""
+    start = comment_style.start_bytes
+    end_marker = comment_style.end_bytes
+    size = len(data)
+    pos = _line_end(data, 0) if data.startswith(b"#!") else 0
+    while pos < size:
+        line_end = _line_end(data, pos)
+        line = data[pos:line_end].strip()
+        block = line.startswith(start) and not comment_style.line_comments
+        if line and not block and not line.startswith((start, *_LINE_COMMENTS)):
+            break
+        pos = line_end
+        if not block:
+            continue
+        # A block comment runs up to the line with the end marker
+        found = end_marker in line[len(start) :]
+        while not found and pos < size:
+            line_end = _line_end(data, pos)
+            found = end_marker in data[pos:line_end]
+            pos = line_end
+    return data[:pos]
+
+
+def _copy_tail(src: int, dst: int, offset: int, size: int) -> None:
+    """Append bytes ``offset:size`` of file ``src`` to file ``dst``.
+
+    Uses ``os.copy_file_range`` or ``os.sendfile`` so the data does not pass
+    through Python where the platform and filesystem allow it, and falls
+    back to ``COPY_CHUNK`` sized reads and writes.
+    """
+    while offset < size and (methods := _KERNEL_COPY[:1]):
+        method = methods[0]
+        try:
+            if method == "copy_file_range":
+                copied = os.copy_file_range(src, dst, size - offset, offset)
+            else:
+                copied = os.sendfile(dst, src, offset, size - offset)
+        except OSError as e:
+            if e.errno not in _COPY_UNSUPPORTED:
+                raise
+            with contextlib.suppress(ValueError):
+                _KERNEL_COPY.remove(method)
+            continue
+        if not copied:
+            # The file shrank since it was measured
+            return
+        offset += copied
+
+    os.lseek(src, offset, os.SEEK_SET)
+    while offset < size:
+        chunk = os.read(src, min(COPY_CHUNK, size - offset))
+        if not chunk:
+            return
+        view = memoryview(chunk)
+        while view:
+            view = view[os.write(dst, view) :]
+        offset += len(chunk)
+
+
+class CommentStyle:
+    """The comment markers of a file type, with the values derived from them.
+
+    Styles are immutable and hashable. For compatibility with the plain
+    dicts they replace, ``style["start"]`` works and a style equals the dict
+    of its markers.
+    """
+
+    __slots__ = (
+        "start",
+        "middle",
+        "end",
+        "line_comments",
+        "single_line",
+        "start_bytes",
+        "end_bytes",
+        "middle_mark",
+        "_key",
+        "_hash",
+    )
+    MARKERS = ("start", "middle", "end")
+
+    start: str
+    middle: str
+    end: str
+    # Each header line is its own comment (``start == middle``)
+    line_comments: bool
+    # One marker for every line (``start == middle == end``)
+    single_line: bool
+    start_bytes: bytes
+    end_bytes: bytes
+    # ``middle`` as it appears at the start of a stripped line
+    middle_mark: str
+    _key: tuple[str, str, str]
+    _hash: int
+
+    def __init__(self, start: str, middle: str, end: str):
+        set_slot = object.__setattr__
+        set_slot(self, "start", start)
+        set_slot(self, "middle", middle)
+        set_slot(self, "end", end)
+        set_slot(self, "line_comments", start == middle)
+        set_slot(self, "single_line", start == middle == end)
+        set_slot(self, "start_bytes", start.encode("utf-8"))
+        set_slot(self, "end_bytes", end.encode("utf-8"))
+        set_slot(self, "middle_mark", middle.strip())
+        set_slot(self, "_key", (start, middle, end))
+        set_slot(self, "_hash", hash(self._key))
+
+    @classmethod
+    def of(cls, style: "CommentStyle | dict[str, str]") -> "CommentStyle":
+        """Return ``style`` as a ``CommentStyle``, converting a dict of markers."""
+        if isinstance(style, CommentStyle):
+            return style
+        return cls(style["start"], style["middle"], style["end"])
+
+    def __setattr__(self, name: str, value: object) -> None:
+        raise AttributeError("CommentStyle is immutable")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError("CommentStyle is immutable")
+
+    def __reduce__(self) -> tuple[type["CommentStyle"], tuple[str, str, str]]:
+        return CommentStyle, self._key
+
+    def __getitem__(self, name: str) -> str:
+        if name not in self.MARKERS:
+            raise KeyError(name)
+        return getattr(self, name)  # type: ignore[no-any-return]
+
+    def keys(self) -> tuple[str, str, str]:
+        return self.MARKERS
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, CommentStyle):
+            return self._key == other._key
+        if isinstance(other, dict):
+            return other == dict(zip(self.MARKERS, self._key, strict=True))
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __repr__(self) -> str:
+        return "CommentStyle(start={!r}, middle={!r}, end={!r})".format(*self._key)
 
 
 class CommentRegistry:
-    """Registry for file extension to comment style mappings."""
+    """Registry for file extension to comment style mappings.
+
+    Keys starting with a dot are extensions and may have several parts
+    (``.d.ts``), matched case-insensitively, with the longest match winning.
+    Other keys are exact file names (``Makefile``) and win over extensions.
+    """
 
     DEFAULT_MAPPINGS = {
         # Python
@@ -54,15 +538,151 @@ class CommentRegistry:
         ".sv": {"start": "//", "middle": "//", "end": "//"},
     }
 
+    # Interpreters and editor modes by the extension whose style they use,
+    # for files without an extension (see ``detect_language``)
+    LANGUAGES = {
+        "python": ".py",
+        "pypy": ".py",
+        "cython": ".pyx",
+        "node": ".js",
+        "nodejs": ".js",
+        "bun": ".js",
+        "js": ".js",
+        "javascript": ".js",
+        "deno": ".ts",
+        "ts-node": ".ts",
+        "tsx": ".ts",
+        "typescript": ".ts",
+        "java": ".java",
+        "c": ".c",
+        "cpp": ".cpp",
+        "c++": ".cpp",
+        "sh": ".sh",
+        "ash": ".sh",
+        "dash": ".sh",
+        "ksh": ".sh",
+        "mksh": ".sh",
+        "zsh": ".sh",
+        "shell-script": ".sh",
+        "bash": ".bash",
+        "go": ".go",
+        "rust": ".rs",
+        "css": ".css",
+        "scss": ".scss",
+        "html": ".html",
+        "xml": ".xml",
+        "yaml": ".yaml",
+        "vhdl": ".vhd",
+        "verilog": ".v",
+        "systemverilog": ".sv",
+        "perl": ".pl",
+        "ruby": ".rb",
+        "lua": ".lua",
+    }
+
     def __init__(self, custom_mappings: dict | None = None):
-        self.mappings = self.DEFAULT_MAPPINGS.copy()
+        mappings = self.DEFAULT_MAPPINGS.copy()
         if custom_mappings:
-            self.mappings.update(custom_mappings)
+            mappings.update(custom_mappings)
+        # Equal styles share one object
+        styles: dict[CommentStyle, CommentStyle] = {}
+        self.mappings: dict[str, CommentStyle] = {}
+        for key, value in mappings.items():
+            style = CommentStyle.of(value)
+            self.mappings[key] = styles.setdefault(style, style)
+        self._names = {k: v for k, v in self.mappings.items() if k[:1] != "."}
+        self._suffixes = {
+            k.lower(): v for k, v in self.mappings.items() if k[:1] == "."
+        }
+        self._compound = any("." in k[1:] for k in self._suffixes)
+        # Styles detected from content by (device, inode): the file's mtime
+        # when detected and the style
+        self._detected: dict[tuple[int, int], tuple[int, CommentStyle | None]] = {}
+
+    def get_comment_style(self, file_path: str) -> CommentStyle | None:
+        """Get comment style for a file based on its name or extension."""
+        name = os.path.basename(file_path)
+        if self._names:
+            style = self._names.get(name)
+            if style is not None:
+                return style
+        # Leading dots do not start an extension (".bashrc")
+        name = name.lstrip(".").lower()
+        # Try the suffixes at each dot, longest first
+        dot = name.find(".") if self._compound else name.rfind(".")
+        if dot < 0:
+            return self.detect_comment_style(file_path)
+        while dot >= 0:
+            style = self._suffixes.get(name[dot:])
+            if style is not None:
+                return style
+            dot = name.find(".", dot + 1)
+        return None
+
+    def detect_comment_style(self, file_path: str) -> CommentStyle | None:
+        """Get the comment style of a file without an extension from its content.
+
+        At most ``DETECT_BYTES`` are read, and the result is kept until the
+        file's mtime changes.
+        """
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return None
+        if not stat.S_ISREG(st.st_mode):
+            return None
+        key = (st.st_dev, st.st_ino)
+        detected = self._detected.get(key)
+        if detected is not None and detected[0] == st.st_mtime_ns:
+            return detected[1]
 
-    def get_comment_style(self, file_path: str) -> dict[str, str] | None:
-        """Get comment style for a file based on its extension."""
-        ext = Path(file_path).suffix.lower()
-        return self.mappings.get(ext)
+        style = None
+        try:
+            with open(file_path, "rb") as f:
+                language = detect_language(f.read(DETECT_BYTES))
+        except OSError:
+            return None
+        if language is not None:
+            style = self._suffixes.get(self.LANGUAGES.get(language, ""))
+        self._detected[key] = (st.st_mtime_ns, style)
+        return style
+
+
+def detect_language(prefix: bytes) -> str | None:
+    """Guess the language of a file from its first bytes.
+
+    An Emacs (``-*- mode: python -*-``) or Vim (``vim: ft=python``) modeline
+    wins over the shebang interpreter (``#!/usr/bin/env python3``), which
+    wins over an XML or HTML start. Returns a lower case name without a
+    version (``python``) as used in ``CommentRegistry.LANGUAGES``, or None.
+    """
+    if b"\0" in prefix:
+        return None
+    lines = prefix.split(b"\n", 2)
+    emacs = _EMACS_MODELINE.search(
+        b"\n".join(lines[:2] if prefix.startswith(b"#!") else lines[:1])
+    )
+    name = None
+    if emacs:
+        mode = emacs.group(1)
+        if b":" not in mode:
+            name = mode
+        elif match := _EMACS_MODE.search(mode):
+            name = match.group(1)
+    if name is None and (vim := _VIM_MODELINE.search(prefix)):
+        name = vim.group(1)
+    if name is None and prefix.startswith(b"#!"):
+        words = lines[0][2:].split()
+        # "/usr/bin/env [-S] [NAME=value] python3"
+        if words and os.path.basename(words[0]) == b"env":
+            words = [w for w in words[1:] if not w.startswith(b"-") and b"=" not in w]
+        if words:
+            name = os.path.basename(words[0])
+    if name is None and (markup := _MARKUP.match(prefix)):
+        name = b"xml" if markup.group(1).lower() == b"?xml" else b"html"
+    if name is None:
+        return None
+    return _LANGUAGE_VERSION.sub("", name.decode("latin-1").lower()) or None
 
 
 class LicenseHeaderManager:
@@ -73,11 +693,28 @@ class LicenseHeaderManager:
         template_file: str,
         copyright_holder: str,
         comment_registry: CommentRegistry,
+        check: bool = False,
+        stats: Stats | None = None,
+        skip_generated: bool = True,
+        year_mode: str = YEAR_CURRENT,
     ):
         self.template_file = template_file
         self.copyright_holder = copyright_holder
         self.comment_registry = comment_registry
-        self.current_year = datetime.now().year
+        # In check mode files are never opened for writing
+        self.check = check
+        self.stats = stats if stats is not None else Stats()
+        self.skip_generated = skip_generated
+        self.current_year = time.localtime().tm_year
+        self.year_mode = year_mode
+        # First and last year each file was changed, for year modes other
+        # than YEAR_CURRENT (see GitYears)
+        self.file_years: dict[str, tuple[int, int]] = {}
+        self._formatted_template: str | None = None
+        self._formatted_templates: dict[str, str] = {}
+        # Rendered headers by style, or by (style, year) for other years
+        self._header_cache: dict[object, tuple[str, bytes]] = {}
+        self._regex_cache: dict[CommentStyle, re.Pattern[bytes]] = {}
 
     def load_template(self) -> str:
         """Load the license header template."""
@@ -89,33 +726,178 @@ class LicenseHeaderManager:
                 f"Template file not found: {self.template_file}"
             ) from e
 
-    def format_template(self, template: str) -> str:
-        """Format template with current year and copyright holder."""
+    def format_template(self, template: str, year: str | None = None) -> str:
+        """Format template with the year (current by default) and copyright holder."""
         return template.format(
-            year=self.current_year, copyright_holder=self.copyright_holder
+            year=self.current_year if year is None else year,
+            copyright_holder=self.copyright_holder,
         )
 
-    def create_header_comment(self, content: str, comment_style: dict[str, str]) -> str:
+    def get_formatted_template(self, year: str | None = None) -> str:
+        """Load and format the template once per year, reusing it for every file."""
+        if year is not None:
+            formatted = self._formatted_templates.get(year)
+            if formatted is None:
+                formatted = self._formatted_templates[year] = self.format_template(
+                    self.load_template(), year
+                )
+            return formatted
+        if self._formatted_template is None:
+            self._formatted_template = self.format_template(self.load_template())
+        return self._formatted_template
+
+    def get_header(
+        self, comment_style: CommentStyle | dict[str, str], year: str | None = None
+    ) -> tuple[str, bytes]:
+        """Get the rendered header for a comment style as text and UTF-8 bytes.
+
+        ``year`` replaces the current year, as given by ``year_text()``.
+        """
+        comment_style = CommentStyle.of(comment_style)
+        key: object = comment_style if year is None else (comment_style, year)
+        header = self._header_cache.get(key)
+        if header is None:
+            text = self.create_header_comment(
+                self.get_formatted_template(year), comment_style
+            )
+            header = self._header_cache[key] = (text, text.encode("utf-8"))
+        return header
+
+    def get_header_regex(
+        self, comment_style: CommentStyle | dict[str, str]
+    ) -> re.Pattern[bytes]:
+        """Get the regex matching this template's header in any version.
+
+        The header is rendered for ``comment_style`` and matched literally,
+        except that a year may be any year or range of years
+        (``2019-2024``), the copyright holder may be anyone and runs of
+        whitespace may differ. Each year is captured as ``year<n>`` (with
+        the first year as ``first<n>``) and each holder as ``holder<n>``.
+        """
+        comment_style = CommentStyle.of(comment_style)
+        regex = self._regex_cache.get(comment_style)
+        if regex is None:
+            content = self.load_template().format(
+                year=_YEAR_PLACEHOLDER, copyright_holder=_HOLDER_PLACEHOLDER
+            )
+            text = self.create_header_comment(content, comment_style)
+            pattern = []
+            parts = re.split(f"({_YEAR_PLACEHOLDER}|{_HOLDER_PLACEHOLDER})", text)
+            for i, part in enumerate(parts):
+                if part == _YEAR_PLACEHOLDER:
+                    pattern.append(
+                        rb"(?P<year%d>(?P<first%d>\d{4})(?:[ \t]*-[ \t]*\d{4})?)"
+                        % (i, i)
+                    )
+                elif part == _HOLDER_PLACEHOLDER:
+                    pattern.append(rb"(?P<holder%d>[^\r\n]+?)" % i)
+                else:
+                    for token in re.split(r"(\s+)", part):
+                        if "\n" in token:
+                            pattern.append(rb"[ \t]*\r?\n[ \t]*")
+                        elif token.isspace():
+                            pattern.append(rb"[ \t]*")
+                        elif token:
+                            pattern.append(re.escape(token.encode("utf-8")))
+            # The header ends with a line
+            pattern.append(rb"[ \t]*(?=\r?\n|\Z)")
+            regex = self._regex_cache[comment_style] = re.compile(b"".join(pattern))
+        return regex
+
+    def year_text(self, file_path: str) -> str | None:
+        """Text for ``{year}`` in a file's header, or None for the current year."""
+        if self.year_mode == YEAR_CURRENT:
+            return None
+        first, last = self.file_years.get(
+            file_path, (self.current_year, self.current_year)
+        )
+        if self.year_mode == YEAR_RANGE and first < last:
+            return f"{first}-{last}"
+        return str(first)
+
+    def update_header(
+        self, match: re.Match[bytes], data: bytes, year: str | None = None
+    ) -> bytes:
+        """Bring a header matched by ``get_header_regex`` up to date in place.
+
+        Years become ``year``, or else the current year, with a range of
+        years extended to it. Holders are replaced. Everything else in the
+        match is kept, so whitespace and line endings stay as they were.
+        """
+        holder = self.copyright_holder.encode("utf-8")
+        if not holder.isascii():
+            holder = self._encode_header(holder, data)
+        pieces: list[bytes] = []
+        pos = match.start()
+        # Groups are numbered left to right, and a year encloses its first year
+        for name in match.re.groupindex:
+            if name.startswith("first"):
+                continue
+            start, end = match.span(name)
+            if name.startswith("holder"):
+                new = holder
+            elif year is not None:
+                new = year.encode("ascii")
+            else:
+                first = match.group("first" + name[4:])
+                new = b"%d" % self.current_year
+                if end - start > len(first) and int(first) < self.current_year:
+                    new = first + b"-" + new
+            pieces += (data[pos:start], new)
+            pos = end
+        pieces.append(data[pos : match.end()])
+        return b"".join(pieces)
+
+    def is_license_block(
+        self, block: bytes, comment_style: CommentStyle | dict[str, str]
+    ) -> bool:
+        """Check whether a leading comment block is a license header."""
+        return bool(
+            LICENSE_MARKERS.search(block)
+            or self.get_header_regex(comment_style).match(block)
+        )
+
+    def fingerprint(self) -> str:
+        """Hash of everything that determines the expected header of a file."""
+        config = json.dumps(
+            [
+                __version__,
+                self.load_template(),
+                self.copyright_holder,
+                self.current_year,
+                {k: dict(v) for k, v in self.comment_registry.mappings.items()},
+                self.skip_generated,
+                self.year_mode,
+            ],
+            sort_keys=True,
+        )
+        import hashlib
+
+        return hashlib.sha256(config.encode("utf-8")).hexdigest()
+
+    def create_header_comment(
+        self, content: str, comment_style: CommentStyle | dict[str, str]
+    ) -> str:
         """Create a commented header from content."""
+        comment_style = CommentStyle.of(comment_style)
         lines = content.split("\n")
 
-        if comment_style["start"] == comment_style["middle"] == comment_style["end"]:
+        if comment_style.single_line:
             # Single-line comment style (e.g., # for Python)
-            return "\n".join(
-                f"{comment_style['start']} {line}".rstrip() for line in lines
-            )
+            return "\n".join(f"{comment_style.start} {line}".rstrip() for line in lines)
         else:
             # Multi-line comment style (e.g., /* */ for C/Java)
-            result = [comment_style["start"]]
+            result = [comment_style.start]
             for line in lines:
-                result.append(f"{comment_style['middle']} {line}".rstrip())
-            result.append(comment_style["end"])
+                result.append(f"{comment_style.middle} {line}".rstrip())
+            result.append(comment_style.end)
             return "\n".join(result)
 
     def extract_existing_header(
-        self, file_content: str, comment_style: dict[str, str]
+        self, file_content: str, comment_style: CommentStyle | dict[str, str]
     ) -> str | None:
         """Extract existing license header from file content."""
+        comment_style = CommentStyle.of(comment_style)
         lines = file_content.split("\n")
 
         # Skip shebang if present
@@ -133,26 +915,26 @@ class LicenseHeaderManager:
         # Check if we have a comment block starting
         first_line = lines[start_idx].strip()
 
-        if comment_style["start"] == comment_style["middle"]:
+        if comment_style.line_comments:
             # Single-line comments
-            if not first_line.startswith(comment_style["start"]):
+            if not first_line.startswith(comment_style.start):
                 return None
 
             header_lines = []
             for i in range(start_idx, len(lines)):
                 line = lines[i].strip()
-                if line.startswith(comment_style["start"]):
+                if line.startswith(comment_style.start):
                     header_lines.append(line)
                 elif not line:  # Empty line
                     continue
                 else:
                     break
 
-            return "\n".join(header_lines) if header_lines else None
+            header = "\n".join(header_lines)
 
         else:
             # Multi-line comments
-            if not first_line.startswith(comment_style["start"]):
+            if not first_line.startswith(comment_style.start):
                 return None
 
             header_lines = []
@@ -161,199 +943,2380 @@ class LicenseHeaderManager:
                 line = lines[i].strip()
                 header_lines.append(lines[i])
 
-                if comment_style["end"] in line:
+                if comment_style.end in line:
                     break
 
-            return "\n".join(header_lines) if header_lines else None
+            header = "\n".join(header_lines)
+
+        # Other leading comments are not a header
+        if not self.is_license_block(header.encode("utf-8"), comment_style):
+            return None
+        return header
 
     def _extract_header_content(
-        self, header: str, comment_style: dict[str, str]
+        self, header: str, comment_style: CommentStyle | dict[str, str]
     ) -> str:
         """Extract the actual content from a commented header."""
+        comment_style = CommentStyle.of(comment_style)
+        start, end, middle = (
+            comment_style.start,
+            comment_style.end,
+            comment_style.middle_mark,
+        )
         lines = header.split("\n")
         content_lines = []
 
-        if comment_style["start"] == comment_style["middle"]:
+        if comment_style.line_comments:
             # Single-line comments - remove comment prefix
             for line in lines:
                 stripped = line.strip()
-                if stripped.startswith(comment_style["start"]):
-                    content = stripped[len(comment_style["start"]) :].strip()
+                if stripped.startswith(start):
+                    content = stripped[len(start) :].strip()
                     content_lines.append(content)
         else:
             # Multi-line comments - remove comment markers
             for i, line in enumerate(lines):
                 stripped = line.strip()
-                if i == 0 and stripped.startswith(comment_style["start"]):
+                if i == 0 and stripped.startswith(start):
                     # First line with start marker
-                    content = stripped[len(comment_style["start"]) :].strip()
+                    content = stripped[len(start) :].strip()
                     if content:
                         content_lines.append(content)
-                elif stripped.endswith(comment_style["end"]):
+                elif stripped.endswith(end):
                     # Last line with end marker
-                    content = stripped[: -len(comment_style["end"])].strip()
-                    if content.startswith(comment_style["middle"].strip()):
-                        content = content[
-                            len(comment_style["middle"].strip()) :
-                        ].strip()
+                    content = stripped[: -len(end)].strip()
+                    if content.startswith(middle):
+                        content = content[len(middle) :].strip()
                     if content:
                         content_lines.append(content)
                     break
-                elif stripped.startswith(comment_style["middle"].strip()):
+                elif stripped.startswith(middle):
                     # Middle line
-                    content = stripped[len(comment_style["middle"].strip()) :].strip()
+                    content = stripped[len(middle) :].strip()
                     content_lines.append(content)
 
         return "\n".join(content_lines)
 
+    def scan_header(
+        self,
+        data: bytes,
+        comment_style: CommentStyle | dict[str, str],
+        crlf: bool = False,
+    ) -> tuple[int, int, int, int]:
+        """Locate the shebang, existing header and body of a file in one pass.
+
+        Returns byte offsets ``(shebang_end, header_start, header_end,
+        body_start)``: the shebang line (with its newline) and an encoding
+        declaration comment on the first or second line are
+        ``data[:shebang_end]``, the existing header is
+        ``data[header_start:header_end]`` and is empty if there is none, and
+        the body starts at ``body_start``. Blank lines around a header are
+        dropped; without a header only empty lines (LF, or CRLF if ``crlf``)
+        before the body are.
+        """
+        comment_style = CommentStyle.of(comment_style)
+        start = comment_style.start_bytes
+        end_marker = comment_style.end_bytes
+        size = len(data)
+
+        pos = _line_end(data, 0) if data.startswith(b"#!") else 0
+        line_end = _line_end(data, pos)
+        line = data[pos:line_end].strip()
+        if (
+            line.startswith(start)
+            and CODING_COOKIE.search(line)
+            and (comment_style.line_comments or end_marker in line)
+        ):
+            pos = line_end
+        shebang_end = pos
+
+        # A header starts at the first non-blank line
+        line_end = pos
+        while pos < size:
+            line_end = _line_end(data, pos)
+            if data[pos:line_end].strip():
+                break
+            pos = line_end
+        header_start = pos
+
+        if pos < size and data[pos:line_end].strip().startswith(start):
+            if comment_style.line_comments:
+                # Single-line comments: the run of comment lines
+                while pos < size:
+                    line_end = _line_end(data, pos)
+                    if not data[pos:line_end].strip().startswith(start):
+                        break
+                    pos = line_end
+            else:
+                # Multi-line comments: up to the line with the end marker
+                while pos < size:
+                    line_end = _line_end(data, pos)
+                    found = end_marker in data[pos:line_end]
+                    pos = line_end
+                    if found:
+                        break
+            header_end = pos
+
+            # Skip blank lines after the header
+            while pos < size:
+                line_end = _line_end(data, pos)
+                if data[pos:line_end].strip():
+                    break
+                pos = line_end
+            return shebang_end, header_start, header_end, pos
+
+        # No header: keep the file as is apart from leading empty lines
+        pos = shebang_end
+        while True:
+            if data.startswith(b"\n", pos):
+                pos += 1
+            elif crlf and data.startswith(b"\r\n", pos):
+                pos += 2
+            else:
+                break
+        return shebang_end, pos, pos, pos
+
     def remove_existing_header(
-        self, file_content: str, comment_style: dict[str, str]
+        self, file_content: str, comment_style: CommentStyle | dict[str, str]
     ) -> str:
         """Remove existing license header from file content."""
-        # First, check if there's actually a header to remove
-        existing_header = self.extract_existing_header(file_content, comment_style)
-        if not existing_header:
+        data = file_content.encode("utf-8")
+        shebang_end, header_start, header_end, body_start = self.scan_header(
+            data, comment_style
+        )
+        if header_start == header_end or not self.is_license_block(
+            data[header_start:header_end], comment_style
+        ):
             return file_content
 
-        lines = file_content.split("\n")
-        header_lines = existing_header.split("\n")
-
         # Preserve shebang
-        start_idx = 0
-        preserved_lines = []
-        if lines and lines[0].startswith("#!"):
-            preserved_lines.append(lines[0])
-            start_idx = 1
-
-        # Skip empty lines before header
-        while start_idx < len(lines) and not lines[start_idx].strip():
-            start_idx += 1
-
-        if start_idx >= len(lines):
-            return file_content
+        body = data[body_start:]
+        shebang = data[:shebang_end]
+        if not body:
+            shebang = shebang.removesuffix(b"\n")
+        return (shebang + body).decode("utf-8")
+
+    @staticmethod
+    def _prefix_has_header(prefix: bytes, header: bytes, at_eof: bool) -> bool:
+        """Check whether a file prefix already starts with ``header``.
+
+        Only returns True when rebuilding the file would leave it unchanged:
+        the header follows the BOM and shebang (if any) directly and is
+        followed by a newline and then either end of file or a non-blank
+        line. CRLF files are compared against a CRLF header.
+        """
+        newline = b"\n"
+        first_newline = prefix.find(b"\n")
+        if first_newline > 0 and prefix[first_newline - 1] == 0x0D:
+            header = header.replace(b"\n", b"\r\n")
+            newline = b"\r\n"
+
+        start = len(codecs.BOM_UTF8) if prefix.startswith(codecs.BOM_UTF8) else 0
+        if prefix.startswith(b"#!", start):
+            start = first_newline + 1
+            if not start:
+                return False
 
-        # Remove the exact header lines that were detected
-        if comment_style["start"] == comment_style["middle"]:
-            # Single-line comments - remove exact matching header lines
-            header_end_idx = start_idx
-            for expected_line in header_lines:
-                if (
-                    header_end_idx < len(lines)
-                    and lines[header_end_idx].strip() == expected_line.strip()
-                ):
-                    header_end_idx += 1
-                else:
-                    break
+        end = start + len(header)
+        if prefix[start:end] != header or not prefix.startswith(newline, end):
+            return False
 
-            # Skip empty lines after header
-            while header_end_idx < len(lines) and not lines[header_end_idx].strip():
-                header_end_idx += 1
+        rest = prefix[end + len(newline) :]
+        if not rest:
+            return at_eof
+        return bool(rest.split(b"\n", 1)[0].strip())
 
-            start_idx = header_end_idx
-        else:
-            # Multi-line comments - find the end of the specific header block
-            first_line = lines[start_idx].strip()
-            if first_line.startswith(comment_style["start"]):
-                while start_idx < len(lines):
-                    line = lines[start_idx]
-                    start_idx += 1
-                    if comment_style["end"] in line:
-                        break
+    def sniff(
+        self, prefix: bytes, at_eof: bool, comment_style: CommentStyle
+    ) -> str | None:
+        """Return why a file should be skipped, judging by its first bytes.
+
+        UTF-16 and UTF-32 files are not supported, files with NUL bytes are
+        binary, files with a ``GENERATED_MARKERS`` marker in their leading
+        comments are generated (unless ``skip_generated`` is off) and files
+        without a line break in the first ``SNIFF_BYTES`` are minified.
+        """
+        window = prefix[:SNIFF_BYTES]
+        if window.startswith((codecs.BOM_UTF32_LE, codecs.BOM_UTF32_BE)):
+            return "UTF-32"
+        if window.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+            return "UTF-16"
+        if b"\0" in window:
+            return "binary"
+        if self.skip_generated:
+            comments = _leading_comments(window, comment_style)
+            if any(m in comments for m in GENERATED_MARKERS):
+                return "generated"
+        if not at_eof and len(window) == SNIFF_BYTES and b"\n" not in window:
+            return "minified"
+        return None
+
+    def _rebuild_prefix(
+        self,
+        prefix: bytes,
+        at_eof: bool,
+        comment_style: CommentStyle,
+        new_header: bytes,
+        year: str | None = None,
+    ) -> tuple[int, bytes] | None:
+        """Rebuild the header region of a file from a prefix of it.
+
+        Returns the length of the region in front of the first body line and
+        its replacement, or None if the prefix ends before the first body line
+        and more of the file has to be read.
+        """
+        consumed = len(prefix) if at_eof else prefix.rfind(b"\n") + 1
+        # The BOM stays in front of everything else
+        bom = codecs.BOM_UTF8 if prefix.startswith(codecs.BOM_UTF8) else b""
+        data = prefix[len(bom) : consumed]
+
+        # Keep CRLF files CRLF
+        first_newline = data.find(b"\n")
+        crlf = first_newline > 0 and data[first_newline - 1] == 0x0D
+
+        with self.stats.phase("scan"):
+            shebang_end, header_start, header_end, body_start = self.scan_header(
+                data, comment_style, crlf
+            )
 
-                # Skip empty lines after header
-                while start_idx < len(lines) and not lines[start_idx].strip():
-                    start_idx += 1
+        # The header region is only known to be complete once a body line
+        # follows it
+        if not at_eof and not data[body_start:].strip():
+            return None
 
-        # Return preserved lines + remaining content
-        remaining_lines = lines[start_idx:] if start_idx < len(lines) else []
-        return "\n".join(preserved_lines + remaining_lines)
+        with self.stats.phase("render"):
+            newline = b"\r\n" if crlf else b"\n"
+            # Leading comments kept below the header
+            kept = b""
+            match = None
+            if header_start != header_end:
+                match = self.get_header_regex(comment_style).match(
+                    data, header_start, header_end
+                )
+                if match is not None:
+                    # An earlier version of this header: the rest of the
+                    # block is kept unless it is more license text
+                    rest = _line_end(data, match.end())
+                    if rest < header_end and not LICENSE_MARKERS.search(
+                        data, rest, header_end
+                    ):
+                        kept = data[rest:body_start]
+                elif not LICENSE_MARKERS.search(data, header_start, header_end):
+                    # Not a license: keep it apart from the new header
+                    kept = newline + data[header_start:body_start]
+                if not kept:
+                    # Keep a following comment block apart from the header
+                    first_line = data[body_start : _line_end(data, body_start)]
+                    if first_line.lstrip().startswith(comment_style.start_bytes):
+                        kept = data[header_end:body_start]
+
+            if match is not None:
+                new_header = self.update_header(match, data, year)
+            else:
+                if not bom:
+                    new_header = self._encode_header(new_header, data)
+                if crlf:
+                    new_header = new_header.replace(b"\n", b"\r\n")
+            shebang = data[:shebang_end]
+            if shebang and not shebang.endswith(b"\n"):
+                shebang += newline
+            new_region = bom + shebang + new_header + newline + kept
+        return len(bom) + body_start, new_region
+
+    @staticmethod
+    def _encode_header(header: bytes, data: bytes) -> bytes:
+        """Encode a UTF-8 header in the encoding of the file starting with ``data``.
+
+        An ASCII header fits any ASCII-compatible encoding as is. Otherwise
+        the file has to be UTF-8 or declare its encoding in its first two
+        lines.
+        """
+        if header.isascii():
+            return header
+        try:
+            data.decode("utf-8")
+            return header
+        except UnicodeDecodeError:
+            pass
+        first_lines = b"\n".join(data.split(b"\n", 2)[:2])
+        match = CODING_COOKIE.search(first_lines)
+        if not match:
+            raise ValueError("File is not UTF-8 and declares no encoding")
+        return header.decode("utf-8").encode(match.group(1).decode("ascii"))
+
+    @staticmethod
+    def _replace_prefix(file_path: str, old_length: int, new_prefix: bytes) -> int:
+        """Replace the first ``old_length`` bytes of a file atomically.
+
+        The new file is built next to the original: ``new_prefix`` is
+        written, the rest of the original is copied with ``_copy_tail`` and
+        the result is moved over the original with ``os.replace``, so an
+        interrupted run never leaves a partly written file. Permissions (and
+        ownership where allowed) are kept. Returns the number of bytes
+        written.
+        """
+        # Replace the file a symlink points to, not the symlink
+        target = os.path.realpath(file_path) if os.path.islink(file_path) else file_path
+        directory, name = os.path.split(target)
+        with open(target, "rb") as src:
+            st = os.fstat(src.fileno())
+            import tempfile
+
+            fd, tmp_path = tempfile.mkstemp(prefix=f".{name}.", dir=directory)
+            try:
+                with os.fdopen(fd, "wb") as tmp:
+                    tmp.write(new_prefix)
+                    tmp.flush()
+                    _copy_tail(src.fileno(), tmp.fileno(), old_length, st.st_size)
+                    if hasattr(os, "fchown"):
+                        with contextlib.suppress(OSError):
+                            os.fchown(tmp.fileno(), st.st_uid, st.st_gid)
+                os.chmod(tmp_path, stat.S_IMODE(st.st_mode))
+                os.replace(tmp_path, target)
+            except BaseException:
+                with contextlib.suppress(OSError):
+                    os.unlink(tmp_path)
+                raise
+        return len(new_prefix) + max(st.st_size - old_length, 0)
 
     def process_file(self, file_path: str) -> bool:
         """Process a single file to add/update license header."""
+        return self.process_file_status(file_path) == STATUS_UPDATED
+
+    def process_file_status(self, file_path: str) -> str:
+        """Process a single file and return one of the ``STATUS_*`` values."""
+        if not self.stats.enabled:
+            return self._process_file_status(file_path)
+        start = time.perf_counter()
+        status = self._process_file_status(file_path)
+        self.stats.file_done(file_path, status, time.perf_counter() - start)
+        return status
+
+    def _process_file_status(self, file_path: str) -> str:
+        comment_style = self._comment_style(file_path)
+        if comment_style is None:
+            return STATUS_SKIPPED
+
+        size = self._head_size(comment_style)
+        try:
+            with self.stats.phase("read"):
+                prefix = self._read_head(file_path, size)
+        except Exception as e:
+            print(f"Error reading {file_path}: {e}")
+            return STATUS_ERROR
+        self.stats.bytes_read += len(prefix)
+
+        plan = self._plan_file(file_path, comment_style, prefix, len(prefix) < size)
+        if isinstance(plan, str):
+            return plan
+        try:
+            with self.stats.phase("write"):
+                written = self._replace_prefix(file_path, *plan)
+        except Exception as e:
+            return self._written(file_path, e)
+        return self._written(file_path, written)
+
+    def _comment_style(self, file_path: str) -> CommentStyle | None:
+        """Comment style of a file, reporting files without one as skipped."""
         comment_style = self.comment_registry.get_comment_style(file_path)
         if not comment_style:
             print(f"Skipping {file_path}: No comment style registered")
-            return False
-
+            self.stats.skip("no comment style")
+            return None
+        return comment_style
+
+    def _head_size(self, comment_style: CommentStyle) -> int:
+        """Number of bytes first read from a file with ``comment_style``."""
+        return max(len(self.get_header(comment_style)[1]) + HEADER_SLACK, SNIFF_BYTES)
+
+    @staticmethod
+    def _read_head(
+        file_path: str, size: int, offset: int = 0, advise: bool = False
+    ) -> bytes:
+        """Read up to ``size`` bytes of a file starting at ``offset``.
+
+        With ``advise`` the kernel is told up front that the whole range is
+        needed, so it can fetch it in one go on network filesystems.
+        """
+        with open(file_path, "rb") as f:
+            if advise and hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(f.fileno(), offset, size, os.POSIX_FADV_WILLNEED)
+            if offset:
+                f.seek(offset)
+            return f.read(size)
+
+    def _plan_file(
+        self,
+        file_path: str,
+        comment_style: CommentStyle,
+        prefix: bytes,
+        at_eof: bool,
+        read_more: Callable[[int], bytes] | None = None,
+    ) -> str | tuple[int, bytes]:
+        """Decide what to do with a file given its first bytes.
+
+        Returns a final ``STATUS_*`` value, or the length of the header
+        region and its replacement if the file has to be rewritten. Further
+        bytes come from ``read_more(size)`` if given, otherwise from the file.
+        """
+        stats = self.stats
+        year = self.year_text(file_path)
+        _, new_header_bytes = self.get_header(comment_style, year)
         try:
-            with open(file_path, encoding="utf-8") as f:
-                original_content = f.read()
+            reason = self.sniff(prefix, at_eof, comment_style)
+            if reason is not None:
+                print(f"Skipping {file_path}: Looks like a {reason} file")
+                stats.skip(reason)
+                return STATUS_SKIPPED
+            if self._prefix_has_header(prefix, new_header_bytes, at_eof):
+                return STATUS_UNCHANGED
+
+            # Read more until the header region is complete
+            while True:
+                rebuilt = self._rebuild_prefix(
+                    prefix, at_eof, comment_style, new_header_bytes, year
+                )
+                if rebuilt is not None:
+                    break
+                if len(prefix) >= MAX_HEADER_BYTES:
+                    print(
+                        f"Skipping {file_path}: "
+                        f"Header region exceeds {MAX_HEADER_BYTES} bytes"
+                    )
+                    stats.skip("header too large")
+                    return STATUS_SKIPPED
+                with stats.phase("read"):
+                    if read_more is None:
+                        chunk = self._read_head(file_path, len(prefix), len(prefix))
+                    else:
+                        chunk = read_more(len(prefix))
+                stats.bytes_read += len(chunk)
+                at_eof = len(chunk) < len(prefix)
+                prefix += chunk
         except Exception as e:
             print(f"Error reading {file_path}: {e}")
-            return False
+            return STATUS_ERROR
+
+        consumed, new_prefix = rebuilt
+        if new_prefix == prefix[:consumed]:
+            return STATUS_UNCHANGED
+        if self.check:
+            print(f"Missing or outdated license header in {file_path}")
+            return STATUS_NONCOMPLIANT
+        return rebuilt
+
+    def process_stream(self, file_path: str, src: BinaryIO, dst: BinaryIO) -> str:
+        """Copy a file from ``src`` to ``dst`` with its header added or updated.
+
+        ``file_path`` names the content for its comment style and messages,
+        and is not opened. Only the header region is held in memory; the rest
+        is copied in ``COPY_CHUNK`` pieces. Content that is skipped, or in
+        check mode needs a header, is copied unchanged. Returns one of the
+        ``STATUS_*`` values.
+        """
+        chunks: list[bytes] = []
+
+        def read_more(size: int) -> bytes:
+            chunk = src.read(size)
+            chunks.append(chunk)
+            return chunk
+
+        plan: str | tuple[int, bytes] = STATUS_SKIPPED
+        comment_style = self._comment_style(file_path)
+        if comment_style is not None:
+            size = self._head_size(comment_style)
+            try:
+                with self.stats.phase("read"):
+                    prefix = read_more(size)
+            except Exception as e:
+                print(f"Error reading {file_path}: {e}")
+                return STATUS_ERROR
+            self.stats.bytes_read += len(prefix)
+            plan = self._plan_file(
+                file_path, comment_style, prefix, len(prefix) < size, read_more
+            )
 
-        # Load and format template
-        template = self.load_template()
-        formatted_template = self.format_template(template)
-        new_header = self.create_header_comment(formatted_template, comment_style)
+        try:
+            with self.stats.phase("write"):
+                head = b"".join(chunks)
+                if not isinstance(plan, str):
+                    old_length, new_prefix = plan
+                    head = new_prefix + head[old_length:]
+                dst.write(head)
+                written = len(head)
+                while chunk := src.read(COPY_CHUNK):
+                    dst.write(chunk)
+                    written += len(chunk)
+                dst.flush()
+        except Exception as e:
+            return self._written(file_path, e)
+        if isinstance(plan, str):
+            return plan
+        return self._written(file_path, written)
 
-        # TODO: Add optimization to check if existing header is already correct
+    def _written(self, file_path: str, result: int | Exception) -> str:
+        """Report the outcome of ``_replace_prefix``: bytes written or an error."""
+        if isinstance(result, Exception):
+            print(f"Error writing {file_path}: {result}")
+            return STATUS_ERROR
+        self.stats.bytes_written += result
+        print(f"Updated license header in {file_path}")
+        return STATUS_UPDATED
 
-        # Remove existing header if present
-        content_without_header = self.remove_existing_header(
-            original_content, comment_style
-        )
 
-        # Create new content with header
-        # Check if original content starts with shebang
-        lines = original_content.split("\n")
-        if lines and lines[0].startswith("#!"):
-            # Preserve shebang at the top
-            shebang = lines[0]
-            remaining_content = content_without_header
-            if remaining_content.startswith(shebang):
-                remaining_content = remaining_content[len(shebang) :].lstrip("\n")
-
-            remaining_content = remaining_content.lstrip("\n")
-            if remaining_content:
-                new_content = shebang + "\n" + new_header + "\n" + remaining_content
+# State recorded for a verified file: stat data or a git blob id
+CacheState = list[int] | str
+
+# Characters that make a pattern component more than a literal name
+_GLOB_MAGIC = re.compile(r"[*?[]")
+
+# Directories never entered by the --recursive walker
+DEFAULT_PRUNE_DIRS = frozenset(
+    {".git", ".hg", ".svn", "node_modules", "build", "third_party"}
+)
+
+
+class ResultCache:
+    """On-disk record of files already verified to have the correct header.
+
+    Entries map an absolute path to its (size, mtime_ns, inode) at the time
+    it was verified. The cache file is named after the header configuration
+    fingerprint, so changing the template, holder, year or comment styles
+    starts from an empty cache.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        fingerprint: str,
+        max_entries: int = CACHE_MAX_ENTRIES,
+    ):
+        self.cache_dir = cache_dir
+        self.path = os.path.join(cache_dir, f"{fingerprint}.json")
+        self.max_entries = max_entries
+        self.entries = self._load()
+        self._updated: dict[str, CacheState] = {}
+        self._removed: set[str] = set()
+        # Key and state of files found not fresh, until they are recorded
+        self._checked: dict[str, tuple[str, CacheState | None]] = {}
+        self._racy_after = time.time_ns() - CACHE_RACY_NS
+
+    def _load(self) -> dict[str, CacheState]:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def _entry_key(self, file_path: str) -> str:
+        """Key under which a file is stored in the cache."""
+        return os.path.abspath(file_path)
+
+    def _file_state(self, file_path: str, key: str) -> CacheState | None:
+        """Current state of a file, or None if it cannot be trusted."""
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return None
+        if st.st_mtime_ns >= self._racy_after:
+            return None
+        return [st.st_size, st.st_mtime_ns, st.st_ino]
+
+    def start_run(self) -> None:
+        """Prepare a cache kept in memory by the daemon for another run."""
+        self._racy_after = time.time_ns() - CACHE_RACY_NS
+        self._checked.clear()
+
+    def is_fresh(self, file_path: str) -> bool:
+        """Check whether a file is unchanged since it was last verified."""
+        key = self._entry_key(file_path)
+        state = self._file_state(file_path, key)
+        if state is not None and self.entries.get(key) == state:
+            return True
+        self._checked[file_path] = (key, state)
+        return False
+
+    def record(self, file_path: str, modified: bool = True) -> None:
+        """Record a file as verified in its current state.
+
+        Unless the file was ``modified`` since ``is_fresh`` found it stale,
+        the state seen then is recorded without looking at the file again.
+        """
+        checked = self._checked.pop(file_path, None)
+        if modified or checked is None:
+            key = self._entry_key(file_path)
+            state = self._file_state(file_path, key)
+        else:
+            key, state = checked
+        if state is None:
+            self.discard(file_path)
+            return
+        self._removed.discard(key)
+        self._updated[key] = self.entries[key] = state
+
+    def discard(self, file_path: str) -> None:
+        """Forget a file, e.g. because it no longer has a correct header."""
+        self._checked.pop(file_path, None)
+        key = self._entry_key(file_path)
+        self._updated.pop(key, None)
+        if self.entries.pop(key, None) is not None:
+            self._removed.add(key)
+
+    def save(self, keep: Iterable[str] = ()) -> None:
+        """Merge this run's changes into the cache file.
+
+        The file on disk is re-read and replaced atomically, so concurrent
+        runs never see a torn cache; at worst one run's entries are lost and
+        those files are checked again next time. ``keep`` names the cache
+        files of other configurations in use, which are never evicted.
+        """
+        if not self._updated and not self._removed:
+            return
+
+        entries = self._load()
+        for key in self._removed:
+            entries.pop(key, None)
+        for key, value in self._updated.items():
+            # Re-insert so the most recently verified entries are kept
+            entries.pop(key, None)
+            entries[key] = value
+        if len(entries) > self.max_entries:
+            entries = dict(list(entries.items())[-self.max_entries :])
+
+        import tempfile
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entries, f, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
+            raise
+        self._updated.clear()
+        self._removed.clear()
+        self._evict_stale_configs(keep)
+
+    def _evict_stale_configs(self, keep: Iterable[str] = ()) -> None:
+        """Delete cache files of old configurations beyond CACHE_MAX_FILES.
+
+        This cache and those in ``keep`` count towards the bound but are
+        never deleted, however many there are.
+        """
+        live = {os.path.basename(path) for path in keep}
+        live.add(os.path.basename(self.path))
+        try:
+            with os.scandir(self.cache_dir) as it:
+                caches = [
+                    e for e in it if e.name.endswith(".json") and e.name not in live
+                ]
+            caches.sort(key=lambda e: e.stat().st_mtime_ns, reverse=True)
+        except OSError:
+            return
+        for entry in caches[max(CACHE_MAX_FILES - len(live), 0) :]:
+            with contextlib.suppress(OSError):
+                os.unlink(entry.path)
+
+
+class GitIndex:
+    """Read-only view of the stat data and blob ids cached in a git index."""
+
+    # ctime s/ns, mtime s/ns, dev, ino, mode, uid, gid, size
+    _STAT = struct.Struct(">10I")
+
+    def __init__(self, worktree: str, git_dir: str):
+        self.worktree = worktree
+        self.entries: dict[str, tuple[int, int, int, int, str]] = {}
+        cwd = os.path.relpath(os.getcwd(), worktree)
+        # Prefixes turning a path relative to the cwd, or an absolute path
+        # below the worktree, into one relative to the worktree
+        self._cwd_prefix = "" if cwd == os.curdir else cwd + os.sep
+        self._root_prefix = os.path.join(worktree, "")
+        index_path = os.path.join(git_dir, "index")
+        try:
+            self.mtime_ns = os.stat(index_path).st_mtime_ns
+            with open(index_path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return
+        self._parse(data, self._hash_size(git_dir))
+
+    @classmethod
+    def find(cls, start_dir: str = ".") -> "GitIndex | None":
+        """Find the repository containing ``start_dir`` and load its index."""
+        directory = os.path.abspath(start_dir)
+        while True:
+            dot_git = os.path.join(directory, ".git")
+            if os.path.isdir(dot_git):
+                return cls(directory, dot_git)
+            if os.path.isfile(dot_git):
+                # Worktrees and submodules: ".git" is a "gitdir: <path>" file
+                with open(dot_git, encoding="utf-8") as f:
+                    content = f.read().strip()
+                if content.startswith("gitdir:"):
+                    git_dir = os.path.join(directory, content[7:].strip())
+                    return cls(directory, os.path.normpath(git_dir))
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                return None
+            directory = parent
+
+    @staticmethod
+    def _hash_size(git_dir: str) -> int:
+        try:
+            with open(os.path.join(git_dir, "config"), encoding="utf-8") as f:
+                config = f.read()
+        except OSError:
+            return 20
+        if re.search(r"objectformat\s*=\s*sha256", config, re.IGNORECASE):
+            return 32
+        return 20
+
+    def _parse(self, data: bytes, hash_size: int) -> None:
+        if len(data) < 12 or data[:4] != b"DIRC":
+            return
+        version, count = struct.unpack_from(">II", data, 4)
+        if version not in (2, 3, 4):
+            return
+
+        entries = {}
+        offset = 12
+        name = b""
+        for _ in range(count):
+            stat = self._STAT.unpack_from(data, offset)
+            sha = data[offset + 40 : offset + 40 + hash_size]
+            (flags,) = struct.unpack_from(">H", data, offset + 40 + hash_size)
+            offset += 42 + hash_size
+            if version >= 3 and flags & 0x4000:
+                (extended,) = struct.unpack_from(">H", data, offset)
+                offset += 2
             else:
-                new_content = shebang + "\n" + new_header + "\n"
+                extended = 0
+
+            if version == 4:
+                # Path is stored as a prefix length shared with the previous
+                # entry, then the NUL terminated remainder
+                byte = data[offset]
+                offset += 1
+                strip = byte & 0x7F
+                while byte & 0x80:
+                    byte = data[offset]
+                    offset += 1
+                    strip = ((strip + 1) << 7) | (byte & 0x7F)
+                end = data.index(b"\0", offset)
+                name = name[: len(name) - strip] + data[offset:end]
+                offset = end + 1
+            else:
+                start = offset
+                end = data.index(b"\0", start)
+                name = data[start:end]
+                # Entries are NUL padded to a multiple of eight bytes
+                entry_start = start - 42 - hash_size - (2 if extended else 0)
+                offset = entry_start + ((end - entry_start + 8) & ~7)
+
+            # Skip conflicted, assume-valid, skip-worktree and intent-to-add
+            # entries: their stat data does not describe the worktree file
+            if flags & 0xB000 or extended & 0x6000:
+                continue
+            entries[name.decode("utf-8", "surrogateescape")] = (
+                stat[2],
+                stat[3],
+                stat[9],
+                stat[5],
+                sha.hex(),
+            )
+
+        # A split index keeps most entries in a shared file; don't guess
+        if b"link" in self._extensions(data, offset, hash_size):
+            return
+        self.entries = entries
+
+    @staticmethod
+    def _extensions(data: bytes, offset: int, hash_size: int) -> list[bytes]:
+        signatures = []
+        while offset + 8 <= len(data) - hash_size:
+            signature = data[offset : offset + 4]
+            (size,) = struct.unpack_from(">I", data, offset + 4)
+            signatures.append(signature)
+            offset += 8 + size
+        return signatures
+
+    def relpath(self, file_path: str) -> str | None:
+        """Path of a file relative to the worktree, or None if outside it."""
+        # Cheaper than relpath() for the usual paths below the worktree
+        if not os.path.isabs(file_path):
+            rel = _normpath(self._cwd_prefix + file_path)
+        elif file_path.startswith(self._root_prefix):
+            rel = _normpath(file_path[len(self._root_prefix) :])
         else:
-            remaining_content = content_without_header.lstrip("\n")
-            if remaining_content:
-                new_content = new_header + "\n" + remaining_content
+            rel = os.path.relpath(file_path, self.worktree)
+        if rel == os.curdir or rel.startswith(os.pardir):
+            return None
+        return rel.replace(os.sep, "/")
+
+    def blob_id(self, file_path: str, rel: str | None = None) -> str | None:
+        """Blob id of a file if the index proves the worktree copy matches it."""
+        if rel is None:
+            rel = self.relpath(file_path)
+        entry = self.entries.get(rel) if rel is not None else None
+        if entry is None:
+            return None
+        mtime_s, mtime_ns, size, ino, sha = entry
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return None
+
+        if (
+            int(st.st_mtime) != mtime_s
+            or (mtime_ns and st.st_mtime_ns % 1_000_000_000 != mtime_ns)
+            or st.st_size & 0xFFFFFFFF != size
+            or (ino and st.st_ino & 0xFFFFFFFF != ino)
+        ):
+            return None
+        # Racily clean: modified in the same instant the index was written
+        if mtime_s * 1_000_000_000 + mtime_ns >= self.mtime_ns:
+            return None
+        return sha
+
+
+class GitIndexCache(ResultCache):
+    """Manifest of verified blob ids, checked against the git index.
+
+    A file is skipped when the index shows its worktree copy is still the
+    blob that was last verified, so fresh checkouts (new mtimes, same
+    content) are skipped too. Entries are keyed by repository-relative path.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        fingerprint: str,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        git_index: GitIndex | None = None,
+    ):
+        self.git_index = git_index if git_index is not None else GitIndex.find()
+        super().__init__(cache_dir, f"git-{fingerprint}", max_entries)
+
+    def start_run(self) -> None:
+        # The index changes between runs
+        self.git_index = GitIndex.find()
+        super().start_run()
+
+    def _entry_key(self, file_path: str) -> str:
+        if self.git_index is not None:
+            rel = self.git_index.relpath(file_path)
+            if rel is not None:
+                return rel
+        return os.path.abspath(file_path)
+
+    def _file_state(self, file_path: str, key: str) -> CacheState | None:
+        if self.git_index is None:
+            return None
+        return self.git_index.blob_id(file_path, key)
+
+
+class GitYears:
+    """Years in which each file of a git repository was first and last changed.
+
+    Built from a single streamed ``git log --name-only`` over the whole
+    history and cached in ``cache_dir`` against the commit it was built
+    at; when HEAD has moved forward only the new commits are read. Author
+    dates are used and renames are not followed.
+    """
+
+    CACHE_NAME = "git-years.cache"
+
+    def __init__(self, git_index: GitIndex, cache_dir: str = DEFAULT_CACHE_DIR):
+        self.git_index = git_index
+        self.path = os.path.join(cache_dir, self.CACHE_NAME)
+        self.head: str | None = None
+        # Repository-relative path: [first year, last year]
+        self.years: dict[str, list[int]] = {}
+        # Files that differ from HEAD, in the index or the worktree
+        self.modified: frozenset[str] = frozenset()
+
+    @classmethod
+    def load(cls, cache_dir: str = DEFAULT_CACHE_DIR) -> "GitYears | None":
+        """Years of the repository containing the working directory.
+
+        Returns None outside a git repository or if git cannot be run.
+        """
+        git_index = GitIndex.find()
+        if git_index is None:
+            return None
+        git_years = cls(git_index, cache_dir)
+        try:
+            git_years.update()
+        except OSError:
+            return None
+        return git_years
+
+    def _git(self, *args: str, check: bool = True) -> tuple[int, str]:
+        import subprocess
+
+        result = subprocess.run(
+            ["git", "-C", self.git_index.worktree, *args],
+            capture_output=True,
+            encoding="utf-8",
+            errors="surrogateescape",
+        )
+        if check and result.returncode:
+            raise OSError(f"git {args[0]} failed: {result.stderr.strip()}")
+        return result.returncode, result.stdout
+
+    def update(self) -> None:
+        """Bring the years up to date with HEAD, reading as little as possible."""
+        code, head = self._git("rev-parse", "--verify", "--quiet", "HEAD", check=False)
+        if code:
+            return  # No commits yet
+        self.head = head.strip()
+        _, diff = self._git("diff", "--name-only", "-z", "HEAD")
+        self.modified = frozenset(diff.split("\0")) - {""}
+
+        cached_head = None
+        with contextlib.suppress(OSError, ValueError, TypeError, KeyError):
+            with open(self.path, encoding="utf-8") as f:
+                cached = json.load(f)
+            cached_head = cached["head"]
+            self.years = cached["years"]
+        if cached_head == self.head:
+            return
+        if cached_head is not None:
+            code, _ = self._git(
+                "merge-base", "--is-ancestor", cached_head, self.head, check=False
+            )
+            if code:
+                # History was rewritten: start again
+                cached_head = None
+                self.years = {}
+        self._read_log(f"{cached_head}..{self.head}" if cached_head else self.head)
+        self._save()
+
+    def _read_log(self, revisions: str) -> None:
+        import subprocess
+
+        # With -z every path is NUL-terminated and never quoted. A commit's
+        # year is a \x01-prefixed field, and its first path follows a newline
+        command = [
+            "git",
+            "-C",
+            self.git_index.worktree,
+            "log",
+            "-z",
+            "--no-renames",
+            "--name-only",
+            "--date=format:%Y",
+            "--format=%x01%ad",
+            revisions,
+            "--",
+        ]
+        years = self.years
+        year = 0
+
+        def add(field: str) -> None:
+            nonlocal year
+            if field.startswith("\x01"):
+                year = int(field[1:])
+                return
+            path = field.removeprefix("\n")
+            if not path:
+                return
+            entry = years.get(path)
+            if entry is None:
+                years[path] = [year, year]
+            elif year < entry[0]:
+                entry[0] = year
+            elif year > entry[1]:
+                entry[1] = year
+
+        with subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            encoding="utf-8",
+            errors="surrogateescape",
+        ) as process:
+            assert process.stdout is not None
+            rest = ""
+            while chunk := process.stdout.read(COPY_CHUNK):
+                *fields, rest = (rest + chunk).split("\0")
+                for field in fields:
+                    add(field)
+            add(rest)
+        if process.returncode:
+            raise OSError(f"git log failed with exit code {process.returncode}")
+
+    def _save(self) -> None:
+        import tempfile
+
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"head": self.head, "years": self.years}, f, separators=(",", ":")
+                )
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
+            raise
+
+    def file_years(
+        self, file_path: str, current_year: int, modified: bool | None = None
+    ) -> tuple[int, int]:
+        """First and last year a file was changed.
+
+        A file with uncommitted changes (or ``modified``) was last changed
+        in ``current_year``, and one that was never committed was also
+        first changed then.
+        """
+        rel = self.git_index.relpath(file_path)
+        entry = self.years.get(rel) if rel is not None else None
+        if entry is None:
+            return current_year, current_year
+        if modified is None:
+            modified = rel in self.modified
+        return entry[0], current_year if modified else entry[1]
+
+
+class GitIgnore:
+    """Compiled patterns of a single ``.gitignore`` file."""
+
+    def __init__(self, base: str, lines: list[str]):
+        # Rules are kept in reverse so the first match is the last one listed
+        self.base = base
+        self.rules: list[tuple[re.Pattern[str], bool, bool, bool]] = []
+        for line in lines:
+            rule = self._compile(line)
+            if rule is not None:
+                self.rules.append(rule)
+        self.rules.reverse()
+
+    @classmethod
+    def load(cls, path: str, base: str) -> "GitIgnore | None":
+        """Load a ``.gitignore`` file; ``base`` is its directory's walk path."""
+        try:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return None
+        ignore = cls(base, lines)
+        return ignore if ignore.rules else None
+
+    @classmethod
+    def _compile(cls, line: str) -> tuple[re.Pattern[str], bool, bool, bool] | None:
+        if not line or line.startswith("#"):
+            return None
+        # Trailing spaces are ignored unless escaped
+        stripped = line.rstrip(" ")
+        if stripped.endswith("\\") and len(stripped) < len(line):
+            stripped += " "
+        line = stripped
+        negate = line.startswith("!")
+        if negate or line.startswith("\\!") or line.startswith("\\#"):
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            return None
+        # Patterns containing a slash are relative to the .gitignore
+        # directory, anything else matches a name at any depth
+        anchored = "/" in line
+        line = line.lstrip("/")
+        return re.compile(cls._translate(line)), negate, dir_only, anchored
+
+    @staticmethod
+    def _translate(pattern: str) -> str:
+        parts = []
+        i, n = 0, len(pattern)
+        while i < n:
+            c = pattern[i]
+            if c == "*":
+                if pattern.startswith("**", i) and (i == 0 or pattern[i - 1] == "/"):
+                    if i + 2 == n:
+                        parts.append(".*")
+                        i += 2
+                        continue
+                    if pattern[i + 2] == "/":
+                        parts.append("(?:.*/)?")
+                        i += 3
+                        continue
+                parts.append("[^/]*")
+            elif c == "?":
+                parts.append("[^/]")
+            elif c == "[":
+                end = pattern.find("]", i + 2)
+                if end == -1:
+                    parts.append(re.escape(c))
+                else:
+                    body = pattern[i + 1 : end]
+                    if body[0] in "!^":
+                        body = "^" + body[1:]
+                    parts.append("[" + body.replace("\\", "\\\\") + "]")
+                    i = end
+            elif c == "\\" and i + 1 < n:
+                i += 1
+                parts.append(re.escape(pattern[i]))
             else:
-                new_content = new_header + "\n"
+                parts.append(re.escape(c))
+            i += 1
+        return "(?s:" + "".join(parts) + r")\Z"
+
+    def match(self, path: str, is_dir: bool) -> bool | None:
+        """Return True if ignored, False if re-included, None if no rule applies.
+
+        ``path`` is relative to the walk root and must be inside ``base``.
+        """
+        rel = path[len(self.base) + 1 :] if self.base else path
+        name = rel.rsplit("/", 1)[-1]
+        for regex, negate, dir_only, anchored in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(rel if anchored else name):
+                return not negate
+        return None
+
+
+def _is_ignored(ignores: list[GitIgnore], path: str, is_dir: bool) -> bool:
+    # Deeper .gitignore files take precedence over their parents
+    for ignore in reversed(ignores):
+        ignored = ignore.match(path, is_dir)
+        if ignored is not None:
+            return ignored
+    return False
+
+
+def walk_files(
+    root: str,
+    prune_dirs: frozenset[str] | set[str] = DEFAULT_PRUNE_DIRS,
+) -> Iterator[str]:
+    """Yield the files below ``root`` that are not ignored by git.
+
+    Directories named in ``prune_dirs`` or ignored by a ``.gitignore`` are
+    never entered. Files are yielded one directory at a time, in sorted
+    order, before descending into subdirectories.
+    """
+    for _, _, _, files in _walk_tree(root, prune_dirs):
+        yield from files
+
+
+def _walk_tree(
+    root: str,
+    prune_dirs: frozenset[str] | set[str],
+    rel: str = "",
+    ignores: list[GitIgnore] | None = None,
+) -> Iterator[tuple[str, str, list[GitIgnore], list[str]]]:
+    """Yield the directories ``walk_files`` visits with their files.
+
+    Each directory comes with its path relative to the walk's root and the
+    ``.gitignore`` rules that apply inside it. ``rel`` and ``ignores``
+    continue a walk from a directory below the root.
+    """
+    stack: list[tuple[str, str, list[GitIgnore]]] = [(root, rel, ignores or [])]
+    while stack:
+        directory, rel, ignores = stack.pop()
+        ignore = GitIgnore.load(os.path.join(directory, ".gitignore"), rel)
+        if ignore is not None:
+            ignores = [*ignores, ignore]
 
-        # Write back if changed
-        if new_content != original_content:
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            continue
+
+        files = []
+        subdirs = []
+        for entry in entries:
+            entry_rel = f"{rel}/{entry.name}" if rel else entry.name
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name in prune_dirs or _is_ignored(ignores, entry_rel, True):
+                    continue
+                subdirs.append((entry.path, entry_rel, ignores))
+            elif entry.is_file() and not _is_ignored(ignores, entry_rel, False):
+                files.append(entry.path)
+        yield directory, rel, ignores, files
+        stack.extend(reversed(subdirs))
+
+
+# Most paths of a --files-from list held at once
+FILES_FROM_WINDOW = 8192
+
+
+def read_file_list(fd: int, window: int = FILES_FROM_WINDOW) -> Iterator[list[str]]:
+    """Read a NUL- or newline-delimited list of paths from ``fd`` in windows.
+
+    The list is NUL-delimited if a NUL comes before the first newline. A
+    window is yielded once it holds ``window`` paths or nothing more is
+    ready to read, so processing can start while the writer of a pipe is
+    still listing files. Empty entries are ignored.
+    """
+    separator = b""
+    pending = b""
+    paths: list[str] = []
+    while True:
+        chunk = os.read(fd, COPY_CHUNK)
+        pending += chunk
+        if not separator:
+            newline, nul = pending.find(b"\n"), pending.find(b"\0")
+            if nul >= 0 and (newline < 0 or nul < newline):
+                separator = b"\0"
+            elif newline >= 0 or not chunk:
+                separator = b"\n"
+        if separator:
+            entries = pending.split(separator)
+            pending = entries.pop() if chunk else b""
+            for entry in entries:
+                if separator == b"\n":
+                    entry = entry.removesuffix(b"\r")
+                if entry:
+                    paths.append(os.fsdecode(entry))
+                if len(paths) >= window:
+                    yield paths
+                    paths = []
+        # A short read means the writer has not caught up (or the end)
+        if paths and len(chunk) < COPY_CHUNK:
+            yield paths
+            paths = []
+        if not chunk:
+            return
+
+
+# Quiet time after a change before --watch processes a batch, and how often
+# the polling watcher rescans when inotify is not available.
+WATCH_DEBOUNCE = 0.05
+WATCH_POLL_INTERVAL = 0.5
+
+# inotify(7) event bits
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+_INOTIFY_EVENT = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    """Reports files written below directories, using Linux inotify.
+
+    A file is reported when it is closed after writing or moved into place
+    (the way editors save atomically). Directories created later are
+    watched as they appear; their files are reported as changed.
+    """
+
+    def __init__(self, roots: list[str], prune_dirs: frozenset[str] | set[str]) -> None:
+        import ctypes
+
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self._libc.inotify_add_watch.argtypes = [
+            ctypes.c_int,
+            ctypes.c_char_p,
+            ctypes.c_uint32,
+        ]
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.roots = roots
+        self.prune_dirs = prune_dirs
+        # Watched directories: path, path relative to its root, ignore rules
+        self._dirs: dict[int, tuple[str, str, list[GitIgnore]]] = {}
+        try:
+            for root in roots:
+                self._watch_tree(root)
+        except OSError:
+            self.close()
+            raise
+
+    def _watch_tree(
+        self, root: str, rel: str = "", ignores: list[GitIgnore] | None = None
+    ) -> list[str]:
+        """Watch ``root`` and the directories below it; return their files."""
+        import ctypes
+
+        mask = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE | _IN_ONLYDIR
+        files = []
+        for directory, dir_rel, dir_ignores, dir_files in _walk_tree(
+            root, self.prune_dirs, rel, ignores
+        ):
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), mask)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if error in (errno.ENOENT, errno.ENOTDIR):
+                    continue  # Removed while walking
+                raise OSError(error, os.strerror(error), directory)
+            self._dirs[wd] = (directory, dir_rel, dir_ignores)
+            files.extend(dir_files)
+        return files
+
+    def wait(self, timeout: float | None) -> set[str]:
+        """Return files changed since the last call, waiting up to ``timeout``."""
+        import select
+
+        changed: set[str] = set()
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return changed
+        while True:
             try:
-                with open(file_path, "w", encoding="utf-8") as f:
-                    f.write(new_content)
-                print(f"Updated license header in {file_path}")
-                return True
-            except Exception as e:
-                print(f"Error writing {file_path}: {e}")
-                return False
+                data = os.read(self.fd, COPY_CHUNK)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _INOTIFY_EVENT.unpack_from(data, offset)
+                offset += _INOTIFY_EVENT.size
+                name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+                offset += length
+                self._event(wd, mask, name, changed)
+
+    def _event(self, wd: int, mask: int, name: str, changed: set[str]) -> None:
+        if mask & _IN_Q_OVERFLOW:
+            # Events were lost: report every file
+            for root in self.roots:
+                changed.update(walk_files(root, self.prune_dirs))
+            return
+        if mask & _IN_IGNORED:
+            self._dirs.pop(wd, None)
+            return
+        if wd not in self._dirs:
+            return
+        directory, rel, ignores = self._dirs[wd]
+        path = os.path.join(directory, name)
+        entry_rel = f"{rel}/{name}" if rel else name
+        if mask & _IN_ISDIR:
+            if name not in self.prune_dirs and not _is_ignored(
+                ignores, entry_rel, True
+            ):
+                changed.update(self._watch_tree(path, entry_rel, ignores))
+        elif mask & (_IN_CLOSE_WRITE | _IN_MOVED_TO):
+            if not _is_ignored(ignores, entry_rel, False):
+                changed.add(path)
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingWatcher:
+    """Reports changed files below directories by rescanning them."""
 
-        return False
+    def __init__(
+        self,
+        roots: list[str],
+        prune_dirs: frozenset[str] | set[str],
+        interval: float = WATCH_POLL_INTERVAL,
+    ) -> None:
+        self.roots = roots
+        self.prune_dirs = prune_dirs
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self) -> dict[str, tuple[int, int]]:
+        snapshot = {}
+        for root in self.roots:
+            for file_path in walk_files(root, self.prune_dirs):
+                try:
+                    st = os.stat(file_path)
+                except OSError:
+                    continue
+                snapshot[file_path] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def wait(self, timeout: float | None) -> set[str]:
+        """Return files changed since the last call, waiting up to ``timeout``."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self._scan()
+            changed = {
+                file_path
+                for file_path, state in snapshot.items()
+                if self._snapshot.get(file_path) != state
+            }
+            self._snapshot = snapshot
+            if changed:
+                return changed
+            delay = self.interval
+            if deadline is not None:
+                delay = min(delay, deadline - time.monotonic())
+                if delay <= 0:
+                    return changed
+            time.sleep(delay)
+
+    def close(self) -> None:
+        pass
+
+
+def _open_watcher(
+    roots: list[str], prune_dirs: frozenset[str] | set[str]
+) -> "InotifyWatcher | PollingWatcher":
+    """Watch with inotify where available, otherwise by polling."""
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(roots, prune_dirs)
+        except (OSError, AttributeError):
+            pass  # No inotify, or out of watches
+    return PollingWatcher(roots, prune_dirs)
+
+
+def _split_path(path: str) -> tuple[str, str]:
+    """Split a path into its root and "/" joined parts, as ``PurePath`` would."""
+    if os.sep != "/":
+        path = path.replace(os.sep, "/")
+    root = ""
+    if path.startswith("/"):
+        # POSIX keeps exactly two leading slashes as a distinct root
+        root = "//" if path.startswith("//") and not path.startswith("///") else "/"
+    if "//" in path or "/." in path or path.startswith(".") or path.endswith("/"):
+        path = "/".join(part for part in path.split("/") if part and part != ".")
+    elif root:
+        path = path[1:]
+    return root, path
+
+
+def _translate_glob_part(part: str) -> str:
+    """Translate one glob component to a regex that stays within it."""
+    regex = []
+    i, n = 0, len(part)
+    while i < n:
+        c = part[i]
+        i += 1
+        if c == "*":
+            regex.append("[^/\\0]*")
+        elif c == "?":
+            regex.append("[^/\\0]")
+        elif c == "[":
+            j = i
+            if j < n and part[j] == "!":
+                j += 1
+            if j < n and part[j] == "]":
+                j += 1
+            while j < n and part[j] != "]":
+                j += 1
+            if j >= n:
+                regex.append("\\[")
+                continue
+            stuff = re.sub(r"([\\\[&~|])", r"\\\1", part[i:j])
+            i = j + 1
+            if stuff.startswith("!"):
+                stuff = "^" + stuff[1:]
+            elif stuff.startswith("^"):
+                stuff = "\\" + stuff
+            regex.append(f"(?![/\\0])[{stuff}]")
+        else:
+            regex.append(re.escape(c))
+    return "".join(regex)
+
+
+class _CompiledGlobs:
+    """A list of glob patterns matched together."""
+
+    def __init__(self, patterns: list[str]):
+        self.ignore_case = os.path.normcase("A") == "a"
+        self.suffixes: set[str] = set()
+        self.names: set[str] = set()
+        self.fallback: list[str] = []
+        # Relative patterns by number of parts. One with a part more than a
+        # path's tail is matched against the root as well, which Path.match
+        # does differently between Python versions, so it decides those.
+        self.by_length: dict[int, list[str]] = {}
+        regexes = []
+        for pattern in patterns:
+            root, tail = _split_path(pattern)
+            if not root and not tail:
+                raise ValueError("empty pattern")
+            parts = tail.split("/") if tail else []
+            if self.ignore_case:
+                parts = [part.lower() for part in parts]
+            if not root and len(parts) == 1 and not _GLOB_MAGIC.search(parts[0]):
+                self.names.add(parts[0])
+                continue
+            if (
+                not root
+                and len(parts) == 1
+                and parts[0].startswith("*.")
+                and not _GLOB_MAGIC.search(parts[0][1:])
+            ):
+                self.suffixes.add(parts[0][1:])
+                continue
+
+            if "[!" in pattern:
+                # Whether a negated set matches a separator depends on the
+                # Python version
+                self.fallback.append(pattern)
+                continue
+            if not root:
+                self.by_length.setdefault(len(parts), []).append(pattern)
+            body = "/".join(_translate_glob_part(part) for part in parts)
+            if root:
+                regex = f"\\A{re.escape(root)}\\0{body}\\Z"
+            else:
+                regex = f"[\\0/]{body}\\Z"
+            try:
+                re.compile(regex)
+            except re.error:
+                self.fallback.append(pattern)
+            else:
+                regexes.append(regex)
+
+        flags = re.IGNORECASE if self.ignore_case else 0
+        self.regex = re.compile("|".join(regexes), flags) if regexes else None
+
+    def match(self, file_path: str, root: str, tail: str) -> bool:
+        name = tail.rsplit("/", 1)[-1]
+        if self.ignore_case:
+            name = name.lower()
+        if name in self.names:
+            return True
+        if self.suffixes:
+            dot = name.find(".")
+            while dot != -1:
+                if name[dot:] in self.suffixes:
+                    return True
+                dot = name.find(".", dot + 1)
+        if self.regex is not None and self.regex.search(f"{root}\0{tail}"):
+            return True
+        patterns = self.fallback
+        if root and self.by_length:
+            reaching_root = self.by_length.get(tail.count("/") + 2 if tail else 1)
+            if reaching_root:
+                patterns = [*patterns, *reaching_root]
+        if not patterns:
+            return False
+        from pathlib import PurePath
+
+        path = PurePath(file_path)
+        return any(path.match(pattern) for pattern in patterns)
+
+
+class PathMatcher:
+    """Include/exclude patterns compiled once, with ``Path.match`` semantics.
+
+    Relative patterns match from the right, absolute patterns match the
+    whole path, and wildcards never cross a path separator. ``*.ext``
+    patterns and literal names are looked up in sets; all other patterns
+    of a list are combined into a single regular expression. Where
+    ``Path.match`` itself differs between Python versions (negated sets, and
+    relative patterns reaching the root of an absolute path) it is called
+    instead, so results are the same as those of the running Python.
+    """
+
+    def __init__(self, include_patterns: list[str], exclude_patterns: list[str]):
+        self._include = _CompiledGlobs(include_patterns) if include_patterns else None
+        self._exclude = _CompiledGlobs(exclude_patterns)
+
+    def matches(self, file_path: str) -> bool:
+        """Check if a file is selected by the include/exclude patterns."""
+        root, tail = _split_path(file_path)
+        if self._exclude.match(file_path, root, tail):
+            return False
+        return self._include is None or self._include.match(file_path, root, tail)
+
+    def select(self, paths: Iterable[str]) -> list[str]:
+        """Return the selected paths, in order."""
+        return [path for path in paths if self.matches(path)]
+
+
+@functools.lru_cache(maxsize=16)
+def _get_path_matcher(
+    include: tuple[str, ...], exclude: tuple[str, ...]
+) -> PathMatcher:
+    return PathMatcher(list(include), list(exclude))
 
 
 def should_process_file(
     file_path: str, include_patterns: list[str], exclude_patterns: list[str]
 ) -> bool:
     """Check if file should be processed based on include/exclude patterns."""
-    path = Path(file_path)
+    matcher = _get_path_matcher(tuple(include_patterns), tuple(exclude_patterns))
+    return matcher.matches(file_path)
 
-    # Check exclude patterns first
-    for pattern in exclude_patterns:
-        if path.match(pattern):
-            return False
 
-    # If no include patterns, process all (except excluded)
-    if not include_patterns:
-        return True
+# Target size of a unit of work handed to a worker process. Small files are
+# grouped until either limit is reached so the IPC cost is amortised.
+CHUNK_BYTES = 1 << 20
+CHUNK_FILES = 64
 
-    # Check include patterns
-    for pattern in include_patterns:
-        if path.match(pattern):
-            return True
+# Files read ahead per I/O thread with --io-threads
+IO_PREFETCH = 4
 
-    return False
+_worker_managers: list[LicenseHeaderManager] = []
+_worker_stop: "EventType | None" = None
+
+
+def _chunk_files(
+    files: list[str], chunk_bytes: int = CHUNK_BYTES, chunk_files: int = CHUNK_FILES
+) -> list[list[int]]:
+    """Group file indices into chunks, largest files first."""
+    sizes = []
+    for file_path in files:
+        try:
+            sizes.append(os.path.getsize(file_path))
+        except OSError:
+            sizes.append(0)
+
+    chunks = []
+    current: list[int] = []
+    current_bytes = 0
+    for index in sorted(range(len(files)), key=lambda i: sizes[i], reverse=True):
+        current.append(index)
+        current_bytes += sizes[index]
+        if current_bytes >= chunk_bytes or len(current) >= chunk_files:
+            chunks.append(current)
+            current = []
+            current_bytes = 0
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _init_worker(
+    managers: list[LicenseHeaderManager], stop_event: "EventType | None" = None
+) -> None:
+    global _worker_managers, _worker_stop
+    # Workers start from empty statistics; the parent merges theirs in
+    for manager in managers:
+        manager.stats = Stats(manager.stats.enabled)
+    _worker_managers = managers
+    _worker_stop = stop_event
+
+
+def _process_chunk(
+    key: int,
+    chunk: list[tuple[int, str]],
+    file_years: dict[str, tuple[int, int]],
+) -> tuple[list[tuple[int, str, str]], Stats | None]:
+    """Process a chunk of files in a worker, capturing each file's output.
+
+    ``key`` picks the worker's copy of the header manager and ``file_years``
+    are the chunk's years of first and last change. Stops early once another
+    process has set the stop event (--fail-fast). Also returns the
+    statistics collected for the chunk, if enabled.
+    """
+    manager = _worker_managers[key]
+    manager.file_years = file_years
+    results = []
+    for index, file_path in chunk:
+        if _worker_stop is not None and _worker_stop.is_set():
+            break
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            status = manager.process_file_status(file_path)
+        results.append((index, status, output.getvalue()))
+        if _worker_stop is not None and status in FAILING_STATUSES:
+            _worker_stop.set()
+    stats = manager.stats
+    if not stats.enabled:
+        return results, None
+    manager.stats = Stats(enabled=True)
+    return results, stats
+
+
+class WorkerPool:
+    """Worker processes shared by every policy and window of a run.
+
+    Each worker holds a copy of each of ``managers``, so only file names
+    and years go to the workers with a chunk. The processes start on the
+    first chunk, and with ``fail_fast`` share a stop event.
+    """
+
+    def __init__(
+        self,
+        jobs: int,
+        managers: list[LicenseHeaderManager],
+        fail_fast: bool = False,
+    ):
+        self.jobs = jobs
+        self.managers = managers
+        self.fail_fast = fail_fast
+        self.stop_event: EventType | None = None
+        self._keys = {id(manager): key for key, manager in enumerate(managers)}
+        self._executor: ProcessPoolExecutor | None = None
+
+    def submit(
+        self, manager: LicenseHeaderManager, chunk: list[tuple[int, str]]
+    ) -> "Future[tuple[list[tuple[int, str, str]], Stats | None]]":
+        """Process ``chunk`` (indices and files) with a worker's ``manager``."""
+        if self._executor is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            self.stop_event = multiprocessing.Event() if self.fail_fast else None
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.jobs,
+                initializer=_init_worker,
+                initargs=(self.managers, self.stop_event),
+            )
+        file_years = {
+            file_path: manager.file_years[file_path]
+            for _, file_path in chunk
+            if file_path in manager.file_years
+        }
+        return self._executor.submit(
+            _process_chunk, self._keys[id(manager)], chunk, file_years
+        )
+
+    def close(self) -> None:
+        """Stop the worker processes, if they were started."""
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def __enter__(self) -> "WorkerPool":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
+def _timed(function: Any, *args: Any) -> tuple[Any, float]:
+    """Call ``function``, returning its result (or exception) and duration."""
+    start = time.perf_counter()
+    try:
+        result = function(*args)
+    except Exception as e:
+        result = e
+    return result, time.perf_counter() - start
+
+
+def _process_pipelined(
+    header_manager: LicenseHeaderManager,
+    files: list[str],
+    io_threads: int,
+    fail_fast: bool = False,
+) -> list[tuple[str, str] | None]:
+    """Process files with reads and writes overlapped on threads.
+
+    A pool of ``io_threads`` readers keeps the first bytes of up to
+    ``IO_PREFETCH`` files per thread read ahead. Headers are worked out on
+    the calling thread in input order as files arrive, and rewrites are
+    handed to a separate pool of writers. Only the calling thread prints or
+    updates statistics. Returns the same results as ``_process_statuses``,
+    with output written in input order.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    registry = header_manager.comment_registry
+    stats = header_manager.stats
+    window = io_threads * IO_PREFETCH
+    results: list[tuple[str, str] | None] = [None] * len(files)
+    next_output = 0
+    # Pending reads: bytes requested and the read future (None if the file
+    # has no comment style)
+    reads: collections.deque[tuple[int, Future[tuple[Any, float]] | None]]
+    reads = collections.deque()
+    # Pending rewrites: file index, output so far, time spent so far, phase
+    # timings and the write future
+    writes: collections.deque[
+        tuple[int, str, float, dict[str, float], Future[tuple[Any, float]]]
+    ] = collections.deque()
+    # Files handed to the writers: a later entry for the same file was read
+    # ahead of the rewrite and has to wait for it and read again
+    rewritten: set[str] = set()
+
+    def finish(
+        index: int, status: str, output: str, seconds: float, phases: dict[str, float]
+    ) -> None:
+        nonlocal next_output
+        if stats.enabled:
+            stats.file_done(files[index], status, seconds, phases)
+        results[index] = (status, output)
+        while next_output < len(files) and results[next_output] is not None:
+            sys.stdout.write(results[next_output][1])  # type: ignore[index]
+            next_output += 1
+
+    def finish_write() -> None:
+        index, output, seconds, phases, future = writes.popleft()
+        result, phases["write"] = future.result()
+        buffer = io.StringIO()
+        with contextlib.redirect_stdout(buffer):
+            status = header_manager._written(files[index], result)
+        output += buffer.getvalue()
+        finish(index, status, output, seconds + phases["write"], phases)
+
+    with (
+        ThreadPoolExecutor(io_threads, thread_name_prefix="read") as readers,
+        ThreadPoolExecutor(io_threads, thread_name_prefix="write") as writers,
+    ):
+        next_read = 0
+        for index, file_path in enumerate(files):
+            # Keep the read-ahead window full
+            while next_read < len(files) and len(reads) < window:
+                comment_style = registry.get_comment_style(files[next_read])
+                read = None
+                if comment_style:
+                    size = header_manager._head_size(comment_style)
+                    read = readers.submit(
+                        _timed,
+                        header_manager._read_head,
+                        files[next_read],
+                        size,
+                        0,
+                        True,
+                    )
+                reads.append((size if comment_style else 0, read))
+                next_read += 1
+
+            start = time.perf_counter()
+            size, read = reads.popleft()
+            if read is not None and os.path.abspath(file_path) in rewritten:
+                while writes:
+                    finish_write()
+                read = readers.submit(
+                    _timed, header_manager._read_head, file_path, size, 0, True
+                )
+            buffer = io.StringIO()
+            read_seconds = 0.0
+            with contextlib.redirect_stdout(buffer):
+                comment_style = header_manager._comment_style(file_path)
+                plan: str | tuple[int, bytes] = STATUS_SKIPPED
+                if comment_style is not None and read is not None:
+                    prefix, read_seconds = read.result()
+                    if isinstance(prefix, Exception):
+                        print(f"Error reading {file_path}: {prefix}")
+                        plan = STATUS_ERROR
+                    else:
+                        stats.bytes_read += len(prefix)
+                        plan = header_manager._plan_file(
+                            file_path, comment_style, prefix, len(prefix) < size
+                        )
+            phases = stats.take_phases()
+            phases["read"] = phases.get("read", 0.0) + read_seconds
+            seconds = time.perf_counter() - start + read_seconds
+
+            if isinstance(plan, str):
+                finish(index, plan, buffer.getvalue(), seconds, phases)
+            else:
+                rewritten.add(os.path.abspath(file_path))
+                write = writers.submit(
+                    _timed, header_manager._replace_prefix, file_path, *plan
+                )
+                writes.append((index, buffer.getvalue(), seconds, phases, write))
+
+            # Report finished rewrites, waiting once too many are queued
+            while writes and (writes[0][4].done() or len(writes) >= window):
+                finish_write()
+
+            if fail_fast and (not isinstance(plan, str) or plan in FAILING_STATUSES):
+                for _, pending in reads:
+                    if pending is not None:
+                        pending.cancel()
+                break
+
+        while writes:
+            finish_write()
+
+    # Output of files processed after a --fail-fast gap
+    for result in results[next_output:]:
+        if result is not None:
+            sys.stdout.write(result[1])
+    return results
+
+
+def _process_statuses(
+    header_manager: LicenseHeaderManager,
+    files: list[str],
+    jobs: int,
+    chunk_bytes: int,
+    chunk_files: int,
+    capture: bool = False,
+    fail_fast: bool = False,
+    io_threads: int = 0,
+    pool: WorkerPool | None = None,
+) -> list[tuple[str, str] | None]:
+    """Process files serially, on a process pool or on I/O threads.
+
+    Returns each file's status and output (the output is only kept if
+    ``capture`` is set or files are processed concurrently), or None for
+    files not processed because ``fail_fast`` stopped the run. With
+    ``io_threads`` files are processed by ``_process_pipelined`` instead of
+    worker processes. Chunks go to ``pool`` if given, which must hold
+    ``header_manager``, or else to a pool started for these files.
+    """
+    if io_threads > 0:
+        return _process_pipelined(header_manager, files, io_threads, fail_fast)
+    results: list[tuple[str, str] | None] = [None] * len(files)
+    chunks = _chunk_files(files, chunk_bytes, chunk_files) if jobs > 1 else []
+    if len(chunks) < 2:
+        for index, file_path in enumerate(files):
+            if capture:
+                buffer = io.StringIO()
+                with contextlib.redirect_stdout(buffer):
+                    status = header_manager.process_file_status(file_path)
+                output = buffer.getvalue()
+                sys.stdout.write(output)
+            else:
+                status = header_manager.process_file_status(file_path)
+                output = ""
+            results[index] = (status, output)
+            if fail_fast and status in FAILING_STATUSES:
+                break
+        return results
+
+    from concurrent.futures import as_completed
+
+    next_index = 0
+    with contextlib.ExitStack() as stack:
+        if pool is None:
+            pool = stack.enter_context(
+                WorkerPool(min(jobs, len(chunks)), [header_manager], fail_fast)
+            )
+        futures = [
+            pool.submit(header_manager, [(i, files[i]) for i in chunk])
+            for chunk in chunks
+        ]
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+            chunk_results, chunk_stats = future.result()
+            for index, status, output in chunk_results:
+                results[index] = (status, output)
+            if chunk_stats is not None:
+                header_manager.stats.merge(chunk_stats)
+            if pool.stop_event is not None and pool.stop_event.is_set():
+                for pending in futures:
+                    pending.cancel()
+            # Flush output for the completed prefix to keep it in input order
+            while next_index < len(files) and results[next_index] is not None:
+                sys.stdout.write(results[next_index][1])  # type: ignore[index]
+                next_index += 1
+
+    # Output of files processed after a --fail-fast gap
+    for result in results[next_index:]:
+        if result is not None:
+            sys.stdout.write(result[1])
+    return results
+
+
+def process_files(
+    header_manager: LicenseHeaderManager,
+    files: list[str],
+    jobs: int = 1,
+    chunk_bytes: int = CHUNK_BYTES,
+    chunk_files: int = CHUNK_FILES,
+    result_cache: ResultCache | None = None,
+    reporter: "Reporter | None" = None,
+    fail_fast: bool = False,
+    io_threads: int = 0,
+    pool: WorkerPool | None = None,
+) -> list[str]:
+    """Process files serially, on a process pool or on I/O threads.
+
+    Returns the files that did not have a correct header: the modified
+    files, or in check mode the files that would be modified. Output and the
+    returned list are in input order regardless of ``jobs`` and
+    ``io_threads``. Files that ``result_cache`` knows to be unchanged are not
+    opened. With ``fail_fast`` the run stops at the first such file. A
+    ``pool`` of workers kept by the caller is used instead of a new one.
+    """
+    if result_cache is not None:
+        with header_manager.stats.step("cache lookup"):
+            total = len(files)
+            files = [f for f in files if not result_cache.is_fresh(f)]
+        header_manager.stats.skip("cached", total - len(files))
+
+    results = _process_statuses(
+        header_manager,
+        files,
+        jobs,
+        chunk_bytes,
+        chunk_files,
+        capture=reporter is not None,
+        fail_fast=fail_fast,
+        io_threads=io_threads,
+        pool=pool,
+    )
+
+    failed = []
+    for file_path, result in zip(files, results, strict=True):
+        if result is None:
+            continue
+        status, output = result
+        if status in FAILING_STATUSES:
+            failed.append(file_path)
+        if reporter is not None:
+            reporter.add(file_path, status, output.strip())
+        if result_cache is not None:
+            # Skipped files are remembered too, so binary and generated files
+            # are not sniffed again until they change
+            if status in (STATUS_UNCHANGED, STATUS_UPDATED, STATUS_SKIPPED):
+                result_cache.record(file_path, status == STATUS_UPDATED)
+            else:
+                result_cache.discard(file_path)
+
+    return failed
+
+
+# pyproject.toml is read for [tool.license-header] unless --config names a file
+PYPROJECT = "pyproject.toml"
+# Policy settings and the type of their values
+POLICY_KEYS: dict[str, type] = {"template": str, "copyright-holder": str, "skip": bool}
+
+
+class Policy:
+    """The header manager and result cache shared by the files of a subtree."""
+
+    __slots__ = ("manager", "result_cache")
 
+    def __init__(
+        self, manager: LicenseHeaderManager, result_cache: ResultCache | None = None
+    ):
+        self.manager = manager
+        self.result_cache = result_cache
+
+
+class _PolicyNode:
+    __slots__ = ("policy", "defined", "children")
+
+    def __init__(self) -> None:
+        self.policy: Policy | None = None
+        # Whether the policy is set here rather than inherited
+        self.defined = False
+        self.children: dict[str, _PolicyNode] = {}
+
+
+class PolicyTree:
+    """Header policies by path prefix, resolved one path component at a time.
+
+    The root policy applies to every file below ``root``, and a policy set
+    for a directory (or a single file) applies below it until a deeper one
+    takes over. A policy of None skips the files. Looking up a file takes
+    one dict lookup per directory level, however many policies there are.
+    """
+
+    def __init__(self, policy: Policy | None, root: str = os.curdir):
+        self.root = root
+        self._tree = _PolicyNode()
+        self._tree.policy = policy
+        self._tree.defined = True
+        # Relative paths need no os.path.relpath() when root is the cwd
+        self._cwd_root = os.path.abspath(root) == os.getcwd()
+
+    def _parts(self, path: str) -> list[str]:
+        if not self._cwd_root or os.path.isabs(path):
+            path = os.path.relpath(os.path.abspath(path), self.root)
+        path = os.path.normpath(path)
+        return [] if path == os.curdir else path.split(os.sep)
+
+    def set(self, prefix: str, policy: Policy | None) -> None:
+        """Apply ``policy`` to ``prefix`` (relative to ``root``) and below."""
+        node = self._tree
+        for part in self._parts(os.path.join(self.root, prefix)):
+            node = node.children.setdefault(part, _PolicyNode())
+        node.policy = policy
+        node.defined = True
+
+    def policy(self, file_path: str) -> Policy | None:
+        """The policy of a file: the one set for its deepest prefix."""
+        node = self._tree
+        policy = node.policy
+        for part in self._parts(file_path):
+            child = node.children.get(part)
+            if child is None:
+                break
+            node = child
+            if node.defined:
+                policy = node.policy
+        return policy
+
+    def policies(self) -> list[Policy]:
+        """Every distinct policy in the tree, skipping excluded."""
+        found: dict[int, Policy] = {}
+        nodes = [self._tree]
+        while nodes:
+            node = nodes.pop()
+            if node.policy is not None:
+                found.setdefault(id(node.policy), node.policy)
+            nodes.extend(node.children.values())
+        return list(found.values())
+
+    def split(self, files: list[str]) -> list[tuple[Policy | None, list[str]]]:
+        """Group files by policy, in order of each policy's first file."""
+        if not self._tree.children:
+            # Only the root policy: no path has to be looked at
+            return [(self._tree.policy, files)] if files else []
+        groups: dict[Policy | None, list[str]] = {}
+        for file_path in files:
+            groups.setdefault(self.policy(file_path), []).append(file_path)
+        return list(groups.items())
+
+
+def load_policies(
+    config_path: str,
+    root: Policy,
+    make_policy: Callable[[str, str], Policy],
+) -> PolicyTree:
+    """Compile the ``[tool.license-header]`` table of a TOML file into a tree.
+
+    Its ``paths`` table maps directories or files, relative to the config
+    file, to tables setting ``template`` (also relative to the config file),
+    ``copyright-holder`` or ``skip``. Settings not given are inherited from
+    the nearest enclosing path, with ``root`` (the command line settings) at
+    the top. ``make_policy(template, copyright_holder)`` is called once per
+    distinct pair, so every file with the same settings shares one header
+    manager. Raises ValueError for an invalid table.
+    """
+    import tomllib
+
+    with open(config_path, "rb") as f:
+        table = tomllib.load(f).get("tool", {}).get("license-header", {})
+    unknown = set(table) - {"paths"}
+    if unknown:
+        raise ValueError(f"Unknown [tool.license-header] keys: {sorted(unknown)}")
+    paths = table.get("paths", {})
+    if not isinstance(paths, dict):
+        raise ValueError("[tool.license-header] paths must be a table")
+
+    directory = os.path.dirname(config_path) or os.curdir
+    manager = root.manager
+    key = (manager.template_file, manager.copyright_holder)
+    policies: dict[tuple[str, str], Policy] = {key: root}
+    tree = PolicyTree(root, directory)
+    # Settings by normalized prefix, shallowest first so deeper ones inherit
+    settings: dict[str, dict[str, Any]] = {
+        "": {"template": key[0], "copyright-holder": key[1], "skip": False}
+    }
+    prefixes = {}
+    for path in paths:
+        prefix = os.path.normpath(path).replace(os.sep, "/")
+        prefixes["" if prefix == os.curdir else prefix] = path
+    for prefix in sorted(prefixes, key=lambda p: p.count("/")):
+        own = paths[prefixes[prefix]]
+        if not isinstance(own, dict) or not set(own) <= POLICY_KEYS.keys():
+            raise ValueError(
+                f"Policy for {prefixes[prefix]!r} must be a table of "
+                f"{', '.join(sorted(POLICY_KEYS))}"
+            )
+        for name, value in own.items():
+            if not isinstance(value, POLICY_KEYS[name]):
+                raise ValueError(
+                    f"Policy for {prefixes[prefix]!r}: {name} must be a "
+                    f"{'boolean' if POLICY_KEYS[name] is bool else 'string'}"
+                )
+        parent = prefix
+        while parent and parent not in settings:
+            parent = parent.rpartition("/")[0]
+        merged = {**settings[parent], **own}
+        if "template" in own:
+            merged["template"] = os.path.join(directory, own["template"])
+        settings[prefix] = merged
+
+        policy = None
+        if not merged["skip"]:
+            key = (merged["template"], merged["copyright-holder"])
+            if key not in policies:
+                policies[key] = make_policy(*key)
+            policy = policies[key]
+        tree.set(prefix, policy)
+    return tree
+
+
+def process_by_policy(
+    policies: PolicyTree,
+    files: list[str],
+    stats: Stats,
+    jobs: int = 1,
+    reporter: "Reporter | None" = None,
+    fail_fast: bool = False,
+    io_threads: int = 0,
+    git_years: GitYears | None = None,
+    modified: bool = False,
+    pool: WorkerPool | None = None,
+) -> list[str]:
+    """Process files with the manager and result cache of their policy.
+
+    Each policy's files go to ``process_files`` together, so output is in
+    input order within a policy. Files whose policy skips them are counted
+    as skipped. With ``git_years``, years are looked up for each file
+    (``modified`` counts every file as changed this year). A ``pool`` must
+    hold the manager of every policy.
+    """
+    failed: list[str] = []
+    for policy, group in policies.split(files):
+        if policy is None:
+            stats.skip("policy", len(group))
+            continue
+        manager = policy.manager
+        if git_years is not None:
+            manager.file_years = {
+                file_path: git_years.file_years(
+                    file_path, manager.current_year, modified=modified
+                )
+                for file_path in group
+            }
+        failed += process_files(
+            manager,
+            group,
+            jobs,
+            result_cache=policy.result_cache,
+            reporter=reporter,
+            fail_fast=fail_fast,
+            io_threads=io_threads,
+            pool=pool,
+        )
+        if fail_fast and failed:
+            break
+    return failed
+
+
+class Reporter:
+    """Machine-readable report of per-file findings.
+
+    ``jsonl`` writes one JSON object per finding as soon as it is added;
+    ``sarif`` writes a single SARIF 2.1.0 log when the reporter is closed.
+    Files whose header was already correct are not reported.
+    """
+
+    FORMATS = ("jsonl", "sarif")
+    SARIF_LEVELS = {
+        STATUS_NONCOMPLIANT: "error",
+        STATUS_UPDATED: "note",
+        STATUS_ERROR: "warning",
+        STATUS_SKIPPED: "none",
+    }
+
+    def __init__(self, stream: TextIO, report_format: str):
+        if report_format not in self.FORMATS:
+            raise ValueError(f"Unknown report format: {report_format}")
+        self.stream = stream
+        self.format = report_format
+        self.results: list[dict[str, Any]] = []
+
+    def add(self, file_path: str, status: str, message: str) -> None:
+        """Report the outcome of processing one file."""
+        if status == STATUS_UNCHANGED:
+            return
+        message = message or f"{file_path}: {status}"
+        if self.format == "jsonl":
+            finding = {"path": file_path, "status": status, "message": message}
+            self.stream.write(json.dumps(finding) + "\n")
+            return
+        self.results.append(
+            {
+                "ruleId": "license-header",
+                "level": self.SARIF_LEVELS.get(status, "warning"),
+                "message": {"text": message},
+                "properties": {"status": status},
+                "locations": [
+                    {
+                        "physicalLocation": {
+                            "artifactLocation": {"uri": file_path.replace(os.sep, "/")},
+                            "region": {"startLine": 1},
+                        }
+                    }
+                ],
+            }
+        )
+
+    def close(self) -> None:
+        """Finish the report."""
+        if self.format == "sarif":
+            log = {
+                "$schema": "https://json.schemastore.org/sarif-2.1.0.json",
+                "version": "2.1.0",
+                "runs": [
+                    {
+                        "tool": {
+                            "driver": {
+                                "name": "license-header-hook",
+                                "version": __version__,
+                                "rules": [
+                                    {
+                                        "id": "license-header",
+                                        "shortDescription": {
+                                            "text": "Files must start with the "
+                                            "configured license header"
+                                        },
+                                    }
+                                ],
+                            }
+                        },
+                        "results": self.results,
+                    }
+                ],
+            }
+            json.dump(log, self.stream, indent=2)
+            self.stream.write("\n")
+        self.stream.flush()
+
+
+def watch(
+    header_manager: LicenseHeaderManager,
+    roots: list[str],
+    matcher: PathMatcher,
+    prune_dirs: frozenset[str] | set[str] = DEFAULT_PRUNE_DIRS,
+    result_cache: ResultCache | None = None,
+    reporter: Reporter | None = None,
+    stop: "threading.Event | None" = None,
+    debounce: float = WATCH_DEBOUNCE,
+    git_years: GitYears | None = None,
+    policies: PolicyTree | None = None,
+) -> list[str]:
+    """Process files below ``roots`` as they change, until ``stop`` is set.
+
+    Changes are collected until none has arrived for ``debounce`` seconds,
+    then the changed files that ``matcher`` selects and that have a comment
+    style are processed together, with the manager of their policy if
+    ``policies`` is given. Ctrl-C also stops watching. With ``git_years``,
+    changed files count as modified this year. Returns the files that did
+    not have the correct header.
+    """
+    registry = header_manager.comment_registry
+    if policies is None:
+        policies = PolicyTree(Policy(header_manager, result_cache))
+    watcher = _open_watcher(roots, prune_dirs)
+    failed_files: list[str] = []
+    try:
+        while stop is None or not stop.is_set():
+            try:
+                changed = _wait_for_changes(watcher, debounce)
+            except KeyboardInterrupt:
+                break
+            files = matcher.select(
+                file_path
+                for file_path in sorted(changed)
+                if registry.get_comment_style(file_path) and os.path.isfile(file_path)
+            )
+            if files:
+                failed_files += process_by_policy(
+                    policies,
+                    files,
+                    header_manager.stats,
+                    reporter=reporter,
+                    git_years=git_years,
+                    modified=True,
+                )
+                sys.stdout.flush()
+    finally:
+        watcher.close()
+    return failed_files
+
+
+def _wait_for_changes(
+    watcher: InotifyWatcher | PollingWatcher, debounce: float
+) -> set[str]:
+    """Changes coalesced until ``debounce`` seconds pass without another.
+
+    Returns an empty set if nothing changed for a while, so the caller can
+    check whether to stop.
+    """
+    changed = watcher.wait(WATCH_POLL_INTERVAL)
+    if changed:
+        while more := watcher.wait(debounce):
+            changed |= more
+    return changed
+
+
+def _build_parser() -> "argparse.ArgumentParser":
+    import argparse
 
-def main() -> int:
     parser = argparse.ArgumentParser(description="Pre-commit hook for license headers")
     parser.add_argument("files", nargs="*", help="Files to process")
     parser.add_argument(
@@ -376,35 +3339,707 @@ def main() -> int:
         default=[],
         help="File patterns to exclude (can be used multiple times)",
     )
+    parser.add_argument(
+        "--recursive",
+        "-r",
+        action="append",
+        default=[],
+        metavar="PATH",
+        help="Process every supported file below PATH, honouring .gitignore",
+    )
+    parser.add_argument(
+        "--files-from",
+        metavar="FILE",
+        help="Also process the NUL- or newline-delimited paths in FILE ('-' for "
+        "stdin), as they are read; a path listed again later is processed again",
+    )
+    parser.add_argument(
+        "--watch",
+        action="append",
+        default=[],
+        metavar="PATH",
+        help="After processing, keep running and process files below PATH "
+        "as they change (can be used multiple times)",
+    )
+    parser.add_argument(
+        "--stdin",
+        action="store_true",
+        help="Read a file from stdin and write it with its license header to "
+        "stdout (requires --filename-hint)",
+    )
+    parser.add_argument(
+        "--filename-hint",
+        metavar="NAME",
+        help="Name of the file read with --stdin, which selects its comment style",
+    )
+    parser.add_argument(
+        "--config",
+        metavar="FILE",
+        help="TOML file with [tool.license-header] policies for subtrees "
+        f"(default: {PYPROJECT} if it has that table)",
+    )
+    parser.add_argument(
+        "--prune",
+        action="append",
+        default=[],
+        metavar="NAME",
+        help="Directory name --recursive and --watch never enter "
+        f"(in addition to {', '.join(sorted(DEFAULT_PRUNE_DIRS))})",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of worker processes (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--io-threads",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Overlap reads and writes on N threads instead of using worker "
+        "processes, for slow or network filesystems",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Only report files with a missing or outdated header, never write",
+    )
+    parser.add_argument(
+        "--year-mode",
+        choices=YEAR_MODES,
+        default=YEAR_CURRENT,
+        help="Year in headers: the current year (default), the year of the "
+        "file's first commit, or a range from the first to the last year it "
+        "was changed",
+    )
+    parser.add_argument(
+        "--fail-fast",
+        action="store_true",
+        help="With --check, stop at the first file without a correct header",
+    )
+    parser.add_argument(
+        "--process-generated",
+        action="store_true",
+        help="Also process files marked @generated or DO NOT EDIT",
+    )
+    parser.add_argument(
+        "--report-format",
+        choices=Reporter.FORMATS,
+        help="Write a machine-readable report of findings (JSON Lines or SARIF)",
+    )
+    parser.add_argument(
+        "--report",
+        default="-",
+        metavar="FILE",
+        help="File for --report-format output (default: stdout, in which case "
+        "progress messages go to stderr)",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Skip files verified by a previous run unless they changed",
+    )
+    parser.add_argument(
+        "--git-index",
+        action="store_true",
+        help="Skip files whose git blob was verified by a previous run",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=DEFAULT_CACHE_DIR,
+        help=f"Directory for the result cache (default: {DEFAULT_CACHE_DIR})",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Print per-phase timings, byte counts and the slowest files to stderr",
+    )
+    parser.add_argument(
+        "--stats-json",
+        metavar="FILE",
+        help="Write the statistics collected for --stats to FILE as JSON",
+    )
+
+    return parser
 
-    args = parser.parse_args()
 
+# Options of main() that have no effect of their own when no file is
+# selected, by name and short alias, and the options that take a value.
+_QUIET_OPTIONS = frozenset(
+    {
+        "--template",
+        "--copyright-holder",
+        "--include",
+        "--exclude",
+        "--prune",
+        "--jobs",
+        "--io-threads",
+        "--check",
+        "--process-generated",
+        "--cache",
+        "--git-index",
+        "--cache-dir",
+        "--year-mode",
+    }
+)
+_SHORT_OPTIONS = {
+    "-t": "--template",
+    "-c": "--copyright-holder",
+    "-i": "--include",
+    "-e": "--exclude",
+    "-j": "--jobs",
+}
+_FLAG_OPTIONS = frozenset({"--check", "--process-generated", "--cache", "--git-index"})
+_INT_OPTIONS = frozenset({"--jobs", "--io-threads"})
+
+
+def _valid_value(option: str, value: str) -> bool:
+    if option in _INT_OPTIONS:
+        return value.isdigit()
+    return option != "--year-mode" or value in YEAR_MODES
+
+
+def _nothing_to_do(argv: list[str]) -> bool:
+    """Check, without parsing ``argv``, that a run could not select any file.
+
+    This holds when every argument is a file without a comment style (judged
+    by its first bytes when it has no extension) or one of
+    ``_QUIET_OPTIONS``, and the required options are present. When in doubt
+    the answer is False and the command line is parsed as usual.
+    """
+    registry = CommentRegistry()
+    required = {"--template", "--copyright-holder"}
+    pending = None  # Option waiting for its value
+    for arg in argv:
+        if pending is not None:
+            if not _valid_value(pending, arg):
+                return False
+            pending = None
+        elif arg.startswith("-"):
+            name, has_value, value = arg.partition("=")
+            name = _SHORT_OPTIONS.get(name, name)
+            if name not in _QUIET_OPTIONS or (has_value and name in _FLAG_OPTIONS):
+                return False
+            if has_value and not _valid_value(name, value):
+                return False
+            if not has_value and name not in _FLAG_OPTIONS:
+                pending = name
+            required.discard(name)
+        if registry.get_comment_style(arg):
+            return False
+    return not required and pending is None
+
+
+def main(argv: list[str] | None = None) -> int:
+    if argv is None:
+        argv = sys.argv[1:]
+    # Most commits touch no supported file: skip building the parser
+    if _nothing_to_do(argv):
+        return 0
+    parser = _build_parser()
+    args = parser.parse_args(argv)
+    _check_args(parser, args)
+    return _run(args)
+
+
+def _check_args(parser: "argparse.ArgumentParser", args: "argparse.Namespace") -> None:
+    """Reject combinations of options that the parser itself lets through."""
+    if args.fail_fast and not args.check:
+        parser.error("--fail-fast requires --check")
+    if args.stdin != bool(args.filename_hint):
+        parser.error("--stdin and --filename-hint must be used together")
+    if args.stdin and (args.files or args.recursive or args.watch or args.files_from):
+        parser.error(
+            "--stdin cannot be used with files, --recursive, --files-from or --watch"
+        )
+    if args.stdin and args.report_format and args.report == "-":
+        parser.error("--stdin needs --report FILE for --report-format")
+
+
+def _has_policies(config_path: str) -> bool:
+    """Check cheaply whether a TOML file may have a [tool.license-header] table."""
+    try:
+        with open(config_path, "rb") as f:
+            return b"tool.license-header" in f.read()
+    except OSError:
+        return False
+
+
+def _select_existing(matcher: PathMatcher, paths: list[str], stats: Stats) -> list[str]:
+    """The existing files among ``paths`` that ``matcher`` selects."""
+    files = matcher.select(f for f in paths if os.path.isfile(f))
+    stats.skip("excluded", len(paths) - len(files))
+    return files
+
+
+def _unique(paths: list[str]) -> list[str]:
+    """The first of each file in ``paths``, comparing normalized paths."""
+    unique: dict[str, str] = {}
+    for path in paths:
+        unique.setdefault(_normpath(path), path)
+    return list(unique.values())
+
+
+def _run(args: "argparse.Namespace", daemon: "Daemon | None" = None) -> int:
+    """Process the files selected by parsed command line arguments.
+
+    A ``daemon`` supplies header managers and result caches kept from
+    earlier runs instead of building them from scratch.
+    """
     # Initialize components
+    stats = Stats(enabled=args.stats or bool(args.stats_json))
+    skip_generated = not args.process_generated
     comment_registry = CommentRegistry()
-    header_manager = LicenseHeaderManager(
-        args.template, args.copyright_holder, comment_registry
-    )
+
+    def make_policy(template: str, copyright_holder: str) -> Policy:
+        if daemon is not None:
+            manager = daemon.manager(
+                template, copyright_holder, skip_generated, args.year_mode
+            )
+            manager.check = args.check
+            manager.stats = stats
+        else:
+            manager = LicenseHeaderManager(
+                template,
+                copyright_holder,
+                comment_registry,
+                check=args.check,
+                stats=stats,
+                skip_generated=skip_generated,
+                year_mode=args.year_mode,
+            )
+        return Policy(manager)
+
+    root_policy = make_policy(args.template, args.copyright_holder)
+    header_manager = root_policy.manager
+    comment_registry = header_manager.comment_registry
+    policies = PolicyTree(root_policy)
+    config = args.config
+    if config is None and _has_policies(PYPROJECT):
+        config = PYPROJECT
+    if config is not None:
+        with stats.step("policies"):
+            try:
+                policies = load_policies(config, root_policy, make_policy)
+            except (OSError, ValueError) as e:
+                print(f"Error in {config}: {e}", file=sys.stderr)
+                return 1
 
     # Process files
-    modified_files = []
+    with stats.step("select"):
+        matcher = PathMatcher(args.include, args.exclude)
+        files = _select_existing(matcher, args.files, stats)
+        prune_dirs = DEFAULT_PRUNE_DIRS.union(args.prune)
+        for root in args.recursive:
+            files.extend(
+                matcher.select(
+                    file_path
+                    for file_path in walk_files(root, prune_dirs)
+                    if comment_registry.get_comment_style(file_path)
+                )
+            )
+        # A file named twice, or also found by a walk, is processed once
+        files = _unique(files)
+    git_years = None
+    if args.year_mode != YEAR_CURRENT:
+        with stats.step("git years"):
+            git_years = GitYears.load(args.cache_dir)
+            if git_years is None:
+                print(
+                    "Warning: No git history found, using the current year",
+                    file=sys.stderr,
+                )
+    with stats.step("cache load"):
+        if args.git_index or args.cache:
+            cache_class = GitIndexCache if args.git_index else ResultCache
+            # One cache per policy, as each has its own fingerprint
+            for policy in policies.policies():
+                if daemon is not None:
+                    policy.result_cache = daemon.result_cache(
+                        cache_class, args.cache_dir, policy.manager
+                    )
+                else:
+                    policy.result_cache = cache_class(
+                        args.cache_dir, policy.manager.fingerprint()
+                    )
 
-    for file_path in args.files:
-        if not os.path.isfile(file_path):
-            continue
+    file_list = None
+    if args.files_from:
+        try:
+            file_list = (
+                sys.stdin.fileno()
+                if args.files_from == "-"
+                else os.open(args.files_from, os.O_RDONLY)
+            )
+        except OSError as e:
+            print(f"Error reading {args.files_from}: {e}", file=sys.stderr)
+            return 1
+
+    with contextlib.ExitStack() as stack:
+        # Files from the command line, then windows of the --files-from list.
+        # Only repeats within a window are dropped, as the list is not kept
+        windows: Iterable[list[str]] = [files]
+        if file_list is not None:
+            if args.files_from != "-":
+                stack.callback(os.close, file_list)
+            windows = itertools.chain(
+                windows,
+                (
+                    _unique(_select_existing(matcher, paths, stats))
+                    for paths in read_file_list(file_list)
+                ),
+            )
+        output = None
+        if args.stdin:
+            # stdout is for the content: messages go to stderr
+            sys.stdout.flush()
+            output = sys.stdout.buffer
+            stack.enter_context(contextlib.redirect_stdout(sys.stderr))
+        reporter = None
+        if args.report_format:
+            if args.report == "-":
+                # Keep stdout clean for the report
+                report_stream = sys.stdout
+                stack.enter_context(contextlib.redirect_stdout(sys.stderr))
+            else:
+                report_stream = stack.enter_context(
+                    open(args.report, "w", encoding="utf-8")
+                )
+            reporter = Reporter(report_stream, args.report_format)
+
+        with stats.step("process"):
+            if output is not None:
+                stream_policy = policies.policy(args.filename_hint)
+                if stream_policy is None:
+                    # Skipped by policy: the content passes through
+                    stats.skip("policy")
+                    while chunk := sys.stdin.buffer.read(COPY_CHUNK):
+                        output.write(chunk)
+                    output.flush()
+                    status = STATUS_SKIPPED
+                else:
+                    if git_years is not None:
+                        stream_policy.manager.file_years = {
+                            args.filename_hint: git_years.file_years(
+                                args.filename_hint, stream_policy.manager.current_year
+                            )
+                        }
+                    status = stream_policy.manager.process_stream(
+                        args.filename_hint, sys.stdin.buffer, output
+                    )
+                if reporter is not None:
+                    reporter.add(args.filename_hint, status, "")
+                # Updated content is the output, not a failure
+                failed_files = []
+                if status == STATUS_NONCOMPLIANT:
+                    failed_files.append(args.filename_hint)
+            else:
+                failed_files = []
+                pool = None
+                if args.jobs > 1 and not args.io_threads:
+                    # One pool for every window, started by the first chunk
+                    pool = stack.enter_context(
+                        WorkerPool(
+                            args.jobs,
+                            [policy.manager for policy in policies.policies()],
+                            args.fail_fast,
+                        )
+                    )
+                for window in windows:
+                    failed_files += process_by_policy(
+                        policies,
+                        window,
+                        stats,
+                        args.jobs,
+                        reporter=reporter,
+                        fail_fast=args.fail_fast,
+                        io_threads=args.io_threads,
+                        git_years=git_years,
+                        pool=pool,
+                    )
+                    if args.fail_fast and failed_files:
+                        break
+        if args.watch:
+            print(f"Watching {', '.join(args.watch)}, Ctrl-C to stop", file=sys.stderr)
+            watched = watch(
+                header_manager,
+                args.watch,
+                matcher,
+                prune_dirs,
+                reporter=reporter,
+                git_years=git_years,
+                policies=policies,
+            )
+            # A file may have been reported more than once
+            failed_files = list(dict.fromkeys([*failed_files, *watched]))
+        if reporter is not None:
+            reporter.close()
+        if args.git_index or args.cache:
+            with stats.step("cache save"):
+                caches = [
+                    policy.result_cache
+                    for policy in policies.policies()
+                    if policy.result_cache is not None
+                ]
+                # Every policy's cache is in use, however many there are
+                for result_cache in caches:
+                    result_cache.save(keep=[cache.path for cache in caches])
+
+        if args.stats:
+            print(stats.format_summary(), file=sys.stderr)
+        if args.stats_json:
+            with open(args.stats_json, "w", encoding="utf-8") as f:
+                json.dump(stats.to_dict(), f, indent=2)
+                f.write("\n")
+
+        # Return appropriate exit code
+        if output is not None and status == STATUS_ERROR:
+            return 1
+        if failed_files and args.check:
+            print(
+                f"\nFound {len(failed_files)} files with missing or outdated "
+                "license headers"
+            )
+            return 1
+        if failed_files:
+            print(f"\nModified {len(failed_files)} files with license headers")
+            return 1  # Pre-commit expects 1 when files are modified
+
+    return 0
 
-        if not should_process_file(file_path, args.include, args.exclude):
-            continue
 
-        if header_manager.process_file(file_path):
-            modified_files.append(file_path)
+class Daemon:
+    """Runs ``main()`` for clients connecting to a Unix socket.
 
-    # Return appropriate exit code
-    if modified_files:
-        print(f"\nModified {len(modified_files)} files with license headers")
-        return 1  # Pre-commit expects 1 when files are modified
+    Header managers (with their loaded template, comment registry and
+    rendered headers) and result caches are kept between runs. A manager is
+    rebuilt when its template file changes or the year turns. Requests are
+    handled one at a time, in the client's working directory.
+    """
+
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self._managers: dict[tuple[Any, ...], LicenseHeaderManager] = {}
+        self._fingerprints: dict[LicenseHeaderManager, str] = {}
+        self._caches: dict[tuple[Any, ...], ResultCache] = {}
+
+    def manager(
+        self,
+        template_file: str,
+        copyright_holder: str,
+        skip_generated: bool,
+        year_mode: str = YEAR_CURRENT,
+    ) -> LicenseHeaderManager:
+        """Header manager for a configuration, reloaded if the template changed."""
+        try:
+            st = os.stat(template_file)
+        except OSError:
+            # Not cached: report the missing template like main() does
+            return LicenseHeaderManager(
+                template_file,
+                copyright_holder,
+                CommentRegistry(),
+                skip_generated=skip_generated,
+                year_mode=year_mode,
+            )
+        template_file = os.path.abspath(template_file)
+        key = (
+            template_file,
+            st.st_mtime_ns,
+            st.st_size,
+            copyright_holder,
+            skip_generated,
+            year_mode,
+            time.localtime().tm_year,
+        )
+        header_manager = self._managers.get(key)
+        if header_manager is None:
+            # Drop managers built from an older version of the template
+            for old_key in [
+                k
+                for k in self._managers
+                if k[0] == template_file and k[1:3] != key[1:3]
+            ]:
+                self._fingerprints.pop(self._managers.pop(old_key), None)
+            header_manager = LicenseHeaderManager(
+                template_file,
+                copyright_holder,
+                CommentRegistry(),
+                skip_generated=skip_generated,
+                year_mode=year_mode,
+            )
+            self._managers[key] = header_manager
+        return header_manager
 
+    def result_cache(
+        self,
+        cache_class: type[ResultCache],
+        cache_dir: str,
+        header_manager: LicenseHeaderManager,
+    ) -> ResultCache:
+        """Result cache for a configuration, kept in memory between runs."""
+        fingerprint = self._fingerprints.get(header_manager)
+        if fingerprint is None:
+            fingerprint = self._fingerprints[header_manager] = (
+                header_manager.fingerprint()
+            )
+        key = (cache_class, os.path.abspath(cache_dir), fingerprint)
+        cache = self._caches.get(key)
+        if cache is None:
+            cache = self._caches[key] = cache_class(cache_dir, fingerprint)
+        else:
+            cache.start_run()
+        return cache
+
+    def handle(self, request: dict[str, Any]) -> dict[str, Any]:
+        """Run ``main()`` for one request and return its exit code and output."""
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        cwd = os.getcwd()
+        try:
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                try:
+                    os.chdir(request["cwd"])
+                    parser = _build_parser()
+                    args = parser.parse_args(request["argv"])
+                    _check_args(parser, args)
+                    if args.watch:
+                        parser.error("--watch cannot be used through the daemon")
+                    if args.stdin or args.files_from == "-":
+                        parser.error("stdin cannot be read through the daemon")
+                    code = _run(args, self)
+                except SystemExit as e:
+                    code = (
+                        e.code if isinstance(e.code, int) else int(e.code is not None)
+                    )
+                except Exception:
+                    import traceback
+
+                    traceback.print_exc()
+                    code = 1
+        finally:
+            os.chdir(cwd)
+        return {"exit": code, "stdout": stdout.getvalue(), "stderr": stderr.getvalue()}
+
+    def serve(self, idle_timeout: float | None = None) -> None:
+        """Serve requests until interrupted or idle for ``idle_timeout`` seconds."""
+        import socket
+
+        if os.path.exists(self.socket_path):
+            with socket.socket(socket.AF_UNIX) as probe:
+                try:
+                    probe.connect(self.socket_path)
+                except OSError:
+                    os.unlink(self.socket_path)  # Left behind by a dead daemon
+                else:
+                    raise RuntimeError(
+                        f"A daemon is already serving {self.socket_path}"
+                    )
+
+        os.makedirs(os.path.dirname(self.socket_path) or ".", exist_ok=True)
+        with socket.socket(socket.AF_UNIX) as server:
+            # Only the owner may ask the daemon to rewrite files
+            umask = os.umask(0o077)
+            try:
+                server.bind(self.socket_path)
+            finally:
+                os.umask(umask)
+            try:
+                server.listen(DAEMON_BACKLOG)
+                server.settimeout(idle_timeout)
+                while True:
+                    try:
+                        connection, _ = server.accept()
+                    except TimeoutError:
+                        return
+                    with connection:
+                        connection.settimeout(None)
+                        request = json.loads(_recv_all(connection))
+                        response = self.handle(request)
+                        connection.sendall(json.dumps(response).encode("utf-8"))
+            finally:
+                with contextlib.suppress(OSError):
+                    os.unlink(self.socket_path)
+
+
+def _recv_all(connection: "socket.socket") -> bytes:
+    """Read from a socket until the other side shuts down its writing end."""
+    chunks = []
+    while chunk := connection.recv(COPY_CHUNK):
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def _socket_path(path: str | None = None) -> str:
+    return path or os.environ.get(SOCKET_ENV) or DEFAULT_SOCKET
+
+
+def daemon_main(argv: list[str] | None = None) -> int:
+    import argparse
+    import signal
+    import socket
+
+    parser = argparse.ArgumentParser(
+        description="Serve license-header-client requests from a warm process"
+    )
+    parser.add_argument(
+        "--socket",
+        help=f"Unix socket to listen on (default: ${SOCKET_ENV} or {DEFAULT_SOCKET})",
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        metavar="SECONDS",
+        help="Exit after this long without a request (default: never)",
+    )
+    args = parser.parse_args(argv)
+    if not hasattr(socket, "AF_UNIX"):
+        parser.error("Unix sockets are not supported on this platform")
+
+    daemon = Daemon(_socket_path(args.socket))
+    # Exit through the normal path on SIGTERM so the socket is removed
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"Serving on {daemon.socket_path}", file=sys.stderr)
+    try:
+        daemon.serve(args.idle_timeout)
+    except KeyboardInterrupt:
+        pass
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
     return 0
 
 
+def client_main(argv: list[str] | None = None) -> int:
+    """Run the hook in a daemon if one is listening, otherwise in-process."""
+    argv = sys.argv[1:] if argv is None else argv
+    if _nothing_to_do(argv):
+        return 0
+    # The daemon cannot read this process's stdin
+    if {"--stdin", "--files-from=-"} & set(argv) or any(
+        option == "--files-from" and value == "-"
+        for option, value in itertools.pairwise(argv)
+    ):
+        return main(argv)
+    import socket
+
+    if not hasattr(socket, "AF_UNIX"):
+        return main(argv)
+    with socket.socket(socket.AF_UNIX) as connection:
+        try:
+            connection.connect(_socket_path())
+        except OSError:
+            return main(argv)
+        request = {"argv": argv, "cwd": os.getcwd()}
+        connection.sendall(json.dumps(request).encode("utf-8"))
+        connection.shutdown(socket.SHUT_WR)
+        response = json.loads(_recv_all(connection))
+    sys.stdout.write(response["stdout"])
+    sys.stderr.write(response["stderr"])
+    return int(response["exit"])
+
+
 if __name__ == "__main__":
     sys.exit(main())
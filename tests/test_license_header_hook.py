@@ -1,16 +1,52 @@
 """Tests for license_header_hook module."""
 
+import errno
+import io
+import json
 import os
+import pickle
+import shutil
+import subprocess
+import sys
 import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
 from unittest.mock import patch
 
 import pytest
 
 from license_header_hook import (
+    CACHE_MAX_FILES,
+    CHUNK_FILES,
+    DEFAULT_PRUNE_DIRS,
     CommentRegistry,
+    CommentStyle,
+    Daemon,
+    GitIgnore,
+    GitIndex,
+    GitYears,
+    InotifyWatcher,
     LicenseHeaderManager,
+    PathMatcher,
+    Policy,
+    PolicyTree,
+    PollingWatcher,
+    ResultCache,
+    Stats,
+    _chunk_files,
+    _nothing_to_do,
+    client_main,
+    detect_language,
+    load_policies,
     main,
+    process_files,
+    read_file_list,
     should_process_file,
+    walk_files,
+    watch,
 )
 
 
@@ -41,6 +77,126 @@ class TestCommentRegistry:
         custom_style = registry.get_comment_style("test.custom")
         assert custom_style == {"start": "//", "middle": "//", "end": "//"}
 
+    def test_compound_extensions_and_file_names(self):
+        """Test that the longest extension and exact file names win."""
+        registry = CommentRegistry(
+            {
+                ".d.ts": {"start": "//", "middle": "//", "end": "//"},
+                "Makefile": {"start": "#", "middle": "#", "end": "#"},
+            }
+        )
+
+        assert registry.get_comment_style("src/types.d.ts").start == "//"
+        assert registry.get_comment_style("src/app.spec.ts").start == "/*"
+        assert registry.get_comment_style("lib/jquery.min.JS").start == "/*"
+        assert registry.get_comment_style("sub/Makefile").start == "#"
+        assert registry.get_comment_style("sub/makefile") is None
+        assert registry.get_comment_style(".bashrc") is None
+        assert registry.get_comment_style("..py") is None
+        assert registry.get_comment_style("dir.py/README") is None
+
+    def test_styles_are_shared_and_precomputed(self):
+        """Test that equal styles are one object with derived values."""
+        registry = CommentRegistry()
+        python = registry.get_comment_style("a.py")
+        c = registry.get_comment_style("a.c")
+
+        assert python is registry.get_comment_style("a.sh")
+        assert python.single_line and python.line_comments
+        assert not c.single_line and not c.line_comments
+        assert (c.start_bytes, c.end_bytes, c.middle_mark) == (b"/*", b" */", "*")
+        with pytest.raises(AttributeError):
+            python.start = "//"
+
+    def test_style_is_compatible_with_dicts(self):
+        """Test indexing, dict equality, hashing and pickling of a style."""
+        markers = {"start": "/*", "middle": " *", "end": " */"}
+        style = CommentStyle.of(markers)
+
+        assert CommentStyle.of(style) is style
+        assert style["middle"] == " *" and dict(style) == markers
+        assert style == markers and style == CommentStyle("/*", " *", " */")
+        assert style != CommentStyle("#", "#", "#")
+        assert {style: 1}[CommentStyle.of(dict(markers))] == 1
+        assert pickle.loads(pickle.dumps(style)) == style
+        with pytest.raises(KeyError):
+            style["start_bytes"]
+
+
+class TestLanguageDetection:
+    """Test comment styles of files without an extension."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.registry = CommentRegistry()
+
+    def teardown_method(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _write(self, name, content):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+
+    def test_detect_language(self):
+        """Test shebangs, modelines and markup."""
+        cases = [
+            (b"#!/usr/bin/env python3\n", "python"),
+            (b"#!/usr/bin/python3.11 -u\r\n", "python"),
+            (b"#!/usr/bin/env -S NODE_ENV=1 node --inspect\n", "node"),
+            (b"#!/bin/sh\n# -*- mode: python; coding: utf-8 -*-\n", "python"),
+            (b"#!/bin/sh\n# vim: set ft=bash:\n", "bash"),
+            (b"# -*- Shell-Script -*-\n", "shell-script"),
+            (b'<?xml version="1.0"?>\n', "xml"),
+            (b"\n<!DOCTYPE html>\n", "html"),
+            (b"# -*- coding: utf-8 -*-\n", None),
+            (b"#!/usr/bin/env\n", None),
+            (b"#!/bin/sh\0", None),
+            (b"plain text\n", None),
+        ]
+        for prefix, language in cases:
+            assert detect_language(prefix) == language, prefix
+
+    def test_registry_detects_extensionless_files(self):
+        """Test that only files without an extension are read."""
+        deploy = self._write("deploy", b"#!/usr/bin/env bash\necho hi\n")
+        ruby = self._write("rakefile", b"#!/usr/bin/env ruby\n")
+        script = self._write("script.txt", b"#!/usr/bin/env python3\n")
+
+        assert self.registry.get_comment_style(deploy).start == "#"
+        assert self.registry.get_comment_style(ruby) is None
+        assert self.registry.get_comment_style(script) is None
+        assert self.registry.get_comment_style(self.temp_dir) is None
+        custom = CommentRegistry({".rb": {"start": "#", "middle": "#", "end": "#"}})
+        assert custom.get_comment_style(ruby).start == "#"
+
+    def test_detection_is_cached_until_modified(self):
+        """Test that a file is read again only once its mtime changes."""
+        path = self._write("tool", b"#!/usr/bin/env node\n")
+
+        with patch("builtins.open", wraps=open) as opened:
+            assert self.registry.get_comment_style(path).start == "/*"
+            assert self.registry.get_comment_style(path).start == "/*"
+        assert opened.call_count == 1
+
+        self._write("tool", b"#!/usr/bin/env python3\n")
+        os.utime(path, ns=(0, 1_000_000_000))
+        assert self.registry.get_comment_style(path).start == "#"
+
+    def test_main_adds_header_to_script(self):
+        """Test a full run on a script, and that it cannot exit early."""
+        template = self._write("t.txt", b"Copyright (c) {year} {copyright_holder}")
+        path = self._write("deploy", b"#!/bin/sh\necho hi\n")
+        argv = ["--template", template, "--copyright-holder", "Test Corp", path]
+
+        assert not _nothing_to_do(argv)
+        assert main(argv) == 1
+        with open(path) as f:
+            assert f.read().startswith("#!/bin/sh\n# Copyright (c) ")
+
 
 class TestLicenseHeaderManager:
     """Test LicenseHeaderManager functionality."""
@@ -92,6 +248,40 @@ class TestLicenseHeaderManager:
         expected = "/*\n * Line 1\n * Line 2\n */"
         assert result == expected
 
+    def test_get_header_is_cached(self):
+        """Test that the template is loaded once and headers are memoized."""
+        comment_style = {"start": "#", "middle": "#", "end": "#"}
+
+        with patch.object(
+            self.manager, "load_template", wraps=self.manager.load_template
+        ) as load_template:
+            first = self.manager.get_header(comment_style)
+            second = self.manager.get_header(dict(comment_style))
+            self.manager.get_header({"start": "/*", "middle": " *", "end": " */"})
+
+        assert load_template.call_count == 1
+        assert first is second
+        text, data = first
+        assert text.startswith("# Copyright (c)")
+        assert data == text.encode("utf-8")
+
+    def test_prefix_has_header(self):
+        """Test the fast-path check for an already correct header."""
+        comment_style = {"start": "#", "middle": "#", "end": "#"}
+        header_text, header = self.manager.get_header(comment_style)
+        cases = [
+            (f"{header_text}\nprint('hello')\n", True),
+            (f"{header_text}\n", True),
+            (f"#!/usr/bin/env python3\n{header_text}\nx = 1\n", True),
+            (f"{header_text}\n\nprint('hello')\n", False),
+            (f"\n{header_text}\nprint('hello')\n", False),
+            (f"{header_text}", False),
+            ("print('hello')\n", False),
+        ]
+        for content, expected in cases:
+            prefix = content.encode("utf-8")
+            assert self.manager._prefix_has_header(prefix, header, True) is expected
+
 
 class TestShouldProcessFile:
     """Test file filtering functionality."""
@@ -119,6 +309,104 @@ class TestShouldProcessFile:
         assert should_process_file("other.py", ["*.py"], ["test.py"])
 
 
+class TestPathMatcher:
+    """Test the compiled include/exclude matcher."""
+
+    PATHS = [
+        "test.py",
+        "a/b/c.py",
+        "./src/x.js",
+        "src//lib/.hidden.py",
+        "a.tar.gz",
+        "/abs/dir/file.py",
+        "/abs/file",
+        "/x.py",
+        "//y.py",
+        "a/b.py",
+        "dir/sub/",
+        "tests/test_a.py",
+        "tests/sub/test_b.py",
+        "Makefile",
+        "b.PY",
+        "a]b.py",
+        "a[1].py",
+        ".py",
+        "src/tests/foo.py",
+    ]
+    PATTERNS = [
+        "*.py",
+        "*.tar.gz",
+        "*.gz",
+        "test.py",
+        "Makefile",
+        "tests/*",
+        "tests/**",
+        "**/*.py",
+        "*/*.py",
+        "a/*/c.py",
+        "/abs/*/file.py",
+        "/abs/*",
+        "*",
+        "?.py",
+        "[ab].py",
+        "[!a]*.py",
+        "a[]]b.py",
+        "a[[]1].py",
+        "*.PY",
+        "t*/*.py",
+        "[z-a].py",
+        "[!a]*/[!a]*",
+        "*/x.py",
+        "?/*",
+        "a[!x]b.py",
+    ]
+
+    def test_matches_path_match(self):
+        """Test that every pattern gives the same answer as Path.match."""
+        for path in self.PATHS:
+            for pattern in self.PATTERNS:
+                matcher = PathMatcher([pattern], [])
+                assert matcher.matches(path) == Path(path).match(pattern), (
+                    path,
+                    pattern,
+                )
+
+    def test_select_matches_should_process_file(self):
+        """Test combined include/exclude lists against the per-pattern loop."""
+        include = self.PATTERNS[:12]
+        exclude = ["tests/*", "*.gz", "[!a]*.py"]
+        expected = [
+            path
+            for path in self.PATHS
+            if not any(Path(path).match(p) for p in exclude)
+            and any(Path(path).match(p) for p in include)
+        ]
+
+        assert PathMatcher(include, exclude).select(self.PATHS) == expected
+        assert [
+            path for path in self.PATHS if should_process_file(path, include, exclude)
+        ] == expected
+
+    def test_fast_paths(self):
+        """Test that extension and name patterns bypass the regex."""
+        matcher = PathMatcher(["*.py", "*.tar.gz", "Makefile", "src/*.c"], [])
+        include = matcher._include
+
+        assert include.suffixes == {".py", ".tar.gz"}
+        assert include.names == {"Makefile"}
+        assert include.regex.pattern.count("|") == 0
+        assert matcher.select(["a.tar.gz", "b.gz", "x/Makefile", "src/m.c"]) == [
+            "a.tar.gz",
+            "x/Makefile",
+            "src/m.c",
+        ]
+
+    def test_empty_pattern(self):
+        """Test that empty patterns are rejected like Path.match does."""
+        with pytest.raises(ValueError):
+            PathMatcher([""], [])
+
+
 class TestMain:
     """Test main function and CLI interface."""
 
@@ -163,7 +451,7 @@ class TestMain:
     def test_main_no_files_to_process(self):
         """Test main function when no files need processing."""
         # Create file that already has correct header
-        header = "# Copyright (c) 2025 Test Corp"
+        header = f"# Copyright (c) {datetime.now().year} Test Corp"
 
         with open(self.test_file, "w") as f:
             f.write(f"{header}\nprint('hello world')\n")
@@ -420,8 +708,10 @@ print('hello')
         # Store original modification time
         original_stat = os.stat(test_file)
 
-        result = self.manager.process_file(test_file)
+        with patch.object(self.manager, "remove_existing_header") as remove:
+            result = self.manager.process_file(test_file)
         assert result is False  # No change needed
+        remove.assert_not_called()  # Returned early without rebuilding
 
         # Verify file wasn't modified
         new_stat = os.stat(test_file)
@@ -639,3 +929,2223 @@ print('hello')
         # Should end with single newline
         assert content.endswith("\n")
         assert not content.endswith("\n\n")
+
+
+class TestProcessFiles:
+    """Test serial and parallel file processing."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.template_file = os.path.join(self.temp_dir, "template.txt")
+
+        with open(self.template_file, "w") as f:
+            f.write("Copyright (c) {year} {copyright_holder}")
+
+        self.manager = LicenseHeaderManager(
+            self.template_file, "Test Corp", CommentRegistry()
+        )
+
+    def _make_files(self, subdir):
+        directory = os.path.join(self.temp_dir, subdir)
+        os.makedirs(directory)
+        files = []
+        for i in range(12):
+            path = os.path.join(directory, f"file{i}.py")
+            with open(path, "w") as f:
+                if i % 3 == 0:
+                    f.write(f"# Copyright (c) {self.manager.current_year} Test Corp\n")
+                f.write("print('hello')\n" * (i + 1))
+            files.append(path)
+        files.append(os.path.join(directory, "notes.unknown"))
+        with open(files[-1], "w") as f:
+            f.write("text\n")
+        return files
+
+    def test_chunk_files_large_first(self):
+        """Test that the largest files are scheduled first."""
+        files = self._make_files("chunks")
+
+        chunks = _chunk_files(files, chunk_bytes=1 << 20, chunk_files=4)
+
+        assert [len(chunk) for chunk in chunks] == [4, 4, 4, 1]
+        sizes = [os.path.getsize(f) for f in files]
+        assert sizes[chunks[0][0]] == max(sizes)
+        assert sizes[chunks[-1][-1]] == min(sizes)
+        assert sorted(i for chunk in chunks for i in chunk) == list(range(13))
+
+    def test_parallel_matches_serial(self, capsys):
+        """Test that a parallel run reports exactly what a serial run does."""
+        serial_files = self._make_files("serial")
+        parallel_files = self._make_files("parallel")
+
+        serial = process_files(self.manager, serial_files, jobs=1)
+        serial_out = capsys.readouterr().out
+
+        parallel = process_files(self.manager, parallel_files, jobs=3, chunk_files=2)
+        parallel_out = capsys.readouterr().out
+
+        assert [os.path.basename(f) for f in serial] == [
+            os.path.basename(f) for f in parallel
+        ]
+        assert len(parallel) == 8
+        assert serial_out.replace("serial", "parallel") == parallel_out
+
+        for serial_file, parallel_file in zip(
+            serial_files, parallel_files, strict=True
+        ):
+            with open(serial_file) as f1, open(parallel_file) as f2:
+                assert f1.read() == f2.read()
+
+    def test_io_threads_match_serial(self, capsys):
+        """Test that the I/O pipeline reports exactly what a serial run does."""
+        serial_files = self._make_files("serial")
+        piped_files = self._make_files("piped")
+        piped_files.insert(3, os.path.join(self.temp_dir, "piped", "missing.py"))
+        serial_files.insert(3, os.path.join(self.temp_dir, "serial", "missing.py"))
+
+        serial = process_files(self.manager, serial_files)
+        serial_out = capsys.readouterr().out
+
+        with patch("license_header_hook.IO_PREFETCH", 1):
+            piped = process_files(self.manager, piped_files, io_threads=2)
+        piped_out = capsys.readouterr().out
+
+        assert len(piped) == 8
+        assert [f.replace("serial", "piped") for f in serial] == piped
+        assert serial_out.replace("serial", "piped") == piped_out
+        assert "Error reading" in piped_out
+        for serial_file, piped_file in zip(serial_files, piped_files, strict=True):
+            if os.path.exists(serial_file):
+                with open(serial_file) as f1, open(piped_file) as f2:
+                    assert f1.read() == f2.read()
+
+    def test_io_threads_fail_fast(self):
+        """Test that the I/O pipeline stops at the first failing file."""
+        files = self._make_files("fail_fast")
+        manager = LicenseHeaderManager(
+            self.template_file, "Test Corp", CommentRegistry(), check=True
+        )
+
+        failed = process_files(manager, files, io_threads=2, fail_fast=True)
+
+        assert failed == [files[1]]
+
+    def test_io_threads_repeated_file(self):
+        """Test that the I/O pipeline rewrites a file listed twice only once."""
+        files = self._make_files("repeated")
+        path = files[1]
+
+        failed = process_files(self.manager, [path, path, path], io_threads=4)
+
+        assert failed == [path]
+        with open(path) as f:
+            assert f.read().count("Copyright (c)") == 1
+
+    def test_main_jobs_option(self):
+        """Test main function with the --jobs option."""
+        files = self._make_files("main")
+        test_args = [
+            "license_header_hook.py",
+            "--template",
+            self.template_file,
+            "--copyright-holder",
+            "Test Corp",
+            "--jobs",
+            "2",
+            *files,
+        ]
+
+        with patch("sys.argv", test_args):
+            result = main()
+
+        assert result == 1
+        for path in files[:-1]:
+            with open(path) as f:
+                assert f.read().startswith("# Copyright (c)")
+
+
+class TestLargeFiles:
+    """Test bounded reads and streamed rewrites."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.template_file = os.path.join(self.temp_dir, "template.txt")
+
+        with open(self.template_file, "w") as f:
+            f.write("Copyright (c) {year} {copyright_holder}\nLicense text here")
+
+        self.manager = LicenseHeaderManager(
+            self.template_file, "Test Corp", CommentRegistry()
+        )
+        self.header = self.manager.get_header({"start": "#", "middle": "#", "end": "#"})
+        self.body = "".join(f"value_{i} = {i}\n" for i in range(200_000))
+
+    def _rewrite(self, content):
+        test_file = os.path.join(self.temp_dir, "large.py")
+        with open(test_file, "w", newline="") as f:
+            f.write(content)
+
+        assert self.manager.process_file(test_file) is True
+
+        with open(test_file, newline="") as f:
+            return f.read()
+
+    def test_insert_header_shifts_tail(self):
+        """Test adding a header to a large file keeps the body intact."""
+        content = self._rewrite(self.body)
+        assert content == self.header[0] + "\n" + self.body
+
+    def test_replace_longer_header_shifts_tail(self):
+        """Test replacing a longer header with a shorter one."""
+        old_header = "".join(f"# Old license line {i}\n" for i in range(50))
+        content = self._rewrite(old_header + "\n" + self.body)
+        assert content == self.header[0] + "\n" + self.body
+
+    def test_header_only_read_from_prefix(self):
+        """Test that a correct header costs a single bounded read."""
+        test_file = os.path.join(self.temp_dir, "current.py")
+        with open(test_file, "w") as f:
+            f.write(self.header[0] + "\n" + self.body)
+
+        with patch("builtins.open", wraps=open) as mock_open:
+            assert self.manager.process_file(test_file) is False
+
+        mock_open.assert_called_once_with(test_file, "rb")
+
+    def test_crlf_line_endings_preserved(self):
+        """Test that CRLF files get a CRLF header."""
+        content = self._rewrite("# Old license header\r\n\r\nprint('hello')\r\n")
+        expected = self.header[0].replace("\n", "\r\n") + "\r\nprint('hello')\r\n"
+        assert content == expected
+
+    def test_unterminated_header_region_skipped(self, capsys):
+        """Test that an unbounded header region is skipped, not rewritten."""
+        test_file = os.path.join(self.temp_dir, "comments.py")
+        content = "# comment\n" * 1000
+        with open(test_file, "w") as f:
+            f.write(content)
+
+        with patch("license_header_hook.MAX_HEADER_BYTES", 2048):
+            assert self.manager.process_file(test_file) is False
+
+        assert "Header region exceeds 2048 bytes" in capsys.readouterr().out
+        with open(test_file) as f:
+            assert f.read() == content
+
+
+class TestAtomicRewrite:
+    """Test that rewrites go through a temporary file."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.template_file = os.path.join(self.temp_dir, "template.txt")
+        with open(self.template_file, "w") as f:
+            f.write("Copyright (c) {year} {copyright_holder}")
+        self.manager = LicenseHeaderManager(
+            self.template_file, "Test Corp", CommentRegistry()
+        )
+        self.header = f"# Copyright (c) {datetime.now().year} Test Corp\n"
+        self.body = "".join(f"value_{i} = {i}\n" for i in range(20_000))
+        self.test_file = os.path.join(self.temp_dir, "module.py")
+        with open(self.test_file, "w") as f:
+            f.write("# Old license header\n\n" + self.body)
+
+    def _read(self):
+        with open(self.test_file) as f:
+            return f.read()
+
+    def test_replaces_file_and_keeps_mode(self):
+        """Test that the file is replaced and keeps its permissions."""
+        os.chmod(self.test_file, 0o751)
+        inode = os.stat(self.test_file).st_ino
+
+        assert self.manager.process_file(self.test_file) is True
+
+        assert self._read() == self.header + self.body
+        st = os.stat(self.test_file)
+        assert st.st_mode & 0o777 == 0o751
+        assert st.st_ino != inode
+        assert sorted(os.listdir(self.temp_dir)) == ["module.py", "template.txt"]
+
+    def test_symlink_target_rewritten(self):
+        """Test that a symlink stays a symlink to the rewritten file."""
+        link = os.path.join(self.temp_dir, "link.py")
+        os.symlink(self.test_file, link)
+
+        assert self.manager.process_file(link) is True
+
+        assert os.path.islink(link)
+        assert self._read() == self.header + self.body
+
+    def test_failed_copy_leaves_original(self):
+        """Test that an error while copying keeps the original untouched."""
+        original = self._read()
+        with patch(
+            "license_header_hook._copy_tail", side_effect=OSError(errno.ENOSPC, "full")
+        ):
+            assert self.manager.process_file_status(self.test_file) == "error"
+
+        assert self._read() == original
+        assert sorted(os.listdir(self.temp_dir)) == ["module.py", "template.txt"]
+
+    @pytest.mark.parametrize("methods", [[], ["copy_file_range"], ["sendfile"]])
+    def test_copy_fallbacks(self, methods):
+        """Test each copy method, and falling back when one is unsupported."""
+        methods = [m for m in methods if hasattr(os, m)]
+        with patch("license_header_hook._KERNEL_COPY", list(methods)):
+            assert self.manager.process_file(self.test_file) is True
+        assert self._read() == self.header + self.body
+
+        if methods:
+            with open(self.test_file, "w") as f:
+                f.write("# Old license header\n\n" + self.body)
+            with (
+                patch("license_header_hook._KERNEL_COPY", list(methods)) as kernel,
+                patch(f"os.{methods[0]}", side_effect=OSError(errno.EXDEV, "xdev")),
+            ):
+                assert self.manager.process_file(self.test_file) is True
+                assert kernel == []
+            assert self._read() == self.header + self.body
+
+    def test_copy_fallback_from_writer_threads(self):
+        """Test that writer threads all fall back when kernel copy is unsupported."""
+        paths = []
+        for i in range(16):
+            paths.append(os.path.join(self.temp_dir, f"f{i}.py"))
+            with open(paths[-1], "w") as f:
+                f.write(self.body)
+
+        def unsupported(*args):
+            time.sleep(0.01)  # Let every writer see the method before it goes
+            raise OSError(errno.ENOSYS, "not supported")
+
+        with (
+            patch("license_header_hook._KERNEL_COPY", ["copy_file_range"]) as kernel,
+            patch("os.copy_file_range", unsupported, create=True),
+        ):
+            failed = process_files(self.manager, paths, io_threads=4)
+
+        assert failed == paths
+        assert kernel == []
+        for path in paths:
+            with open(path) as f:
+                assert f.read() == self.header + self.body
+
+
+class TestScanHeader:
+    """Test the single-pass header scanner."""
+
+    PYTHON = {"start": "#", "middle": "#", "end": "#"}
+    C = {"start": "/*", "middle": " *", "end": " */"}
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.manager = LicenseHeaderManager(
+            "unused.txt", "Test Corp", CommentRegistry()
+        )
+
+    def test_shebang_and_single_line_header(self):
+        """Test offsets of a shebang, a comment run and the body."""
+        data = b"#!/bin/sh\n\n# Copyright\n# License\n\n# note\necho hi\n"
+        shebang_end, start, end, body = self.manager.scan_header(data, self.PYTHON)
+
+        assert data[:shebang_end] == b"#!/bin/sh\n"
+        assert data[start:end] == b"# Copyright\n# License\n"
+        # Only the first run of comment lines is the header
+        assert data[body:] == b"# note\necho hi\n"
+
+    def test_multi_line_header(self):
+        """Test that a block comment ends at the line with the end marker."""
+        data = b"/*\n * Copyright\n */\n\nint x;\n"
+        shebang_end, start, end, body = self.manager.scan_header(data, self.C)
+
+        assert shebang_end == 0
+        assert data[start:end] == b"/*\n * Copyright\n */\n"
+        assert data[body:] == b"int x;\n"
+
+    def test_no_header(self):
+        """Test that only empty lines are skipped when there is no header."""
+        data = b"\r\n\n  \nint x;\n"
+        _, start, end, body = self.manager.scan_header(data, self.C, crlf=True)
+
+        assert start == end
+        assert data[body:] == b"  \nint x;\n"
+
+    def test_rewrite_keeps_body_bytes(self):
+        """Test that only the region in front of the body is replaced."""
+        temp_dir = tempfile.mkdtemp()
+        template_file = os.path.join(temp_dir, "template.txt")
+        with open(template_file, "w") as f:
+            f.write("Copyright (c) {year} {copyright_holder}")
+        manager = LicenseHeaderManager(template_file, "Test Corp", CommentRegistry())
+        test_file = os.path.join(temp_dir, "mixed.c")
+        with open(test_file, "wb") as f:
+            f.write(b"/* Old license */\r\n\r\nint x;\nint y;\r\n")
+
+        assert manager.process_file(test_file) is True
+
+        year = datetime.now().year
+        with open(test_file, "rb") as f:
+            assert f.read() == (
+                f"/*\r\n * Copyright (c) {year} Test Corp\r\n */\r\n".encode()
+                + b"int x;\nint y;\r\n"
+            )
+
+
+class TestSniff:
+    """Test skipping of binary, generated and minified files."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.template_file = os.path.join(self.temp_dir, "template.txt")
+        with open(self.template_file, "w") as f:
+            f.write("Copyright (c) {year} {copyright_holder}")
+        self.manager = LicenseHeaderManager(
+            self.template_file, "Test Corp", CommentRegistry()
+        )
+
+    def _write(self, name, content):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+
+    def test_binary_file_skipped(self, capsys):
+        """Test that files with NUL bytes are skipped untouched."""
+        content = b"\x7fELF\x02\x01\x00\x00garbage\xff\xfe\n"
+        path = self._write("blob.js", content)
+
+        assert self.manager.process_file_status(path) == "skipped"
+        assert "Looks like a binary file" in capsys.readouterr().out
+        with open(path, "rb") as f:
+            assert f.read() == content
+
+    def test_generated_file_skipped(self):
+        """Test @generated and DO NOT EDIT markers."""
+        generated = self._write("gen.go", b"// Code generated by x. DO NOT EDIT.\n")
+        tagged = self._write("tagged.js", b"/** @generated */\nvar x;\n")
+
+        assert self.manager.process_file_status(generated) == "skipped"
+        assert self.manager.process_file_status(tagged) == "skipped"
+
+        manager = LicenseHeaderManager(
+            self.template_file, "Test Corp", CommentRegistry(), skip_generated=False
+        )
+        assert manager.process_file_status(tagged) == "updated"
+        assert manager.fingerprint() != self.manager.fingerprint()
+
+    def test_generated_marker_in_leading_comments_only(self):
+        """Test that markers only count in the comments before the code."""
+        licensed = self._write(
+            "licensed.go",
+            b"/*\n * Old license\n */\n\n// Code generated by x. DO NOT EDIT.\n"
+            b"package x\n",
+        )
+        shebang = self._write("tool.py", b"#!/usr/bin/env python3\n\n# @generated\n")
+        in_code = self._write(
+            "gen.py", b'"""Code generator."""\n\nMARKERS = (b"@generated",)\n'
+        )
+        in_later_comment = self._write(
+            "lint.js", b"var x;\n/* DO NOT EDIT below this line */\n"
+        )
+
+        assert self.manager.process_file_status(licensed) == "skipped"
+        assert self.manager.process_file_status(shebang) == "skipped"
+        assert self.manager.process_file_status(in_code) == "updated"
+        assert self.manager.process_file_status(in_later_comment) == "updated"
+
+    def test_minified_file_skipped(self):
+        """Test that files without a line break in the sniffed bytes are skipped."""
+        minified = self._write("app.min.js", b"var a=1;" * 2048)
+        short = self._write("short.js", b"var a=1;")
+
+        assert self.manager.process_file_status(minified) == "skipped"
+        assert self.manager.process_file_status(short) == "updated"
+
+    def test_skipped_files_are_cached(self, capsys):
+        """Test that a cached run does not sniff unchanged skipped files again."""
+        path = self._write("blob.c", b"\x00\x01\x02\n")
+        os.utime(path, (1_000_000_000, 1_000_000_000))
+        test_args = [
+            "license_header_hook.py",
+            "--template",
+            self.template_file,
+            "--copyright-holder",
+            "Test Corp",
+            "--cache",
+            "--cache-dir",
+            os.path.join(self.temp_dir, "cache"),
+            path,
+        ]
+
+        with patch("sys.argv", test_args):
+            assert main() == 0
+        assert "binary file" in capsys.readouterr().out
+
+        with (
+            patch("sys.argv", test_args),
+            patch("builtins.open", wraps=open) as mock_open,
+        ):
+            assert main() == 0
+        assert "binary file" not in capsys.readouterr().out
+        opened = [call.args[0] for call in mock_open.call_args_list]
+        assert path not in opened
+
+
+class TestEncodings:
+    """Test that BOMs, line endings and encodings are kept."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.template_file = os.path.join(self.temp_dir, "template.txt")
+        with open(self.template_file, "w", encoding="utf-8") as f:
+            f.write("Copyright (c) {year} {copyright_holder}")
+        self.year = datetime.now().year
+
+    def _process(self, name, content, holder="Test Corp"):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, "wb") as f:
+            f.write(content)
+        manager = LicenseHeaderManager(self.template_file, holder, CommentRegistry())
+        status = manager.process_file_status(path)
+        with open(path, "rb") as f:
+            return status, f.read()
+
+    def test_utf8_bom_kept_first(self):
+        """Test that the header goes after a UTF-8 BOM and is then current."""
+        status, content = self._process("bom.py", b"\xef\xbb\xbfx = 1\n")
+
+        assert status == "updated"
+        header = f"# Copyright (c) {self.year} Test Corp\n".encode()
+        assert content == b"\xef\xbb\xbf" + header + b"x = 1\n"
+
+        path = os.path.join(self.temp_dir, "bom.py")
+        manager = LicenseHeaderManager(
+            self.template_file, "Test Corp", CommentRegistry()
+        )
+        with patch.object(manager, "scan_header") as scan:
+            assert manager.process_file_status(path) == "unchanged"
+        scan.assert_not_called()
+
+    def test_crlf_header_is_current(self):
+        """Test that a CRLF file with the header takes the fast path."""
+        header = f"# Copyright (c) {self.year} Test Corp\r\n".encode()
+        path = os.path.join(self.temp_dir, "crlf.py")
+        with open(path, "wb") as f:
+            f.write(header + b"x = 1\r\n")
+        manager = LicenseHeaderManager(
+            self.template_file, "Test Corp", CommentRegistry()
+        )
+
+        with patch.object(manager, "scan_header") as scan:
+            assert manager.process_file_status(path) == "unchanged"
+        scan.assert_not_called()
+
+    def test_legacy_encoding_body_untouched(self):
+        """Test that a non-UTF-8 body is kept byte for byte."""
+        body = "s = 'caf\xe9'\n".encode("latin-1")
+        status, content = self._process("legacy.py", b"# Old license header\n\n" + body)
+
+        assert status == "updated"
+        assert content == f"# Copyright (c) {self.year} Test Corp\n".encode() + body
+
+    def test_header_encoded_like_the_file(self):
+        """Test that a non-ASCII header follows the coding declaration."""
+        body = "s = 'caf\xe9'\n".encode("latin-1")
+        original = b"# -*- coding: latin-1 -*-\n" + body
+
+        status, content = self._process("decl.py", original, holder="M\xfcller")
+
+        assert status == "updated"
+        assert content == (
+            b"# -*- coding: latin-1 -*-\n"
+            + f"# Copyright (c) {self.year} M\xfcller\n".encode("latin-1")
+            + body
+        )
+
+        status, _ = self._process("plain.py", body, holder="M\xfcller")
+        assert status == "error"
+
+    def test_utf16_skipped(self):
+        """Test that UTF-16 files are skipped rather than treated as binary."""
+        content = "x = 1\n".encode("utf-16")
+
+        assert self._process("wide.py", content) == ("skipped", content)
+
+
+class TestResultCache:
+    """Test the persistent result cache."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.temp_dir, "cache")
+        self.template_file = os.path.join(self.temp_dir, "template.txt")
+        self.test_file = os.path.join(self.temp_dir, "test.py")
+
+        with open(self.template_file, "w") as f:
+            f.write("Copyright (c) {year} {copyright_holder}")
+        with open(self.test_file, "w") as f:
+            f.write("print('hello world')\n")
+        self._age(self.test_file)
+
+    @staticmethod
+    def _age(path):
+        """Move a file's mtime out of the racy window."""
+        os.utime(path, (1_000_000_000, 1_000_000_000))
+
+    def test_record_and_reload(self):
+        """Test that recorded files are fresh in a new cache instance."""
+        cache = ResultCache(self.cache_dir, "abc")
+        assert not cache.is_fresh(self.test_file)
+
+        cache.record(self.test_file)
+        cache.save()
+
+        reloaded = ResultCache(self.cache_dir, "abc")
+        assert reloaded.is_fresh(self.test_file)
+        assert not ResultCache(self.cache_dir, "other").is_fresh(self.test_file)
+
+        # Any change to the file invalidates its entry
+        with open(self.test_file, "a") as f:
+            f.write("print('more')\n")
+        self._age(self.test_file)
+        assert not reloaded.is_fresh(self.test_file)
+
+    def test_recently_modified_files_not_cached(self):
+        """Test that files inside the racy window are not recorded."""
+        os.utime(self.test_file)
+        cache = ResultCache(self.cache_dir, "abc")
+        cache.record(self.test_file)
+        assert not cache.is_fresh(self.test_file)
+
+    def test_save_merges_and_evicts(self):
+        """Test that concurrent writers merge and the size bound holds."""
+        paths = []
+        for i in range(4):
+            path = os.path.join(self.temp_dir, f"file{i}.py")
+            with open(path, "w") as f:
+                f.write("x = 1\n")
+            self._age(path)
+            paths.append(path)
+
+        first = ResultCache(self.cache_dir, "abc", max_entries=3)
+        second = ResultCache(self.cache_dir, "abc", max_entries=3)
+        first.record(paths[0])
+        first.record(paths[1])
+        second.record(paths[2])
+        first.save()
+        second.save()
+
+        merged = ResultCache(self.cache_dir, "abc")
+        assert all(merged.is_fresh(p) for p in paths[:3])
+
+        merged.max_entries = 3
+        merged.record(paths[3])
+        merged.save()
+
+        evicted = ResultCache(self.cache_dir, "abc")
+        assert len(evicted.entries) == 3
+        assert evicted.is_fresh(paths[3])
+        assert not evicted.is_fresh(paths[0])
+
+    def test_record_reuses_stale_state(self):
+        """Test that recording an unmodified stale file does not stat it again."""
+        self._age(self.test_file)
+        cache = ResultCache(self.cache_dir, "abc")
+        assert not cache.is_fresh(self.test_file)
+
+        with patch("os.stat", side_effect=AssertionError("stat again")):
+            cache.record(self.test_file, modified=False)
+        assert cache.is_fresh(self.test_file)
+
+    def test_caches_in_use_are_not_evicted(self):
+        """Test that a run with many policies keeps every policy's cache."""
+        self._age(self.test_file)
+        stale = ResultCache(self.cache_dir, "stale")
+        stale.record(self.test_file)
+        stale.save()
+        os.utime(stale.path, (1_000_000_000, 1_000_000_000))
+
+        caches = [
+            ResultCache(self.cache_dir, f"p{i}") for i in range(CACHE_MAX_FILES + 2)
+        ]
+        for cache in caches:
+            cache.record(self.test_file)
+        for cache in caches:
+            cache.save(keep=[c.path for c in caches])
+
+        assert all(os.path.exists(cache.path) for cache in caches)
+        assert not os.path.exists(stale.path)
+
+    def test_fingerprint_tracks_configuration(self):
+        """Test that the fingerprint changes with the header configuration."""
+        base = LicenseHeaderManager(self.template_file, "Test Corp", CommentRegistry())
+        holder = LicenseHeaderManager(self.template_file, "Other", CommentRegistry())
+        registry = LicenseHeaderManager(
+            self.template_file,
+            "Test Corp",
+            CommentRegistry({".x": {"start": "#", "middle": "#", "end": "#"}}),
+        )
+
+        assert base.fingerprint() == base.fingerprint()
+        assert base.fingerprint() != holder.fingerprint()
+        assert base.fingerprint() != registry.fingerprint()
+
+    def test_main_skips_cached_files(self):
+        """Test that a second run does not open unchanged files."""
+        test_args = [
+            "license_header_hook.py",
+            "--template",
+            self.template_file,
+            "--copyright-holder",
+            "Test Corp",
+            "--cache",
+            "--cache-dir",
+            self.cache_dir,
+            self.test_file,
+        ]
+
+        with patch("sys.argv", test_args):
+            assert main() == 1
+        self._age(self.test_file)
+        with patch("sys.argv", test_args):
+            assert main() == 0
+        with (
+            patch("sys.argv", test_args),
+            patch.object(LicenseHeaderManager, "process_file_status") as process,
+        ):
+            assert main() == 0
+        process.assert_not_called()
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+class TestGitIndex:
+    """Test the git-index-aware incremental mode."""
+
+    def setup_method(self):
+        """Set up a repository whose index is not racily clean."""
+        self.repo = tempfile.mkdtemp()
+        self.template_file = os.path.join(self.repo, "template.txt")
+        with open(self.template_file, "w") as f:
+            f.write("Copyright (c) {year} {copyright_holder}")
+
+        os.makedirs(os.path.join(self.repo, "src"))
+        self.files = []
+        for i in range(3):
+            path = os.path.join(self.repo, "src", f"mod{i}.py")
+            with open(path, "w") as f:
+                f.write(f"x = {i}\n")
+            os.utime(path, (1_000_000_000, 1_000_000_000))
+            self.files.append(path)
+
+        self._git("init", "-q")
+        self._git("add", ".")
+
+    def _git(self, *args):
+        return subprocess.run(
+            ["git", *args], cwd=self.repo, check=True, capture_output=True, text=True
+        ).stdout.strip()
+
+    def test_blob_ids_match_git(self):
+        """Test that index entries resolve to the blob ids git reports."""
+        for version in ("2", "4"):
+            self._git("update-index", "--index-version", version)
+            index = GitIndex.find(os.path.join(self.repo, "src"))
+
+            assert index is not None
+            assert index.relpath(self.files[1]) == "src/mod1.py"
+            assert index.blob_id(self.files[1]) == self._git(
+                "rev-parse", ":src/mod1.py"
+            )
+
+    def test_relpath_forms(self, monkeypatch):
+        """Test paths relative to a subdirectory, absolute and unnormalized."""
+        monkeypatch.chdir(os.path.join(self.repo, "src"))
+        index = GitIndex.find()
+
+        for path in (
+            "mod1.py",
+            "./mod1.py",
+            "../src//mod1.py",
+            self.files[1],
+            os.path.join(self.repo, ".", "src", "x", "..", "mod1.py"),
+        ):
+            assert index.relpath(path) == "src/mod1.py"
+        assert index.relpath("..") is None
+        assert index.relpath(self.repo) is None
+        assert index.relpath(os.path.dirname(self.repo)) is None
+
+    def test_modified_file_has_no_blob_id(self):
+        """Test that a worktree change makes the index entry untrusted."""
+        index = GitIndex.find(self.repo)
+        with open(self.files[0], "a") as f:
+            f.write("y = 1\n")
+
+        assert index.blob_id(self.files[0]) is None
+        assert index.blob_id(os.path.join(self.repo, "untracked.py")) is None
+
+    def test_main_skips_verified_blobs(self, monkeypatch):
+        """Test that only files whose blob changed are opened again."""
+        monkeypatch.chdir(self.repo)
+        test_args = [
+            "license_header_hook.py",
+            "--template",
+            self.template_file,
+            "--copyright-holder",
+            "Test Corp",
+            "--git-index",
+            *[os.path.relpath(f, self.repo) for f in self.files],
+        ]
+
+        with patch("sys.argv", test_args):
+            assert main() == 1
+        for path in self.files:
+            os.utime(path, (1_000_000_000, 1_000_000_000))
+        self._git("add", ".")
+        with patch("sys.argv", test_args):
+            assert main() == 0
+
+        with open(self.files[2], "w") as f:
+            f.write("z = 2\n")
+        with (
+            patch("sys.argv", test_args),
+            patch.object(
+                LicenseHeaderManager,
+                "process_file_status",
+                autospec=True,
+                return_value="updated",
+            ) as process,
+        ):
+            assert main() == 1
+        assert [call.args[1] for call in process.call_args_list] == [
+            os.path.join("src", "mod2.py")
+        ]
+
+
+class TestWalkFiles:
+    """Test the recursive repository walker."""
+
+    def setup_method(self):
+        """Set up a small source tree."""
+        self.root = tempfile.mkdtemp()
+        tree = {
+            ".gitignore": "*.log\n/dist/\ngenerated/\n!keep.log\n",
+            "main.py": "",
+            "debug.log": "",
+            "keep.log": "",
+            "dist/out.py": "",
+            "src/app.py": "",
+            "src/dist/inner.py": "",
+            "src/generated/gen.py": "",
+            "src/.gitignore": "*.tmp.py\n",
+            "src/scratch.tmp.py": "",
+            "src/lib/util.py": "",
+            "node_modules/pkg/index.js": "",
+            "docs/build/page.html": "",
+        }
+        for rel, content in tree.items():
+            path = os.path.join(self.root, rel)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write(content)
+
+    def _walk(self, **kwargs):
+        return [
+            os.path.relpath(p, self.root).replace(os.sep, "/")
+            for p in walk_files(self.root, **kwargs)
+        ]
+
+    def test_walk_honours_gitignore_and_prunes(self):
+        """Test ignore rules, pruning and per-directory ordering."""
+        assert self._walk() == [
+            ".gitignore",
+            "keep.log",
+            "main.py",
+            "src/.gitignore",
+            "src/app.py",
+            "src/dist/inner.py",
+            "src/lib/util.py",
+        ]
+
+    def test_pruned_directories_are_not_scanned(self):
+        """Test that pruned directories are never listed."""
+        scanned = []
+        real_scandir = os.scandir
+
+        def tracking_scandir(path):
+            scanned.append(os.path.relpath(path, self.root))
+            return real_scandir(path)
+
+        with patch("os.scandir", tracking_scandir):
+            files = self._walk(prune_dirs=DEFAULT_PRUNE_DIRS | {"lib"})
+
+        assert "src/lib/util.py" not in files
+        assert sorted(scanned) == [".", "docs", "src", "src/dist"]
+
+    def test_gitignore_patterns(self):
+        """Test translation of gitignore pattern syntax."""
+        ignore = GitIgnore(
+            "sub",
+            [
+                "# comment",
+                "",
+                "**/cache",
+                "docs/**/*.md",
+                "a?c",
+                "[!x]y.py",
+                "out/**",
+                "\\#hash",
+            ],
+        )
+
+        assert ignore.match("sub/deep/cache", True)
+        assert ignore.match("sub/docs/a/b/readme.md", False)
+        assert ignore.match("sub/docs/readme.md", False)
+        assert ignore.match("sub/x/abc", False)
+        assert ignore.match("sub/ay.py", False)
+        assert ignore.match("sub/xy.py", False) is None
+        assert ignore.match("sub/out/file", False)
+        assert ignore.match("sub/#hash", False)
+        assert ignore.match("sub/other/docs/readme.md", False) is None
+
+    def test_main_recursive(self):
+        """Test main function with --recursive."""
+        template_file = os.path.join(self.root, "template.txt")
+        with open(template_file, "w") as f:
+            f.write("Copyright (c) {year} {copyright_holder}")
+        test_args = [
+            "license_header_hook.py",
+            "--template",
+            template_file,
+            "--copyright-holder",
+            "Test Corp",
+            "--recursive",
+            self.root,
+        ]
+
+        with patch("sys.argv", test_args):
+            assert main() == 1
+
+        with open(os.path.join(self.root, "src", "lib", "util.py")) as f:
+            assert "Test Corp" in f.read()
+        with open(os.path.join(self.root, "src", "generated", "gen.py")) as f:
+            assert f.read() == ""
+        with open(os.path.join(self.root, "node_modules", "pkg", "index.js")) as f:
+            assert f.read() == ""
+
+    def test_main_recursive_overlapping_files(self, capsys):
+        """Test that a file named and also walked is processed once."""
+        template_file = os.path.join(self.root, "template.txt")
+        with open(template_file, "w") as f:
+            f.write("Copyright (c) {year} {copyright_holder}")
+        named = os.path.join(self.root, "src", ".", "lib", "util.py")
+        test_args = [
+            "license_header_hook.py",
+            "--template",
+            template_file,
+            "--copyright-holder",
+            "Test Corp",
+            "--check",
+            named,
+            "--recursive",
+            self.root,
+        ]
+
+        with patch("sys.argv", test_args):
+            assert main() == 1
+
+        out = capsys.readouterr().out
+        assert out.count("util.py") == 1
+        assert named in out
+
+
+class TestCheckMode:
+    """Test read-only check mode, fail-fast and reports."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.template_file = os.path.join(self.temp_dir, "template.txt")
+        with open(self.template_file, "w") as f:
+            f.write("Copyright (c) {year} {copyright_holder}")
+
+        year = datetime.now().year
+        self.files = []
+        for i in range(6):
+            path = os.path.join(self.temp_dir, f"mod{i}.py")
+            with open(path, "w") as f:
+                if i % 2:
+                    f.write(f"# Copyright (c) {year} Test Corp\n")
+                f.write(f"x = {i}\n")
+            self.files.append(path)
+        self.contents = {}
+        for path in self.files:
+            with open(path) as f:
+                self.contents[path] = f.read()
+
+    def _main(self, *extra):
+        test_args = [
+            "license_header_hook.py",
+            "--template",
+            self.template_file,
+            "--copyright-holder",
+            "Test Corp",
+            *extra,
+        ]
+        with patch("sys.argv", test_args):
+            return main()
+
+    def _assert_untouched(self):
+        for path, content in self.contents.items():
+            with open(path) as f:
+                assert f.read() == content
+
+    def test_check_never_writes(self, capsys):
+        """Test that check mode reports files without opening them for writing."""
+        with patch("builtins.open", wraps=open) as mock_open:
+            assert self._main("--check", *self.files) == 1
+
+        modes = [
+            call.args[1] for call in mock_open.call_args_list if len(call.args) > 1
+        ]
+        assert modes and not any("w" in mode or "+" in mode for mode in modes)
+        self._assert_untouched()
+        out = capsys.readouterr().out
+        assert out.count("Missing or outdated license header") == 3
+        assert "Found 3 files with missing or outdated license headers" in out
+
+        compliant = self.files[1::2]
+        assert self._main("--check", *compliant) == 0
+
+    def test_fail_fast_serial(self, capsys):
+        """Test that --fail-fast stops at the first non-compliant file."""
+        with patch.object(
+            LicenseHeaderManager,
+            "process_file_status",
+            autospec=True,
+            side_effect=LicenseHeaderManager.process_file_status,
+        ) as process:
+            assert self._main("--check", "--fail-fast", "--jobs", "1", *self.files) == 1
+
+        assert process.call_count == 1
+        assert "Found 1 files" in capsys.readouterr().out
+
+    def test_fail_fast_parallel(self):
+        """Test that --fail-fast stops parallel workers."""
+        manager = LicenseHeaderManager(
+            self.template_file, "Test Corp", CommentRegistry(), check=True
+        )
+        failed = process_files(
+            manager, self.files, jobs=2, chunk_files=1, fail_fast=True
+        )
+
+        assert 1 <= len(failed) < 3
+        self._assert_untouched()
+
+    def test_fail_fast_requires_check(self):
+        """Test that --fail-fast is rejected without --check."""
+        with pytest.raises(SystemExit):
+            self._main("--fail-fast", *self.files)
+
+    def test_jsonl_report(self, capsys):
+        """Test JSON Lines findings on stdout with messages on stderr."""
+        assert self._main("--check", "--report-format", "jsonl", *self.files) == 1
+
+        captured = capsys.readouterr()
+        findings = [json.loads(line) for line in captured.out.splitlines()]
+        assert [f["path"] for f in findings] == self.files[0::2]
+        assert {f["status"] for f in findings} == {"noncompliant"}
+        assert findings[0]["message"].startswith("Missing or outdated license header")
+        assert "Found 3 files" in captured.err
+
+    def test_sarif_report(self):
+        """Test SARIF output written to a file."""
+        report = os.path.join(self.temp_dir, "report.sarif")
+        assert (
+            self._main(
+                "--check", "--report-format", "sarif", "--report", report, *self.files
+            )
+            == 1
+        )
+
+        with open(report) as f:
+            log = json.load(f)
+        assert log["version"] == "2.1.0"
+        results = log["runs"][0]["results"]
+        assert len(results) == 3
+        assert results[0]["ruleId"] == "license-header"
+        assert results[0]["level"] == "error"
+        location = results[0]["locations"][0]["physicalLocation"]
+        assert location["artifactLocation"]["uri"] == self.files[0]
+
+
+class TestStats:
+    """Test --stats instrumentation."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.template_file = os.path.join(self.temp_dir, "template.txt")
+        with open(self.template_file, "w") as f:
+            f.write("Copyright (c) {year} {copyright_holder}")
+        self.files = []
+        for i in range(8):
+            path = os.path.join(self.temp_dir, f"mod{i}.py")
+            with open(path, "w") as f:
+                f.write("# Copyright (c) 2019 Old Corp\n\n" if i % 2 else "")
+                f.write(f"x = {i}\n")
+            self.files.append(path)
+
+    def _main(self, *extra):
+        test_args = [
+            "license_header_hook.py",
+            "--template",
+            self.template_file,
+            "--copyright-holder",
+            "Test Corp",
+            *extra,
+        ]
+        with patch("sys.argv", test_args):
+            return main()
+
+    def test_disabled_stats_collect_no_timings(self):
+        """Test that disabled statistics share a no-op timer."""
+        stats = Stats()
+        assert stats.phase("read") is stats.phase("write")
+        with stats.phase("read"), stats.step("select"):
+            pass
+        assert stats.phases == {}
+        assert stats.steps == {}
+
+        manager = LicenseHeaderManager(
+            self.template_file, "Test Corp", CommentRegistry()
+        )
+        assert manager.process_file(self.files[0])
+        assert manager.stats.statuses == {}
+        assert manager.stats.slowest == []
+
+    def test_phases_and_counters(self):
+        """Test per-phase timings, byte counts and skip reasons."""
+        stats = Stats(enabled=True, top=3)
+        manager = LicenseHeaderManager(
+            self.template_file, "Test Corp", CommentRegistry(), stats=stats
+        )
+        other = os.path.join(self.temp_dir, "notes.txt")
+        with open(other, "w") as f:
+            f.write("notes\n")
+        for path in [*self.files, other]:
+            manager.process_file_status(path)
+
+        assert stats.statuses == {"updated": 8, "skipped": 1}
+        assert stats.skipped == {"no comment style": 1}
+        assert 0 < stats.bytes_written <= sum(os.path.getsize(p) for p in self.files)
+        assert stats.bytes_read > 0
+        data = stats.to_dict()
+        assert list(data["phases"]) == ["read", "scan", "render", "write"]
+        assert data["phases"]["read"]["files"] == 8
+        assert data["phases"]["write"]["files"] == 8
+        assert len(data["slowest"]) == 3
+        seconds = [entry["seconds"] for entry in data["slowest"]]
+        assert seconds == sorted(seconds, reverse=True)
+
+    def test_merge(self):
+        """Test combining statistics collected by workers."""
+        first = Stats(enabled=True, top=2)
+        second = Stats(enabled=True, top=2)
+        first.file_done("a.py", "updated", 0.3)
+        second.file_done("b.py", "updated", 0.1)
+        second.file_done("c.py", "unchanged", 0.5)
+        second.skip("cached", 4)
+        second.bytes_read = 10
+
+        first.merge(second)
+
+        assert first.statuses == {"updated": 2, "unchanged": 1}
+        assert first.skipped == {"cached": 4}
+        assert first.bytes_read == 10
+        assert [e["path"] for e in first.to_dict()["slowest"]] == ["c.py", "a.py"]
+
+    def test_worker_stats_are_merged(self):
+        """Test that statistics from worker processes reach the parent."""
+        manager = LicenseHeaderManager(
+            self.template_file,
+            "Test Corp",
+            CommentRegistry(),
+            stats=Stats(enabled=True),
+        )
+        manager.stats.skip("excluded")
+
+        failed = process_files(manager, self.files, jobs=2, chunk_files=2)
+
+        assert len(failed) == 8
+        assert manager.stats.statuses == {"updated": 8}
+        assert manager.stats.skipped == {"excluded": 1}
+        assert len(manager.stats.phases["write"]) == 8
+
+    def test_stats_output(self, capsys):
+        """Test the --stats summary and --stats-json dump."""
+        stats_file = os.path.join(self.temp_dir, "stats.json")
+        result = self._main(
+            "--stats",
+            "--stats-json",
+            stats_file,
+            *self.files,
+            os.path.join(self.temp_dir, "missing.py"),
+        )
+
+        assert result == 1
+        captured = capsys.readouterr()
+        assert "License header statistics" in captured.err
+        assert "slowest files:" in captured.err
+        assert "License header statistics" not in captured.out
+        with open(stats_file) as f:
+            data = json.load(f)
+        assert data["files"] == 8
+        assert data["statuses"] == {"updated": 8}
+        assert data["skipped"] == {"excluded": 1}
+        assert data["phases"]["write"]["files"] == 8
+        assert set(data["steps"]) >= {"select", "process"}
+
+
+class TestDaemon:
+    """Test the warm daemon and its client."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.template_file = os.path.join(self.temp_dir, "template.txt")
+        with open(self.template_file, "w") as f:
+            f.write("Copyright (c) {year} {copyright_holder}")
+        self.test_file = os.path.join(self.temp_dir, "test.py")
+        with open(self.test_file, "w") as f:
+            f.write("print('hello')\n")
+        self.argv = [
+            "--template",
+            "template.txt",
+            "--copyright-holder",
+            "Test Corp",
+            "test.py",
+        ]
+        self.daemon = Daemon(os.path.join(self.temp_dir, "daemon.sock"))
+
+    def teardown_method(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _request(self, *argv):
+        return self.daemon.handle({"argv": list(argv), "cwd": self.temp_dir})
+
+    def test_handle_matches_main(self, capsys, monkeypatch):
+        """Test that the daemon gives the same exit code and output as main()."""
+        response = self._request("--check", *self.argv)
+        monkeypatch.chdir(self.temp_dir)
+        code = main(["--check", *self.argv])
+        captured = capsys.readouterr()
+
+        assert response == {
+            "exit": code,
+            "stdout": captured.out,
+            "stderr": captured.err,
+        }
+        assert response["exit"] == 1
+        assert "Missing or outdated license header in test.py" in response["stdout"]
+        assert os.getcwd() == self.temp_dir
+
+    def test_handle_usage_error(self):
+        """Test that argument errors are reported instead of stopping the daemon."""
+        response = self._request("--fail-fast", *self.argv)
+
+        assert response["exit"] == 2
+        assert "--fail-fast requires --check" in response["stderr"]
+
+    def test_usage_errors_match_main(self, capsys, monkeypatch):
+        """Test that the daemon rejects the same option combinations as main()."""
+        monkeypatch.chdir(self.temp_dir)
+        for extra in (
+            ["--filename-hint", "x.py"],
+            ["--fail-fast"],
+            ["--stdin", "--filename-hint", "x.py", "--files-from", "list"],
+        ):
+            response = self._request(*extra, *self.argv)
+            with pytest.raises(SystemExit) as exit_info:
+                main([*extra, *self.argv])
+            captured = capsys.readouterr()
+
+            assert response == {
+                "exit": exit_info.value.code,
+                "stdout": captured.out,
+                "stderr": captured.err,
+            }
+            assert response["exit"] == 2
+
+    def test_manager_reused_and_reloaded(self):
+        """Test that the template is kept between runs and reloaded on change."""
+        manager = self.daemon.manager(self.template_file, "Test Corp", True)
+        assert self.daemon.manager(self.template_file, "Test Corp", True) is manager
+        assert self.daemon.manager(self.template_file, "Other", True) is not manager
+
+        with open(self.template_file, "w") as f:
+            f.write("SPDX-FileCopyrightText: {year} {copyright_holder}")
+        reloaded = self.daemon.manager(self.template_file, "Test Corp", True)
+
+        assert reloaded is not manager
+        assert reloaded.get_formatted_template().startswith("SPDX")
+        assert len(self.daemon._managers) == 1
+
+        assert self._request(*self.argv)["exit"] == 1
+        with open(self.test_file) as f:
+            assert f.readline().startswith("# SPDX-FileCopyrightText:")
+
+    def test_result_cache_kept(self):
+        """Test that the result cache stays in memory between runs."""
+        assert self._request("--cache", *self.argv)["exit"] == 1
+        assert self._request("--cache", *self.argv)["exit"] == 0
+        assert len(self.daemon._caches) == 1
+        cache = next(iter(self.daemon._caches.values()))
+
+        assert self._request("--cache", *self.argv)["exit"] == 0
+        assert next(iter(self.daemon._caches.values())) is cache
+
+    def test_client_without_daemon_runs_locally(self, capsys, monkeypatch):
+        """Test that the client falls back to main() when no daemon listens."""
+        monkeypatch.chdir(self.temp_dir)
+        monkeypatch.setenv("LICENSE_HEADER_SOCKET", self.daemon.socket_path)
+
+        assert client_main(["--check", *self.argv]) == 1
+        assert "Missing or outdated" in capsys.readouterr().out
+
+    def test_client_over_socket(self, capsys, monkeypatch):
+        """Test a client run against a daemon serving on a socket."""
+        monkeypatch.chdir(self.temp_dir)
+        monkeypatch.setenv("LICENSE_HEADER_SOCKET", self.daemon.socket_path)
+        server = threading.Thread(target=self.daemon.serve, args=(0.5,))
+        server.start()
+        try:
+            deadline = time.monotonic() + 5
+            while not os.path.exists(self.daemon.socket_path):
+                assert time.monotonic() < deadline
+                time.sleep(0.01)
+
+            with patch("license_header_hook.main") as local_main:
+                assert client_main(self.argv) == 1
+                assert client_main(self.argv) == 0
+            local_main.assert_not_called()
+            assert "Updated license header in test.py" in capsys.readouterr().out
+            assert len(self.daemon._managers) == 1
+            assert os.stat(self.daemon.socket_path).st_mode & 0o077 == 0
+        finally:
+            server.join(10)
+        assert not server.is_alive()
+        assert not os.path.exists(self.daemon.socket_path)
+
+
+class TestStartup:
+    """Test the early exit and lazily imported modules."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.required = ["--template", "t.txt", "--copyright-holder", "Test Corp"]
+
+    def teardown_method(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _python(self, code):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=self.temp_dir,
+            env=dict(os.environ, PYTHONPATH=root),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return result.stdout.split()
+
+    def test_nothing_to_do(self):
+        """Test which command lines can skip argument parsing."""
+        assert _nothing_to_do([*self.required, "README.md", "Makefile"])
+        assert _nothing_to_do(["-t", "t.txt", "-c=Corp", "--check", "-j", "4"])
+        assert _nothing_to_do([*self.required, "--cache", "--exclude", "docs/**"])
+
+        assert not _nothing_to_do([*self.required, "README.md", "src/main.PY"])
+        assert not _nothing_to_do([*self.required, "--include", "*.py"])
+        assert not _nothing_to_do([*self.required, "--recursive", "src"])
+        assert not _nothing_to_do([*self.required, "--stats"])
+        assert not _nothing_to_do([*self.required, "--help"])
+        assert not _nothing_to_do([*self.required, "--jobs", "many"])
+        assert not _nothing_to_do([*self.required, "--check=yes"])
+        assert not _nothing_to_do(["--template", "t.txt", "README.md"])
+        assert not _nothing_to_do([*self.required, "--exclude"])
+
+    def test_early_exit_matches_full_run(self, capsys):
+        """Test that the early exit returns what a full run returns."""
+        argv = [*self.required, os.path.join(self.temp_dir, "notes.txt")]
+        assert main(argv) == 0
+        with patch("license_header_hook._nothing_to_do", return_value=False):
+            assert main(argv) == 0
+        assert capsys.readouterr().out == ""
+
+    def test_import_is_lazy(self):
+        """Test that importing the hook does not import argparse."""
+        modules = self._python(
+            "import sys, license_header_hook\n"
+            "print(*[m for m in ('argparse', 'multiprocessing', 'pathlib')"
+            " if m in sys.modules])"
+        )
+        assert modules == []
+
+    def test_early_exit_is_lazy(self):
+        """Test that a run with nothing to do imports no heavy modules."""
+        modules = self._python(
+            "import sys, license_header_hook\n"
+            "code = license_header_hook.main("
+            "['-t', 't.txt', '-c', 'Corp', 'README.md'])\n"
+            "print(code, *[m for m in ('argparse', 'concurrent.futures', 'socket')"
+            " if m in sys.modules])"
+        )
+        assert modules == ["0"]
+
+
+class TestWatch:
+    """Test --watch and the file watchers."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.template_file = os.path.join(self.temp_dir, "template.txt")
+        with open(self.template_file, "w") as f:
+            f.write("Copyright (c) {year} {copyright_holder}")
+        self.root = os.path.join(self.temp_dir, "src")
+        os.makedirs(os.path.join(self.root, "node_modules"))
+        with open(os.path.join(self.root, ".gitignore"), "w") as f:
+            f.write("gen_*.py\n")
+        self.header = f"# Copyright (c) {datetime.now().year} Test Corp"
+
+    def teardown_method(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _write(self, rel, content="x = 1\n"):
+        path = os.path.join(self.root, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+    def _changes(self, watcher, expected):
+        changed = set()
+        deadline = time.monotonic() + 5
+        while not expected <= changed and time.monotonic() < deadline:
+            changed |= watcher.wait(0.1)
+        return changed
+
+    def _check_watcher(self, watcher):
+        try:
+            assert watcher.wait(0) == set()
+            main_py = self._write("main.py")
+            new_dir = self._write("pkg/mod.py")
+            # Saved atomically, the way editors do
+            self._write("tmp.py")
+            renamed = os.path.join(self.root, "renamed.py")
+            os.replace(os.path.join(self.root, "tmp.py"), renamed)
+            self._write("gen_api.py")
+            self._write("node_modules/lib.js")
+
+            changed = self._changes(watcher, {main_py, new_dir, renamed})
+
+            assert {main_py, new_dir, renamed} <= changed
+            assert not any("gen_api" in p or "node_modules" in p for p in changed)
+        finally:
+            watcher.close()
+
+    def test_polling_watcher(self):
+        """Test that rescanning reports new and modified files."""
+        self._check_watcher(PollingWatcher([self.root], {"node_modules"}, 0.01))
+
+    @pytest.mark.skipif(
+        not sys.platform.startswith("linux"), reason="inotify is Linux only"
+    )
+    def test_inotify_watcher(self):
+        """Test that inotify reports written, moved and new files."""
+        self._check_watcher(InotifyWatcher([self.root], {"node_modules"}))
+
+    def test_watch_processes_changed_files(self, capsys):
+        """Test that only changed, selected and supported files are processed."""
+        untouched = self._write("untouched.py")
+        manager = LicenseHeaderManager(
+            self.template_file, "Test Corp", CommentRegistry()
+        )
+        stop = threading.Event()
+        result = []
+        thread = threading.Thread(
+            target=lambda: result.append(
+                watch(
+                    manager,
+                    [self.root],
+                    PathMatcher([], ["**/skip_*.py"]),
+                    stop=stop,
+                    debounce=0.01,
+                )
+            )
+        )
+        thread.start()
+        try:
+            time.sleep(0.2)
+            changed = self._write("main.py")
+            skipped = self._write("skip_me.py")
+            notes = self._write("notes.txt", "notes\n")
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline:
+                with open(changed) as f:
+                    if f.readline().startswith("#"):
+                        break
+                time.sleep(0.02)
+        finally:
+            stop.set()
+            thread.join(10)
+
+        assert result == [[changed]]
+        with open(changed) as f:
+            assert f.read().startswith(self.header)
+        for path in (untouched, skipped, notes):
+            with open(path) as f:
+                assert not f.read().startswith("#")
+        assert f"Updated license header in {changed}" in capsys.readouterr().out
+
+    def test_main_with_watch(self, capsys):
+        """Test that --watch reports files from both passes once."""
+        path = self._write("main.py")
+        with (
+            patch("license_header_hook.watch", return_value=[path, path]) as mock,
+            patch(
+                "sys.argv",
+                [
+                    "license_header_hook.py",
+                    "--template",
+                    self.template_file,
+                    "--copyright-holder",
+                    "Test Corp",
+                    "--watch",
+                    self.root,
+                    path,
+                ],
+            ),
+        ):
+            assert main() == 1
+
+        assert mock.call_args.args[1] == [self.root]
+        captured = capsys.readouterr()
+        assert "Watching" in captured.err
+        assert "Modified 1 files" in captured.out
+
+
+class TestHeaderRegex:
+    """Test matching earlier versions of the header and updating them in place."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.template_file = os.path.join(self.temp_dir, "template.txt")
+        with open(self.template_file, "w") as f:
+            f.write("Copyright (c) {year} {copyright_holder}\nAll rights reserved.")
+        self.manager = LicenseHeaderManager(
+            self.template_file, "Test Corp", CommentRegistry()
+        )
+        self.year = datetime.now().year
+        self.style = {"start": "#", "middle": "#", "end": "#"}
+
+    def teardown_method(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _process(self, content, name="test.py"):
+        test_file = os.path.join(self.temp_dir, name)
+        with open(test_file, "wb") as f:
+            f.write(content)
+        status = self.manager.process_file_status(test_file)
+        with open(test_file, "rb") as f:
+            return status, f.read()
+
+    def test_regex_tolerates_years_holders_and_whitespace(self):
+        """Test which headers the compiled template recognises."""
+        regex = self.manager.get_header_regex(self.style)
+        assert regex is self.manager.get_header_regex(dict(self.style))
+
+        for header in (
+            b"# Copyright (c) 2019 Old Corp\n# All rights reserved.",
+            b"# Copyright (c) 2019-2024 Old Corp\n# All rights reserved.",
+            b"#  Copyright (c)  2019 - 2024  Old Corp\t\r\n#   All rights reserved.",
+        ):
+            match = regex.match(header)
+            assert match is not None
+            assert match.group("first1") == b"2019"
+            assert match.group("holder3").strip() == b"Old Corp"
+
+        assert not regex.match(b"# Copyright (c) 2019 Old Corp\n# Licensed under MIT")
+        assert not regex.match(b"# Copyright (c) last year Old Corp")
+        assert not regex.match(
+            b"// Copyright (c) 2019 Old Corp\n// All rights reserved."
+        )
+
+    def test_year_range_extended_in_place(self):
+        """Test that an outdated header keeps its layout and year range."""
+        status, content = self._process(
+            b"#  Copyright (c)  2019-2024  Old Corp\r\n#  All rights reserved.\r\n"
+            b"\r\nx = 1\r\n"
+        )
+
+        assert status == "updated"
+        assert (
+            content
+            == (
+                f"#  Copyright (c)  2019-{self.year}  Test Corp\r\n"
+                "#  All rights reserved.\r\nx = 1\r\n"
+            ).encode()
+        )
+
+        assert self._process(content) == ("unchanged", content)
+
+    def test_single_year_becomes_current(self):
+        """Test that a single year is replaced by the current year."""
+        status, content = self._process(
+            b"/*\n * Copyright (c) 2019 Old Corp\n * All rights reserved.\n */\nint x;\n",
+            "test.c",
+        )
+
+        assert status == "updated"
+        assert content.startswith(
+            f"/*\n * Copyright (c) {self.year} Test Corp\n".encode()
+        )
+        assert content.endswith(b" */\nint x;\n")
+
+    def test_unrelated_leading_comment_kept(self):
+        """Test that a leading comment that is not a license stays."""
+        header = self.manager.get_header(self.style)[1]
+        status, content = self._process(b"# Helper functions\n\nimport os\n")
+
+        assert status == "updated"
+        assert content == header + b"\n\n# Helper functions\n\nimport os\n"
+        assert self._process(content) == ("unchanged", content)
+
+        text = "# Helper functions\nimport os\n"
+        assert self.manager.extract_existing_header(text, self.style) is None
+        assert self.manager.remove_existing_header(text, self.style) == text
+
+    def test_comments_after_header_kept(self):
+        """Test that comment lines following a known header are kept."""
+        status, content = self._process(
+            b"# Copyright (c) 2020 Old Corp\n# All rights reserved.\n"
+            b"# Helper functions\nimport os\n"
+        )
+
+        assert status == "updated"
+        assert content.endswith(
+            b"# All rights reserved.\n# Helper functions\nimport os\n"
+        )
+        assert self._process(content) == ("unchanged", content)
+
+    def test_other_license_replaced(self):
+        """Test that a license header in another format is replaced whole."""
+        header = self.manager.get_header(self.style)[1]
+        status, content = self._process(
+            b"# SPDX-License-Identifier: MIT\n# Copyright 2020 Old Corp\n\nx = 1\n"
+        )
+
+        assert status == "updated"
+        assert content == header + b"\nx = 1\n"
+
+
+class TestGitYears:
+    """Test --year-mode with years from git history."""
+
+    def setup_method(self):
+        """Set up a repository with commits in 2019, 2021 and 2023."""
+        self.repo = os.path.realpath(tempfile.mkdtemp())
+        self.cache_dir = os.path.join(self.repo, ".cache")
+        self.template_file = os.path.join(self.repo, "template.txt")
+        with open(self.template_file, "w") as f:
+            f.write("Copyright (c) {year} {copyright_holder}")
+        self._git("init", "-q")
+        self._commit(2019, "old.py", "new.py")
+        self._commit(2021, "old.py")
+        self._commit(2023, "new.py", "other.py")
+        self.year = datetime.now().year
+
+    def teardown_method(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.repo, ignore_errors=True)
+
+    def _git(self, *args, year=2019):
+        date = f"{year}-06-01T12:00:00"
+        env = dict(
+            os.environ,
+            GIT_AUTHOR_NAME="Test",
+            GIT_AUTHOR_EMAIL="test@example.com",
+            GIT_AUTHOR_DATE=date,
+            GIT_COMMITTER_NAME="Test",
+            GIT_COMMITTER_EMAIL="test@example.com",
+            GIT_COMMITTER_DATE=date,
+        )
+        return subprocess.run(
+            ["git", *args],
+            cwd=self.repo,
+            env=env,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+
+    def _commit(self, year, *names):
+        for name in names:
+            with open(os.path.join(self.repo, name), "a") as f:
+                f.write(f"x = {year}\n")
+        self._git("add", *names)
+        self._git("commit", "-q", "-m", str(year), year=year)
+
+    def _years(self, monkeypatch):
+        monkeypatch.chdir(self.repo)
+        return GitYears.load(self.cache_dir)
+
+    def test_years_from_history(self, monkeypatch):
+        """Test first and last years from one log pass."""
+        git_years = self._years(monkeypatch)
+
+        assert git_years.years == {
+            "old.py": [2019, 2021],
+            "new.py": [2019, 2023],
+            "other.py": [2023, 2023],
+        }
+        assert git_years.file_years("new.py", 2030) == (2019, 2023)
+        assert git_years.file_years("untracked.py", 2030) == (2030, 2030)
+
+        with open(os.path.join(self.repo, "old.py"), "a") as f:
+            f.write("y = 1\n")
+        assert self._years(monkeypatch).file_years("old.py", 2030) == (2019, 2030)
+
+    def test_paths_git_would_quote(self, monkeypatch):
+        """Test paths that git log would quote, and an empty commit."""
+        names = ['say "hi".py', "back\\slash.py", "tab\t.py", "new\nline.py", "é.py"]
+        self._commit(2020, *names)
+        self._git("commit", "-q", "--allow-empty", "-m", "empty", year=2022)
+        self._commit(2024, names[3])
+
+        git_years = self._years(monkeypatch)
+
+        for name in names[:3] + names[4:]:
+            assert git_years.years[name] == [2020, 2020]
+        assert git_years.years[names[3]] == [2020, 2024]
+        assert git_years.years["old.py"] == [2019, 2021]
+
+    def test_cached_against_head(self, monkeypatch):
+        """Test that the cache is reused and only new commits are read."""
+        self._years(monkeypatch)
+        with patch.object(GitYears, "_read_log") as read_log:
+            git_years = self._years(monkeypatch)
+        read_log.assert_not_called()
+        assert git_years.years["old.py"] == [2019, 2021]
+
+        head = self._git("rev-parse", "HEAD")
+        self._commit(2024, "old.py")
+        read_log_impl = GitYears._read_log
+        with patch.object(
+            GitYears, "_read_log", autospec=True, side_effect=read_log_impl
+        ) as read_log:
+            git_years = self._years(monkeypatch)
+
+        read_log.assert_called_once()
+        assert read_log.call_args.args[1] == f"{head}..{self._git('rev-parse', 'HEAD')}"
+        assert git_years.years["old.py"] == [2019, 2024]
+        assert git_years.years["new.py"] == [2019, 2023]
+
+    def test_year_modes(self, monkeypatch, capsys):
+        """Test the header year in each --year-mode."""
+        monkeypatch.chdir(self.repo)
+        expected = {
+            "current": f"{self.year}",
+            "first-commit": "2019",
+            "range": "2019-2023",
+        }
+        for mode, year in expected.items():
+            main(
+                [
+                    "--template",
+                    self.template_file,
+                    "--copyright-holder",
+                    "Test Corp",
+                    "--cache-dir",
+                    self.cache_dir,
+                    "--year-mode",
+                    mode,
+                    "new.py",
+                ]
+            )
+            with open(os.path.join(self.repo, "new.py")) as f:
+                assert f.readline() == f"# Copyright (c) {year} Test Corp\n"
+            self._git("checkout", "new.py")
+
+    def test_range_mode_counts_uncommitted_changes(self, monkeypatch):
+        """Test that a file changed in the worktree ends its range this year."""
+        monkeypatch.chdir(self.repo)
+        with open("old.py", "a") as f:
+            f.write("y = 1\n")
+        manager = LicenseHeaderManager(
+            self.template_file, "Test Corp", CommentRegistry(), year_mode="range"
+        )
+        manager.file_years["old.py"] = self._years(monkeypatch).file_years(
+            "old.py", manager.current_year
+        )
+
+        assert manager.process_file("old.py")
+        with open("old.py") as f:
+            assert f.readline() == f"# Copyright (c) 2019-{self.year} Test Corp\n"
+
+    def test_outdated_header_gets_file_years(self):
+        """Test that an earlier header is updated in place with the file's years."""
+        manager = LicenseHeaderManager(
+            self.template_file, "Test Corp", CommentRegistry(), year_mode="range"
+        )
+        test_file = os.path.join(self.repo, "new.py")
+        manager.file_years[test_file] = (2019, 2023)
+        with open(test_file, "w") as f:
+            f.write("#  Copyright (c)  2020-2021  Old Corp\n\nx = 1\n")
+
+        assert manager.process_file(test_file)
+        with open(test_file) as f:
+            assert f.read() == "#  Copyright (c)  2019-2023  Test Corp\nx = 1\n"
+
+    def test_outside_git_uses_current_year(self, capsys):
+        """Test the fallback when there is no git history."""
+        temp_dir = tempfile.mkdtemp()
+        test_file = os.path.join(temp_dir, "test.py")
+        with open(test_file, "w") as f:
+            f.write("x = 1\n")
+        try:
+            with patch("license_header_hook.GitIndex.find", return_value=None):
+                main(
+                    [
+                        "-t",
+                        self.template_file,
+                        "-c",
+                        "Test Corp",
+                        "--year-mode",
+                        "range",
+                        test_file,
+                    ]
+                )
+            with open(test_file) as f:
+                assert f.readline() == f"# Copyright (c) {self.year} Test Corp\n"
+            assert "No git history found" in capsys.readouterr().err
+        finally:
+            shutil.rmtree(temp_dir)
+
+
+class TestStdin:
+    """Test the stdin to stdout filter."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.template_file = os.path.join(self.temp_dir, "template.txt")
+        with open(self.template_file, "w") as f:
+            f.write("Copyright (c) {year} {copyright_holder}\nLicense text here")
+        self.manager = LicenseHeaderManager(
+            self.template_file, "Test Corp", CommentRegistry()
+        )
+        self.header = self.manager.get_header(CommentStyle("#", "#", "#"))[1]
+
+    def teardown_method(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _run(self, *argv, stdin=b""):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        return subprocess.run(
+            [sys.executable, "-m", "license_header_hook", "-t", self.template_file]
+            + ["-c", "Test Corp", *argv],
+            cwd=self.temp_dir,
+            env=dict(os.environ, PYTHONPATH=root),
+            input=stdin,
+            capture_output=True,
+        )
+
+    def test_process_stream_reads_only_the_header_region(self):
+        """Test that the body is copied in chunks after the header region."""
+        body = b"x = 1\n" * 50_000
+        src = io.BytesIO(b"#!/usr/bin/env python3\n# Copyright 2019 Old\n" + body)
+        dst = io.BytesIO()
+
+        with patch.object(src, "read", wraps=src.read) as read:
+            status = self.manager.process_stream("gen.py", src, dst)
+
+        assert status == "updated"
+        assert (
+            dst.getvalue() == b"#!/usr/bin/env python3\n" + self.header + b"\n" + body
+        )
+        # One sniff-sized read, then chunks
+        assert read.call_args_list[0].args[0] <= 8192
+        assert max(call.args[0] for call in read.call_args_list[1:]) <= 1 << 16
+
+    def test_process_stream_copies_unchanged_content(self):
+        """Test correct, skipped and noncompliant content in check mode."""
+        correct = self.header + b"\nx = 1\n"
+        binary = b"\0\1\2" * 10
+        cases = [
+            (self.manager, "a.py", correct, "unchanged"),
+            (self.manager, "a.py", binary, "skipped"),
+            (self.manager, "notes.txt", b"text\n", "skipped"),
+        ]
+        self.manager.check = True
+        cases.append((self.manager, "a.py", b"x = 1\n", "noncompliant"))
+        for manager, name, content, expected in cases:
+            dst = io.BytesIO()
+            assert manager.process_stream(name, io.BytesIO(content), dst) == expected
+            assert dst.getvalue() == content
+
+    def test_cli_filter(self):
+        """Test exit codes and that stdout only carries the content."""
+        fixed = self._run("--stdin", "--filename-hint", "x.py", stdin=b"x = 1\n")
+        assert fixed.returncode == 0
+        assert fixed.stdout == self.header + b"\nx = 1\n"
+        assert b"Updated license header in x.py" in fixed.stderr
+
+        check = self._run(
+            "--stdin", "--filename-hint", "x.py", "--check", stdin=b"x = 1\n"
+        )
+        assert check.returncode == 1
+        assert check.stdout == b"x = 1\n"
+
+        assert self._run("--stdin").returncode == 2
+        assert self._run("--filename-hint", "x.py").returncode == 2
+        assert self._run("--stdin", "--filename-hint", "x.py", "a.py").returncode == 2
+
+    def test_client_runs_stdin_in_process(self):
+        """Test that the client does not send --stdin to a daemon."""
+        argv = ["-t", self.template_file, "-c", "Test Corp", "--stdin"]
+        argv += ["--filename-hint", "x.py"]
+        with (
+            patch("license_header_hook.main", return_value=0) as run,
+            patch("socket.socket") as connect,
+        ):
+            assert client_main(argv) == 0
+        run.assert_called_once_with(argv)
+        connect.assert_not_called()
+
+
+class TestFilesFrom:
+    """Test reading the files to process from a list."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.template_file = os.path.join(self.temp_dir, "template.txt")
+        with open(self.template_file, "w") as f:
+            f.write("Copyright (c) {year} {copyright_holder}")
+        self.argv = ["-t", self.template_file, "-c", "Test Corp"]
+
+    def teardown_method(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _list(self, content):
+        path = os.path.join(self.temp_dir, "files.lst")
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+
+    def test_delimiters_and_windows(self):
+        """Test NUL and newline lists and the window size."""
+        cases = [
+            (b"a.py\0b c.py\0\0d\ne.py\0", ["a.py", "b c.py", "d\ne.py"]),
+            (b"a.py\r\nb.py\n\nc.py", ["a.py", "b.py", "c.py"]),
+            (b"only.py", ["only.py"]),
+            (b"", []),
+        ]
+        for content, expected in cases:
+            fd = os.open(self._list(content), os.O_RDONLY)
+            try:
+                assert [p for w in read_file_list(fd) for p in w] == expected
+            finally:
+                os.close(fd)
+
+        fd = os.open(
+            self._list(b"".join(b"%d.py\0" % i for i in range(7))), os.O_RDONLY
+        )
+        try:
+            assert [len(w) for w in read_file_list(fd, window=3)] == [3, 3, 1]
+        finally:
+            os.close(fd)
+
+    def test_paths_are_yielded_as_they_arrive(self):
+        """Test that a window does not wait for the writer to finish."""
+        read_fd, write_fd = os.pipe()
+        try:
+            windows = read_file_list(read_fd)
+            os.write(write_fd, b"a.py\0b.py\0c.p")
+            assert next(windows) == ["a.py", "b.py"]
+            os.write(write_fd, b"y\0")
+            os.close(write_fd)
+            write_fd = -1
+            assert list(windows) == [["c.py"]]
+        finally:
+            os.close(read_fd)
+            if write_fd >= 0:
+                os.close(write_fd)
+
+    def test_main_processes_listed_files(self, capsys):
+        """Test that listed files are filtered like command line files."""
+        names = ["a.py", "b.js", "skip.py", "notes.txt"]
+        for name in names:
+            with open(os.path.join(self.temp_dir, name), "w") as f:
+                f.write("x\n")
+        listed = [os.path.join(self.temp_dir, n) for n in [*names, "missing.py"]]
+        file_list = self._list("\0".join(listed).encode())
+
+        code = main([*self.argv, "--exclude", "skip.py", "--files-from", file_list])
+
+        assert code == 1
+        out = capsys.readouterr().out
+        assert "Modified 2 files" in out
+        with open(os.path.join(self.temp_dir, "skip.py")) as f:
+            assert f.read() == "x\n"
+        assert main([*self.argv, "--files-from", self._list(b"") + ".gone"]) == 1
+
+    def test_main_processes_each_file_once(self, capsys):
+        """Test that a file named again within a window is checked once."""
+        paths = []
+        for name in ["a.py", "b.py"]:
+            paths.append(os.path.join(self.temp_dir, name))
+            with open(paths[-1], "w") as f:
+                f.write("x\n")
+        again = os.path.join(self.temp_dir, ".", "b.py")
+        file_list = self._list(
+            "".join(f"{p}\n" for p in [paths[0], *paths, again]).encode()
+        )
+
+        code = main([*self.argv, "--check", "--files-from", file_list])
+
+        assert code == 1
+        out = capsys.readouterr().out
+        assert out.count("a.py") == 1
+        assert out.count("b.py") == 1
+
+    def test_one_worker_pool_for_all_windows(self):
+        """Test that --jobs starts one process pool for the whole list."""
+        windows = []
+        for w in range(2):
+            windows.append([])
+            # Over CHUNK_FILES files, so each window is split across workers
+            for i in range(CHUNK_FILES + 1):
+                windows[-1].append(os.path.join(self.temp_dir, f"w{w}_{i}.py"))
+                with open(windows[-1][-1], "w") as f:
+                    f.write("x = 1\n")
+        real_pool = ProcessPoolExecutor
+        pools = []
+
+        def counting_pool(*args, **kwargs):
+            pools.append(real_pool(*args, **kwargs))
+            return pools[-1]
+
+        with (
+            patch("license_header_hook.read_file_list", return_value=iter(windows)),
+            patch("concurrent.futures.ProcessPoolExecutor", counting_pool),
+        ):
+            code = main([*self.argv, "--jobs", "2", "--files-from", self._list(b"")])
+
+        assert code == 1
+        assert len(pools) == 1
+        for path in windows[0] + windows[1]:
+            with open(path) as f:
+                assert f.read().startswith("# Copyright (c)")
+
+    def test_files_from_stdin(self):
+        """Test a list piped to stdin, as from git ls-files -z."""
+        path = os.path.join(self.temp_dir, "piped.py")
+        with open(path, "w") as f:
+            f.write("x = 1\n")
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        result = subprocess.run(
+            [sys.executable, "-m", "license_header_hook", *self.argv]
+            + ["--check", "--files-from", "-"],
+            cwd=self.temp_dir,
+            env=dict(os.environ, PYTHONPATH=root),
+            input=b"piped.py\0",
+            capture_output=True,
+        )
+        assert result.returncode == 1
+        assert b"Missing or outdated license header in piped.py" in result.stdout
+
+
+class TestPolicies:
+    """Test per-subtree header policies."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.template_file = self._write(
+            "t.txt", "Copyright (c) {year} {copyright_holder}"
+        )
+        self._write("apache.txt", "Copyright {year} {copyright_holder}\nApache-2.0")
+        self.argv = ["-t", self.template_file, "-c", "Acme"]
+
+    def teardown_method(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _write(self, name, content):
+        path = os.path.join(self.temp_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+    def _policy(self, holder):
+        manager = LicenseHeaderManager(self.template_file, holder, CommentRegistry())
+        return Policy(manager)
+
+    def test_tree_uses_deepest_prefix(self):
+        """Test lookups below, between and outside configured prefixes."""
+        root, vendor, ours = self._policy("Acme"), None, self._policy("Ours")
+        tree = PolicyTree(root, self.temp_dir)
+        tree.set("vendor", vendor)
+        tree.set("vendor/lib/ours", ours)
+
+        def lookup(path):
+            return tree.policy(os.path.join(self.temp_dir, path))
+
+        assert lookup("src/a.py") is root
+        assert lookup("vendor/a.py") is None
+        assert lookup("vendor/lib/a.py") is None
+        assert lookup("vendor/lib/ours/deep/a.py") is ours
+        assert lookup("vendor-extra/a.py") is root
+        assert tree.policy("/elsewhere/a.py") is root
+        assert set(tree.policies()) == {root, ours}
+        files = [os.path.join(self.temp_dir, p) for p in ("a", "vendor/b", "c")]
+        assert tree.split(files) == [(root, [files[0], files[2]]), (None, [files[1]])]
+
+    def test_split_without_policies_skips_lookups(self):
+        """Test that a tree of only the root policy does not look at paths."""
+        root = self._policy("Acme")
+        tree = PolicyTree(root, self.temp_dir)
+        files = [os.path.join(self.temp_dir, p) for p in ("a.py", "b/c.py")]
+
+        with patch.object(tree, "_parts") as parts:
+            assert tree.split(files) == [(root, files)]
+            assert tree.split([]) == []
+        parts.assert_not_called()
+
+    def test_load_policies_inherits_and_shares_managers(self):
+        """Test inherited settings and one manager per distinct setting."""
+        config = self._write(
+            "pyproject.toml",
+            """[tool.license-header.paths.vendor]
+skip = true
+
+[tool.license-header.paths."vendor/ours"]
+skip = false
+
+[tool.license-header.paths.acq]
+template = "apache.txt"
+copyright-holder = "Acquired Inc"
+
+[tool.license-header.paths."acq/sub"]
+copyright-holder = "Sub Ltd"
+
+[tool.license-header.paths."acq/sub/same"]
+copyright-holder = "Sub Ltd"
+""",
+        )
+        root = self._policy("Acme")
+        made = []
+
+        def make_policy(template, holder):
+            made.append((os.path.basename(template), holder))
+            return self._policy(holder)
+
+        tree = load_policies(config, root, make_policy)
+
+        def holder(path):
+            policy = tree.policy(os.path.join(self.temp_dir, path))
+            return policy and policy.manager.copyright_holder
+
+        assert holder("a.py") == "Acme"
+        assert holder("vendor/x.py") is None
+        assert tree.policy(os.path.join(self.temp_dir, "vendor/ours/x.py")) is root
+        assert holder("acq/x.py") == "Acquired Inc"
+        assert holder("acq/sub/same/x.py") == "Sub Ltd"
+        assert sorted(made) == [
+            ("apache.txt", "Acquired Inc"),
+            ("apache.txt", "Sub Ltd"),
+        ]
+
+    def test_invalid_config(self):
+        """Test that unknown keys and malformed tables are rejected."""
+        root = self._policy("Acme")
+        for content in [
+            "[tool.license-header]\ntemplates = 1\n",
+            "[tool.license-header]\npaths = 1\n",
+            "[tool.license-header.paths.src]\nholder = 'x'\n",
+        ]:
+            config = self._write("bad.toml", content)
+            with pytest.raises(ValueError):
+                load_policies(config, root, lambda t, h: self._policy(h))
+
+        argv = [*self.argv, "--config", config, self._write("a.py", "x\n")]
+        assert main(argv) == 1
+        with open(os.path.join(self.temp_dir, "a.py")) as f:
+            assert f.read() == "x\n"
+
+    def test_wrongly_typed_settings(self):
+        """Test that a setting of the wrong type names its path and key."""
+        root = self._policy("Acme")
+        for content, message in [
+            ("[tool.license-header.paths.src]\nskip = 'yes'\n", "'src': skip"),
+            ("[tool.license-header.paths.lib]\ntemplate = 1\n", "'lib': template"),
+            (
+                "[tool.license-header.paths.acq]\ncopyright-holder = ['x']\n",
+                "'acq': copyright-holder",
+            ),
+        ]:
+            config = self._write("typed.toml", content)
+            with pytest.raises(ValueError, match=message):
+                load_policies(config, root, lambda t, h: self._policy(h))
+
+    def test_main_applies_policies(self, capsys):
+        """Test a run with policies, a result cache and --check."""
+        config = self._write(
+            "license.toml",
+            """[tool.license-header.paths.vendor]
+skip = true
+
+[tool.license-header.paths.acq]
+template = "apache.txt"
+copyright-holder = "Acquired Inc"
+""",
+        )
+        files = [
+            self._write(name, "x = 1\n")
+            for name in ("src/a.py", "vendor/b.py", "acq/c.py")
+        ]
+        argv = [*self.argv, "--config", config, "--cache"]
+        argv += ["--cache-dir", os.path.join(self.temp_dir, "cache")]
+
+        assert main([*argv, *files]) == 1
+        headers = []
+        for path in files:
+            with open(path) as f:
+                headers.append(f.readline())
+        year = datetime.now().year
+        assert headers == [
+            f"# Copyright (c) {year} Acme\n",
+            "x = 1\n",
+            f"# Copyright {year} Acquired Inc\n",
+        ]
+        assert main([*argv, "--check", *files]) == 0
+        assert "Updated license header in" in capsys.readouterr().out